@@ -0,0 +1,258 @@
+import logging
+import os
+import socket
+import threading
+import time
+import click
+import requests
+from typing import Callable, Iterator, Optional, TypeVar
+from exceptions import NetworkException
+from functions.coordinator import Coordinator, CrawlTask, serve as serve_http
+from functions.datasets import DATASETS
+from functions.intercepted_requests import configure_rate_control
+from functions.cache import response_cache
+from functions.sinks import CsvSink
+from functions.static_requests import fetch_static_many
+from functions.xlsx_export import SheetSource, XlsxSnapshotter
+from main import (
+    ADAPTIVE_RATE, MIN_QUERY_INTERVAL, METADATA_FILES, OUTPUTS, PROVINCE, PROVIENCE_DICT,
+    enabled_datasets, get_univ_list, iter_prov_years, load_dictionary, log_summary
+)
+from type import UnivBrief
+
+COORDINATOR_DB = 'coordinator.sqlite3'  # 协调器的任务队列和上传的数据都保存在这里
+LEASE_SECONDS = 300  # 租约时长，单位为秒，worker每隔三分之一的租约时长发一次心跳
+IDLE_POLL_INTERVAL = 5  # 暂时没有可租的任务时，worker每隔多少秒再问一次
+RETRY_SECONDS = 600  # 协调器暂时连不上或返回5xx时，worker最多重试多少秒，期间的等待时间从1秒起翻倍，最多10秒
+
+T = TypeVar('T')
+
+
+def plan_tasks(univ_list: list[UnivBrief], datasets: list[str]) -> Iterator[tuple[CrawlTask, UnivBrief]]:
+    """按高校元数据把每所高校拆成(数据集, 省份, 年份)任务，没有元数据的高校跳过"""
+    paths = [
+        (univ, dataset, f'school/{univ["school_id"]}/dic/{METADATA_FILES[dataset]}')
+        for univ in univ_list for dataset in datasets
+    ]
+    for (univ, dataset, _), res in zip(paths, fetch_static_many(path for _, _, path in paths)):
+        if res is None:
+            continue
+        for prov_id, year in iter_prov_years(res['data']['newsdata']):
+            yield CrawlTask(dataset, univ['school_id'], prov_id, year), univ
+
+
+def export(coordinator: Coordinator, run_id: str, generate_xlsx: bool):
+    """把已完成任务的数据按任务顺序导出成CSV，需要时再生成XLSX"""
+    snapshotter = XlsxSnapshotter(f'data_{run_id}.xlsx') if generate_xlsx else None
+    for dataset in enabled_datasets():
+        info = DATASETS[dataset]
+        path = f'{dataset}_{run_id}.csv'
+        sink = CsvSink(path, info.row_type)
+        sink.write_rows(coordinator.iter_rows(dataset))
+        sink.close()
+        logging.info(f'已导出{path}')
+        if snapshotter is not None:
+            snapshotter.add_sheet(SheetSource(info.sheet_name, info.header, path, info.row_type))
+    if snapshotter is not None:
+        snapshotter.finish()
+
+
+def configure_worker(query_interval: Optional[float], no_cache: bool, worker_id: str):
+    """每台机器的出口IP不同，速率状态按worker分开保存"""
+    if query_interval is not None:
+        configure_rate_control(
+            query_interval,
+            min_interval=min(MIN_QUERY_INTERVAL, query_interval),
+            adaptive=ADAPTIVE_RATE,
+            state_file=f'rate_state_{worker_id}.json'
+        )
+    if no_cache:
+        response_cache.configure(None)
+
+
+class CoordinatorClient:
+    """worker这边的协调器客户端"""
+
+    def __init__(self, url: str, worker: str):
+        self.url = url.rstrip('/')
+        self.worker = worker
+        self.session = requests.Session()
+
+    def post(self, path: str, body: dict) -> dict:
+        res = self.session.post(f'{self.url}{path}', json={**body, 'worker': self.worker}, timeout=60)
+        res.raise_for_status()
+        return res.json()
+
+    @staticmethod
+    def _retry(call: Callable[[], T], timeout: float) -> T:
+        """调用call直到成功，网络错误和5xx时等一会儿重试，超过timeout秒仍失败则抛出最后一次的异常"""
+        deadline = time.monotonic() + timeout
+        delay = 1.0
+        while True:
+            try:
+                return call()
+            except requests.exceptions.RequestException as e:
+                response = getattr(e, 'response', None)
+                if response is not None and response.status_code < 500:
+                    raise
+                if time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 10)
+
+    def post_with_retry(self, path: str, body: dict, timeout: float = RETRY_SECONDS) -> Optional[dict]:
+        """同post，协调器重启或暂时出错时重试，超过timeout秒仍失败则记录错误并返回None"""
+        try:
+            return self._retry(lambda: self.post(path, body), timeout)
+        except requests.exceptions.RequestException as e:
+            logging.error(f'向协调器发送{path}失败：{e}')
+            return None
+
+    def wait_ready(self, timeout: float):
+        """等协调器启动，它可能还在规划任务"""
+        self._retry(lambda: self.session.get(f'{self.url}/status', timeout=10).raise_for_status(), timeout)
+
+
+def run_task(client: CoordinatorClient, lease: dict, dictionary: dict[str, str]) -> bool:
+    """执行一个租到的任务并上传数据，执行期间在后台发心跳"""
+    task, univ = CrawlTask(**lease['task']), lease['univ']
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(lease['lease_seconds'] / 3):
+            try:
+                if not client.post('/heartbeat', {'id': lease['id']})['ok']:
+                    logging.warning(f'任务{lease["id"]}的租约已失效')
+                    return
+            except requests.exceptions.RequestException:
+                logging.warning('发送心跳时发生网络错误')
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    try:
+        output = OUTPUTS[task.dataset]
+        logging.info(f'正在获取{univ["name"]}{PROVIENCE_DICT[task.prov_id]}{task.year}年的{output.description}')
+        rows = [
+            row
+            for _, page in output.fetch(univ, dictionary, only=(task.prov_id, task.year))
+            for row in page
+        ]
+    except NetworkException:
+        logging.error(f'任务{lease["id"]}发生网络异常，已归还')
+        # 归还失败的话等租约过期，任务同样会再租出去
+        client.post_with_retry('/fail', {'id': lease['id']})
+        return False
+    finally:
+        stop.set()
+    # 爬到的数据来之不易，协调器重启期间一直重试
+    result = client.post_with_retry('/complete', {'id': lease['id'], 'rows': rows})
+    if result is None:
+        logging.error(f'任务{lease["id"]}的{len(rows)}行数据无法上传，已丢弃，租约过期后任务会再租出去')
+        return False
+    if not result['ok']:
+        logging.warning(f'任务{lease["id"]}已被其它worker接手，数据已丢弃')
+        return False
+    return True
+
+
+@click.group('coordinator', help='多机爬取：协调器分发(高校, 数据集, 省份, 年份)任务，各台机器上的worker领取任务并上传数据')
+def cli():
+    pass
+
+
+@cli.command('serve', help='规划任务并启动协调器')
+@click.option('--db', default=COORDINATOR_DB, show_default=True, help='任务队列文件，已有的任务不会重复规划')
+@click.option('--province', default=PROVINCE, show_default=True, help='要爬取的高校所在的省份')
+@click.option('--all-provinces', is_flag=True, help='爬取所有省份的高校')
+@click.option('--host', default='0.0.0.0', show_default=True)
+@click.option('--port', type=int, default=8848, show_default=True)
+@click.option('--lease-seconds', type=float, default=LEASE_SECONDS, show_default=True, help='租约时长，单位为秒')
+@click.option('--exit-when-done', is_flag=True, help='所有任务完成后导出数据并退出')
+@click.option('--run-id', default=None, help='导出文件名中的ID，默认为任务队列文件名')
+@click.option('--no-xlsx', is_flag=True, help='导出时不生成xlsx文件')
+def serve_command(db: str, province: str, all_provinces: bool, host: str, port: int, lease_seconds: float, exit_when_done: bool, run_id: Optional[str], no_xlsx: bool):
+    coordinator = Coordinator(db, lease_seconds)
+    provinces = list(PROVIENCE_DICT.values()) if all_provinces else [province]
+    univ_list: list[UnivBrief] = []
+    for prov in provinces:
+        try:
+            logging.info(f'开始获取{prov}的大学列表')
+            univ_list += get_univ_list(prov)
+        except NetworkException:
+            logging.fatal(f'获取{prov}的大学列表时发生网络异常')
+            exit(1)
+    added = coordinator.seed(plan_tasks(univ_list, enabled_datasets()))
+    logging.info(f'共{len(univ_list)}所高校，新增{added}个任务，当前任务状态：{coordinator.status()}')
+
+    httpd = serve_http(coordinator, host, port)
+    logging.info(f'协调器已在{host}:{httpd.server_port}上启动')
+    if not exit_when_done:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            coordinator.close()
+        return
+
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    while not coordinator.finished():
+        time.sleep(1)
+    # 留一点时间让空闲的worker问到“已全部完成”再退出
+    time.sleep(IDLE_POLL_INTERVAL + 1)
+    httpd.shutdown()
+    logging.info(f'所有任务已结束：{coordinator.status()}')
+    export(coordinator, run_id or os.path.splitext(os.path.basename(db))[0], not no_xlsx)
+    coordinator.close()
+
+
+@cli.command('work', help='从协调器领取任务并上传数据，所有任务结束后退出')
+@click.option('--coordinator', 'url', required=True, help='协调器地址，如http://10.0.0.1:8848')
+@click.option('--worker-id', default=None, help='worker的名字，默认为主机名加进程号')
+@click.option('--query-interval', type=float, default=None, help='本机的起步查询间隔，默认为main.py里的QUERY_INTERVAL')
+@click.option('--no-cache', is_flag=True, help='不使用响应缓存')
+def work_command(url: str, worker_id: Optional[str], query_interval: Optional[float], no_cache: bool):
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    configure_worker(query_interval, no_cache, worker_id)
+    client = CoordinatorClient(url, worker_id)
+    client.wait_ready(timeout=600)
+
+    try:
+        dictionary = load_dictionary()
+    except NetworkException:
+        logging.fatal('获取专业字典时发生网络异常')
+        exit(1)
+
+    done = failed = 0
+    while True:
+        lease = client.post_with_retry('/lease', {})
+        if lease is None:
+            logging.fatal('协调器一直连不上，worker退出')
+            exit(1)
+        if lease['task'] is None:
+            if lease['finished']:
+                break
+            time.sleep(IDLE_POLL_INTERVAL)
+            continue
+        if run_task(client, lease, dictionary):
+            done += 1
+        else:
+            failed += 1
+    logging.info(f'所有任务已结束，本worker完成{done}个任务，{failed}个任务未完成')
+    log_summary()
+
+
+@cli.command('export', help='把协调器里已完成的数据导出成CSV和xlsx')
+@click.option('--db', default=COORDINATOR_DB, show_default=True)
+@click.option('--run-id', default=None, help='导出文件名中的ID，默认为任务队列文件名')
+@click.option('--no-xlsx', is_flag=True, help='不生成xlsx文件')
+def export_command(db: str, run_id: Optional[str], no_xlsx: bool):
+    coordinator = Coordinator(db)
+    logging.info(f'任务状态：{coordinator.status()}')
+    export(coordinator, run_id or os.path.splitext(os.path.basename(db))[0], not no_xlsx)
+    coordinator.close()
+
+
+if __name__ == '__main__':
+    cli()
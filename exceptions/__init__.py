@@ -1,3 +1,8 @@
 class NetworkException(Exception):
     """发生网络错误时抛的异常"""
     pass
+
+
+class CacheMiss(NetworkException):
+    """仅缓存模式下缓存未命中时抛的异常"""
+    pass
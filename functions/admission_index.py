@@ -0,0 +1,214 @@
+import json
+import os
+from typing import Any, Iterable, Optional, Sequence
+import numpy as np
+from functions.datasets import DATASETS
+from functions.rows import parse_int
+from functions.sinks import iter_csv_rows
+
+INDEX_DATASETS = ('major_score', 'min_score')
+"""建索引的数据集，都有最低分和最低位次"""
+
+INDEX_VERSION = 1
+"""索引文件格式的版本，格式变了要加一，旧的索引需要重新生成"""
+
+NULL_INT = np.iinfo(np.int32).min
+"""整数列里表示空值"""
+
+NULL_STRING = -1
+"""字符串列里表示空值"""
+
+VALUE_BITS = 32
+"""排序键的低32位是分数或位次，高位是分组编号"""
+
+
+def row_dtype(row_type: Any) -> np.dtype:
+    """行在索引里的结构：整数列为int32，字符串列为strings.npy中的编号"""
+    return np.dtype([(k, np.int32) for k in row_type.__annotations__])
+
+
+def _group_keys(provinces: np.ndarray, years: np.ndarray, majors: np.ndarray) -> np.ndarray:
+    """(面向省份, 年份, 科类)编成一个int64，省份和科类是字符串编号"""
+    return (provinces.astype(np.int64) << 40) | (years.astype(np.int64) << 24) | majors.astype(np.int64)
+
+
+def build_index(sources: dict[str, list[str]], directory: str) -> dict[str, int]:
+    """从爬虫输出的CSV生成查询用的索引，sources为数据集到CSV路径的映射，返回各数据集的行数
+
+    索引是directory下的一组.npy文件，查询时以内存映射的方式打开，不需要读进内存：
+    strings.npy是排好序的所有字符串，各列里的字符串都换成它的编号；
+    <数据集>_rows.npy是所有行；<数据集>_groups.npy是排好序的(面向省份, 年份, 科类)分组；
+    <数据集>_<列>_keys.npy是按(分组, 最低分或最低位次)排好序的键，<数据集>_<列>_rows.npy是对应的行号。
+    """
+    strings: dict[str, int] = {}
+    columns: dict[str, dict[str, list[int]]] = {}
+    for dataset, paths in sources.items():
+        row_type = DATASETS[dataset].row_type
+        table: dict[str, list[int]] = {k: [] for k in row_type.__annotations__}
+        # 两种列分开处理，每个值只判断一次类型
+        kinds = [(table[k], t is int) for k, t in row_type.__annotations__.items()]
+        for path in paths:
+            for row in iter_csv_rows(path, row_type):
+                for (column, is_int), value in zip(kinds, row):
+                    if is_int:
+                        number = parse_int(value)
+                        column.append(NULL_INT if number is None else number)
+                    elif value is None:
+                        column.append(NULL_STRING)
+                    else:
+                        column.append(strings.setdefault(str(value), len(strings)))
+        columns[dataset] = table
+
+    # 字符串按字典序重新编号，查询时用二分查找把字符串换成编号
+    ordered = sorted(strings)
+    remap = np.empty(len(strings) + 1, dtype=np.int32)
+    remap[[strings[s] for s in ordered]] = np.arange(len(ordered), dtype=np.int32)
+    remap[-1] = NULL_STRING
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'strings.npy'), np.array(ordered, dtype=np.str_) if ordered else np.array([], dtype='U1'))
+
+    counts = {}
+    for dataset in list(columns):
+        # 转换完一个数据集就放掉它的列表，生成索引时内存里只有一个数据集的Python对象
+        table = columns.pop(dataset)
+        row_type = DATASETS[dataset].row_type
+        rows = np.empty(len(table['code']), dtype=row_dtype(row_type))
+        for k, t in row_type.__annotations__.items():
+            values = np.array(table[k], dtype=np.int64 if t is int else np.int32)
+            if t is int:
+                # 超出int32的数字不会出现在分数和位次里，当作空值
+                values[(values < NULL_INT) | (values > np.iinfo(np.int32).max)] = NULL_INT
+                rows[k] = values
+            else:
+                rows[k] = remap[values]
+        del table
+
+        valid = (rows['target_province'] != NULL_STRING) & (rows['major'] != NULL_STRING) & (rows['year'] >= 0) & (rows['year'] < 1 << 16)
+        keys = _group_keys(rows['target_province'], rows['year'], rows['major'])
+        groups = np.unique(keys[valid])
+        group_of = np.searchsorted(groups, keys)
+        for field in ('minium_score', 'minium_rank'):
+            ok = valid & (rows[field] >= 0)
+            sort_keys = (group_of[ok].astype(np.int64) << VALUE_BITS) | rows[field][ok].astype(np.int64)
+            order = np.argsort(sort_keys, kind='stable')
+            np.save(os.path.join(directory, f'{dataset}_{field}_keys.npy'), sort_keys[order])
+            np.save(os.path.join(directory, f'{dataset}_{field}_rows.npy'), np.flatnonzero(ok)[order].astype(np.int32))
+        np.save(os.path.join(directory, f'{dataset}_groups.npy'), groups)
+        np.save(os.path.join(directory, f'{dataset}_rows.npy'), rows)
+        counts[dataset] = len(rows)
+
+    with open(os.path.join(directory, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'datasets': counts}, f, ensure_ascii=False)
+    return counts
+
+
+class _DatasetIndex:
+    """一个数据集的索引文件"""
+
+    def __init__(self, directory: str, dataset: str):
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, f'{dataset}_{name}.npy'), mmap_mode='r')
+
+        self.row_type = DATASETS[dataset].row_type
+        self.rows = load('rows')
+        self.groups = load('groups')
+        self.keys = {field: load(f'{field}_keys') for field in ('minium_score', 'minium_rank')}
+        self.row_ids = {field: load(f'{field}_rows') for field in ('minium_score', 'minium_rank')}
+
+
+class AdmissionIndex:
+    """按(面向省份, 年份, 科类)和最低分、最低位次查询录取数据
+
+    每个数据集的行按(分组, 最低位次)和(分组, 最低分)各排一次序，排序键是int64，
+    所以任意多个不同分组的查询可以用一次numpy.searchsorted批量完成。
+    所有数组都是内存映射的，打开索引不需要读文件，只有查到的页才会被读进内存。
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['version'] != INDEX_VERSION:
+            raise ValueError(f'{directory}中的索引版本为{meta["version"]}，需要重新生成')
+        self.strings = np.load(os.path.join(directory, 'strings.npy'), mmap_mode='r')
+        self._datasets = {dataset: _DatasetIndex(directory, dataset) for dataset in meta['datasets']}
+
+    @property
+    def datasets(self) -> list[str]:
+        return list(self._datasets)
+
+    def string_ids(self, values: Sequence[str]) -> np.ndarray:
+        """字符串的编号，不存在的字符串为NULL_STRING"""
+        values = np.asarray(values, dtype=np.str_)
+        if len(self.strings) == 0:
+            return np.full(values.shape, NULL_STRING, dtype=np.int32)
+        ids = np.minimum(np.searchsorted(self.strings, values), len(self.strings) - 1)
+        return np.where(self.strings[ids] == values, ids, NULL_STRING).astype(np.int32)
+
+    def group_ids(self, dataset: str, provinces: Sequence[str], years: Sequence[int], majors: Sequence[str]) -> np.ndarray:
+        """分组的编号，索引里没有的分组为-1"""
+        groups = self._datasets[dataset].groups
+        provinces, majors = self.string_ids(provinces), self.string_ids(majors)
+        years = np.asarray(years, dtype=np.int64)
+        keys = _group_keys(provinces, years, majors)
+        if len(groups) == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+        ids = np.minimum(np.searchsorted(groups, keys), len(groups) - 1)
+        found = (groups[ids] == keys) & (provinces != NULL_STRING) & (majors != NULL_STRING)
+        return np.where(found, ids, -1)
+
+    def rank_ranges(self, dataset: str, groups: np.ndarray, ranks: Iterable[int]) -> tuple[np.ndarray, np.ndarray]:
+        """批量查询最低位次不高于（数字不小于）rank的行，即考到这个位次能被录取的
+
+        返回每个查询在sorted_rows(dataset, 'minium_rank')中的起止位置，其中的行按最低位次从小到大排列。
+        """
+        keys = self._datasets[dataset].keys['minium_rank']
+        groups = np.asarray(groups, dtype=np.int64)
+        ranks = np.clip(np.asarray(ranks, dtype=np.int64), 0, (1 << VALUE_BITS) - 1)
+        lo = np.searchsorted(keys, (groups << VALUE_BITS) | ranks, 'left')
+        hi = np.searchsorted(keys, (groups + 1) << VALUE_BITS, 'left')
+        return self._mask_missing(groups, lo, hi)
+
+    def score_ranges(self, dataset: str, groups: np.ndarray, scores: Iterable[int]) -> tuple[np.ndarray, np.ndarray]:
+        """批量查询最低分不高于score的行，返回在sorted_rows(dataset, 'minium_score')中的起止位置，其中的行按最低分从小到大排列"""
+        keys = self._datasets[dataset].keys['minium_score']
+        groups = np.asarray(groups, dtype=np.int64)
+        scores = np.clip(np.asarray(scores, dtype=np.int64), 0, (1 << VALUE_BITS) - 1)
+        lo = np.searchsorted(keys, groups << VALUE_BITS, 'left')
+        hi = np.searchsorted(keys, (groups << VALUE_BITS) | scores, 'right')
+        return self._mask_missing(groups, lo, hi)
+
+    def sorted_rows(self, dataset: str, field: str) -> np.ndarray:
+        """按(分组, field)排好序的行号，field为minium_rank或minium_score"""
+        return self._datasets[dataset].row_ids[field]
+
+    @staticmethod
+    def _mask_missing(groups: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        missing = groups < 0
+        return np.where(missing, 0, lo), np.where(missing, 0, hi)
+
+    def by_rank(self, dataset: str, province: str, year: int, major: str, rank: int) -> np.ndarray:
+        """考到rank位次能被录取的行号，按最低位次从小到大，即从最难考的开始"""
+        [group] = self.group_ids(dataset, [province], [year], [major])
+        [lo], [hi] = self.rank_ranges(dataset, np.array([group]), [rank])
+        return self.sorted_rows(dataset, 'minium_rank')[lo:hi]
+
+    def by_score(self, dataset: str, province: str, year: int, major: str, score: int) -> np.ndarray:
+        """考到score分能被录取的行号，按最低分从高到低，即从最难考的开始"""
+        [group] = self.group_ids(dataset, [province], [year], [major])
+        [lo], [hi] = self.score_ranges(dataset, np.array([group]), [score])
+        return self.sorted_rows(dataset, 'minium_score')[lo:hi][::-1]
+
+    def records(self, dataset: str, row_ids: Iterable[int]) -> list[dict[str, Optional[Any]]]:
+        """把行号还原成和CSV里一样的行"""
+        index = self._datasets[dataset]
+        kinds = [(k, t is int) for k, t in index.row_type.__annotations__.items()]
+        result = []
+        for row in index.rows[np.asarray(row_ids, dtype=np.int64)]:
+            record: dict[str, Optional[Any]] = {}
+            for (k, is_int), value in zip(kinds, row.tolist()):
+                if is_int:
+                    record[k] = None if value == NULL_INT else value
+                else:
+                    record[k] = None if value == NULL_STRING else str(self.strings[value])
+            result.append(record)
+        return result
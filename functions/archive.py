@@ -0,0 +1,171 @@
+import glob
+import json
+import logging
+import os
+import threading
+import zlib
+from typing import NamedTuple, Optional
+from functions.cache import CachedResponse, canonical_key
+
+SEGMENT_SUFFIX = '.jsonl.gz'
+INDEX_SUFFIX = '.idx'
+
+
+class _Location(NamedTuple):
+    fd: int
+    offset: int
+    length: int
+
+
+def _gzip(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _scan_members(fd: int, start: int, end: int) -> tuple[list[tuple[bytes, int, int]], int]:
+    """从start开始逐个解出完整的gzip成员，返回[(内容, 偏移, 长度)]和最后一个完整成员的结束位置"""
+    data = memoryview(os.pread(fd, end - start, start))
+    members = []
+    position = 0
+    while position < len(data):
+        decompressor = zlib.decompressobj(31)
+        try:
+            content = decompressor.decompress(data[position:])
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            break
+        length = len(data) - position - len(decompressor.unused_data)
+        members.append((content, start + position, length))
+        position += length
+    return members, start + position
+
+
+class ResponseArchive:
+    """原始响应的只追加档案，用于录制和回放
+
+    档案是一个目录，每个进程写自己的分段文件，分段里每条响应单独压成一个gzip成员，
+    整个分段仍是合法的.gz文件，可以直接用zcat查看；旁边的索引文件记录每条响应的键、偏移和长度。
+    写到一半中断时，下次打开会从分段里找回索引漏掉的完整记录，并截掉不完整的尾巴。
+    键与接口地址无关，只取决于接口名（或静态文件路径）和payload。
+    """
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        """None、'record'或'replay'"""
+        self._index: dict[str, _Location] = {}
+        self._fds: list[int] = []
+        self._fd: Optional[int] = None
+        self._index_fd: Optional[int] = None
+        self._end = 0
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == 'record'
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def configure(self, directory: Optional[str], mode: Optional[str] = None, segment: str = 'main'):
+        """打开档案，录制时写入segment这个分段，回放时读取目录下所有分段，directory为None时关闭"""
+        self.close()
+        self.mode = mode if directory is not None else None
+        if directory is None:
+            return
+        if mode == 'record':
+            os.makedirs(directory, exist_ok=True)
+            self._open_segment(os.path.join(directory, segment), writable=True)
+        elif mode == 'replay':
+            paths = sorted(glob.glob(os.path.join(glob.escape(directory), f'*{SEGMENT_SUFFIX}')))
+            if not paths:
+                raise FileNotFoundError(f'{directory}中没有录制的响应')
+            for path in paths:
+                self._open_segment(path[:-len(SEGMENT_SUFFIX)], writable=False)
+            logging.info(f'已加载{len(paths)}个分段，共{len(self._index)}条响应')
+        else:
+            raise ValueError(mode)
+
+    def _open_segment(self, base: str, writable: bool):
+        fd = os.open(base + SEGMENT_SUFFIX, (os.O_RDWR | os.O_CREAT) if writable else os.O_RDONLY, 0o644)
+        self._fds.append(fd)
+        end = 0
+        lines = []
+        if os.path.exists(base + INDEX_SUFFIX):
+            with open(base + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if not line.endswith('\n') or len(fields) != 3:
+                        continue
+                    offset, length = int(fields[1]), int(fields[2])
+                    self._index[fields[0]] = _Location(fd, offset, length)
+                    end = max(end, offset + length)
+        size = os.fstat(fd).st_size
+        if size > end:
+            # 写了记录但没来得及写索引
+            members, end = _scan_members(fd, end, size)
+            for content, offset, length in members:
+                key = json.loads(content)['key']
+                self._index[key] = _Location(fd, offset, length)
+                lines.append(f'{key}\t{offset}\t{length}\n')
+            if members:
+                logging.warning(f'从{base}{SEGMENT_SUFFIX}中找回了{len(members)}条未编入索引的响应')
+        if not writable:
+            return
+        if size > end:
+            os.ftruncate(fd, end)
+        self._fd = fd
+        self._end = end
+        self._index_fd = os.open(base + INDEX_SUFFIX, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if lines:
+            os.write(self._index_fd, ''.join(lines).encode('utf-8'))
+
+    def record(self, name: str, payload: Optional[dict], status: int, body: str):
+        """录制一条响应，已经录过的不重复写入"""
+        if self._fd is None:
+            return
+        key = canonical_key(name, payload)
+        if key in self._index:
+            return
+        frame = _gzip(json.dumps(
+            {'key': key, 'name': name, 'payload': payload, 'status': status, 'body': body},
+            ensure_ascii=False
+        ).encode('utf-8') + b'\n')
+        with self._lock:
+            if key in self._index:
+                return
+            offset = self._end
+            os.pwrite(self._fd, frame, offset)
+            self._end += len(frame)
+            # 先写记录再写索引，中间断掉的话下次打开时能从分段里找回来
+            os.write(self._index_fd, f'{key}\t{offset}\t{len(frame)}\n'.encode('utf-8'))  # type: ignore
+            self._index[key] = _Location(self._fd, offset, len(frame))
+            self.recorded += 1
+
+    def get(self, name: str, payload: Optional[dict] = None) -> Optional[CachedResponse]:
+        """取出录制的响应，没有录过时返回None"""
+        location = self._index.get(canonical_key(name, payload))
+        if location is None:
+            return None
+        record = json.loads(zlib.decompress(os.pread(location.fd, location.length, location.offset), 31))
+        self.replayed += 1
+        return CachedResponse(record['status'], record['body'])
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds:
+                os.close(fd)
+            if self._index_fd is not None:
+                os.close(self._index_fd)
+            self._fds = []
+            self._fd = None
+            self._index_fd = None
+            self._index = {}
+            self._end = 0
+
+
+response_archive = ResponseArchive()
+"""全局响应档案，默认关闭，需要先configure"""
@@ -0,0 +1,241 @@
+import datetime
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple, Optional
+from exceptions import CacheMiss
+
+CACHE_TTL = {
+    # api.eol.cn的接口，以payload中的uri区分
+    'apidata/api/gk/school/lists': 86400,
+    'apidata/api/gkv3/plan/school': 86400,
+    'apidata/api/gk/score/special': 86400,
+    # static-data.gaokao.cn的文件，以路径中的特征区分
+    'dicprovince/dic.json': 7 * 86400,
+    'dic/provincescore.json': 86400,
+    'dic/specialplan.json': 86400,
+    'dic/specialscore.json': 86400,
+    'schoolprovinceindex': 86400,
+}
+"""各接口缓存的有效期，单位为秒，往年的数据不受此限制，永不过期"""
+
+DEFAULT_TTL = 86400
+
+_URL_YEAR_RE = re.compile(r'/schoolprovinceindex/(\d{4})/')
+
+
+class CachedResponse(NamedTuple):
+    """缓存中的一条响应"""
+    status: int
+    """HTTP状态码"""
+    body: str
+    """响应体"""
+    etag: Optional[str] = None
+    """响应头中的ETag，用于条件请求"""
+    last_modified: Optional[str] = None
+    """响应头中的Last-Modified，用于条件请求"""
+
+    def validators(self) -> dict[str, str]:
+        """条件请求的请求头，没有验证器时为空"""
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def canonical_key(url: str, payload: Optional[dict] = None) -> str:
+    """由URL和规范化的payload生成缓存键"""
+    canonical = json.dumps(
+        payload, sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    ) if payload is not None else ''
+    return hashlib.sha256(f'{url}\n{canonical}'.encode()).hexdigest()
+
+
+def endpoint_of(url: str, payload: Optional[dict] = None) -> str:
+    """找出请求对应的接口，用于查有效期"""
+    if payload is not None and 'uri' in payload:
+        return payload['uri']
+    for endpoint in CACHE_TTL:
+        if endpoint in url:
+            return endpoint
+    return url
+
+
+def is_immutable(url: str, payload: Optional[dict] = None) -> bool:
+    """往年的数据不会再变"""
+    year = None
+    if payload is not None and 'year' in payload:
+        year = payload['year']
+    else:
+        match = _URL_YEAR_RE.search(url)
+        if match:
+            year = match.group(1)
+    return year is not None and int(year) < datetime.date.today().year
+
+
+class ResponseCache:
+    """基于SQLite的响应缓存，按最近访问时间淘汰，总大小不超过max_bytes"""
+
+    def __init__(self):
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total = 0
+        self.max_bytes = 0
+        self.cache_only = False
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        """条件请求返回304、从缓存中取出响应体的次数"""
+        self.not_modified_bytes = 0
+        """304省下的响应体字节数"""
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def configure(self, path: Optional[str], max_bytes: int = 1024 * 1024 * 1024, cache_only: bool = False):
+        """打开缓存文件，path为None时关闭缓存"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.max_bytes = max_bytes
+            self.cache_only = cache_only
+            if path is None:
+                return
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    expires REAL
+                )
+            ''')
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(responses)')}
+            for column in ('etag', 'last_modified'):
+                if column not in columns:
+                    # 旧版本的缓存文件没有这两列
+                    self._conn.execute(f'ALTER TABLE responses ADD COLUMN {column} TEXT')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)'
+            )
+            self._total = self._conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()[0]
+
+    def get(self, url: str, payload: Optional[dict] = None) -> Optional[CachedResponse]:
+        """查缓存，未命中或已过期返回None，仅缓存模式下未命中会抛CacheMiss"""
+        if self._conn is None:
+            return None
+        key = canonical_key(url, payload)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, body, expires FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and (self.cache_only or row[2] is None or row[2] > now):
+                self._conn.execute(
+                    'UPDATE responses SET accessed = ? WHERE key = ?', (now, key)
+                )
+                self.hits += 1
+                return CachedResponse(row[0], zlib.decompress(row[1]).decode())
+        self.misses += 1
+        if self.cache_only:
+            raise CacheMiss(url)
+        return None
+
+    def get_stale(self, url: str, payload: Optional[dict] = None) -> Optional[CachedResponse]:
+        """取出带有验证器的记录用于发条件请求，不管是否过期，不计入命中和未命中"""
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                '''SELECT status, body, etag, last_modified FROM responses
+                   WHERE key = ? AND (etag IS NOT NULL OR last_modified IS NOT NULL)''',
+                (canonical_key(url, payload),)
+            ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(row[0], zlib.decompress(row[1]).decode(), row[2], row[3])
+
+    def renew(self, url: str, payload: Optional[dict], stale: CachedResponse):
+        """条件请求返回304，记录的有效期重新开始计算"""
+        if self._conn is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'UPDATE responses SET created = ?, accessed = ?, expires = ? WHERE key = ?',
+                (now, now, self._expires(url, payload, now), canonical_key(url, payload))
+            )
+            self.not_modified += 1
+            self.not_modified_bytes += len(stale.body.encode())
+
+    @staticmethod
+    def _expires(url: str, payload: Optional[dict], now: float) -> Optional[float]:
+        if is_immutable(url, payload):
+            return None
+        return now + CACHE_TTL.get(endpoint_of(url, payload), DEFAULT_TTL)
+
+    def put(
+        self,
+        url: str,
+        payload: Optional[dict],
+        status: int,
+        body: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ):
+        """写入缓存，有效期由CACHE_TTL和年份决定，etag和last_modified用于过期后发条件请求"""
+        if self._conn is None:
+            return
+        now = time.time()
+        expires = self._expires(url, payload, now)
+        blob = zlib.compress(body.encode())
+        key = canonical_key(url, payload)
+        with self._lock:
+            old = self._conn.execute(
+                'SELECT size FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            self._conn.execute(
+                '''INSERT OR REPLACE INTO responses
+                   (key, url, status, body, size, created, accessed, expires, etag, last_modified)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (key, url, status, blob, len(blob), now, now, expires, etag, last_modified)
+            )
+            self._total += len(blob) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到总大小降到上限的90%以下"""
+        assert self._conn is not None
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for key, size in self._conn.execute(
+            'SELECT key, size FROM responses ORDER BY accessed'
+        ).fetchall():
+            if self._total <= target:
+                break
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._total -= size
+            evicted += 1
+        logging.debug(f'缓存已满，淘汰了{evicted}条记录')
+
+
+response_cache = ResponseCache()
+"""全局响应缓存，默认关闭，需要先configure"""
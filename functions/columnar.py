@@ -0,0 +1,89 @@
+import os
+from collections import defaultdict
+from typing import Any, Iterable, Sequence
+from functions.rows import parse_int
+from functions.sinks import RowSink, iter_csv_rows
+
+PARTITION_FIELDS = ('year', 'target_province')
+"""每个row group里的行这两列都相同，按年份和面向省份筛选时可以跳过整个row group"""
+
+
+def require_pyarrow():
+    """导入pyarrow，它是可选的依赖，只有写Parquet时才需要"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('生成Parquet文件需要pyarrow，请先运行pip install pyarrow') from e
+    return pyarrow, pyarrow.parquet
+
+
+def arrow_schema(row_type: Any):
+    """row_type对应的Arrow表结构：整数列为int32（占位符记为空，见parse_int），文本列字典编码"""
+    pa, _ = require_pyarrow()
+    return pa.schema([
+        (k, pa.int32() if t is int else pa.dictionary(pa.int32(), pa.string()))
+        for k, t in row_type.__annotations__.items()
+    ])
+
+
+class ParquetSink(RowSink):
+    """写入Parquet文件，每个row group只包含同一年份、同一面向省份的行
+
+    行按(年份, 面向省份)分开攒着，某一组攒够row_group_rows行时写成一个row group；
+    所有组加起来超过buffer_rows行时先写出最大的一组，所以内存里最多有buffer_rows行，
+    代价是数据很分散时row group会小一些。先写到临时文件，close时替换。
+    """
+
+    def __init__(self, path: str, row_type: Any, row_group_rows: int = 65536, buffer_rows: int = 131072):
+        pa, pq = require_pyarrow()
+        self._pa = pa
+        self.path = path
+        self.row_group_rows = row_group_rows
+        self.buffer_rows = buffer_rows
+        self.schema = arrow_schema(row_type)
+        fields = list(row_type.__annotations__)
+        self._int_columns = [t is int for t in row_type.__annotations__.values()]
+        self._partition = [fields.index(k) for k in PARTITION_FIELDS]
+        self._buffers: defaultdict[tuple, list] = defaultdict(list)
+        self._buffered = 0
+        self._tmp_path = f'{path}.tmp'
+        self._writer = pq.ParquetWriter(self._tmp_path, self.schema, compression='zstd')
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        i, j = self._partition
+        for row in rows:
+            key = (row[i], row[j])
+            buffer = self._buffers[key]
+            buffer.append(row)
+            self._buffered += 1
+            if len(buffer) >= self.row_group_rows:
+                self._write_group(key)
+            elif self._buffered >= self.buffer_rows:
+                self._write_group(max(self._buffers, key=lambda k: len(self._buffers[k])))
+
+    def _write_group(self, key: tuple):
+        rows = self._buffers.pop(key)
+        self._buffered -= len(rows)
+        pa = self._pa
+        arrays = []
+        for column, is_int in zip(zip(*rows), self._int_columns):
+            if is_int:
+                arrays.append(pa.array([parse_int(v) for v in column], pa.int32()))
+            else:
+                arrays.append(pa.array([None if v is None else str(v) for v in column], pa.string()).dictionary_encode())
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema), row_group_size=len(rows))
+
+    def close(self):
+        # 剩下的组按年份和省份的顺序写出，同一文件里的row group大致有序
+        for key in sorted(self._buffers, key=lambda k: tuple('' if v is None else str(v) for v in k)):
+            self._write_group(key)
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+
+def export_parquet(csv_path: str, row_type: Any, path: str):
+    """把爬虫输出的CSV逐行转换为Parquet"""
+    sink = ParquetSink(path, row_type)
+    sink.write_rows(iter_csv_rows(csv_path, row_type))
+    sink.close()
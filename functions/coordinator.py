@@ -0,0 +1,230 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+import json
+import sqlite3
+import threading
+import time
+
+
+class CrawlTask(NamedTuple):
+    """分给worker的一个任务：一所高校的一个数据集在一个省份一个年份的数据"""
+    dataset: str
+    school_id: int
+    prov_id: int
+    year: int
+
+
+class Lease(NamedTuple):
+    id: int
+    task: CrawlTask
+    univ: dict
+    expires: float
+
+
+class Coordinator:
+    """用SQLite保存任务队列，把任务租给worker
+
+    租约在lease_seconds秒内没有心跳就会过期，过期的任务会再租给别的worker；
+    worker上传的行随任务完成一起写入，同一个任务只会有一份数据。
+    失败超过max_attempts次的任务不再出租。
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 120, max_attempts: int = 5):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                dataset TEXT NOT NULL,
+                school_id INTEGER NOT NULL,
+                prov_id INTEGER NOT NULL,
+                year INTEGER NOT NULL,
+                univ TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (dataset, school_id, prov_id, year)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+            CREATE TABLE IF NOT EXISTS rows (
+                task_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (task_id, seq)
+            );
+        ''')
+
+    def seed(self, tasks: Iterable[tuple[CrawlTask, dict]]) -> int:
+        """加入任务，已有的任务不会重复加入，返回新加入的任务数，任务的顺序就是导出时的顺序"""
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO tasks (dataset, school_id, prov_id, year, univ) VALUES (?, ?, ?, ?, ?)',
+                ((*task, json.dumps(univ, ensure_ascii=False)) for task, univ in tasks)
+            )
+            return self._conn.total_changes - before
+
+    def lease(self, worker: str) -> Optional[Lease]:
+        """租出一个待做或租约已过期的任务，没有可租的任务时返回None"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                '''SELECT id, dataset, school_id, prov_id, year, univ FROM tasks
+                   WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                   ORDER BY id LIMIT 1''',
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            expires = now + self.lease_seconds
+            self._conn.execute(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ? WHERE id = ?",
+                (worker, expires, row[0])
+            )
+        return Lease(row[0], CrawlTask(*row[1:5]), json.loads(row[5]), expires)
+
+    def _holds(self, task_id: int, worker: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM tasks WHERE id = ? AND status = 'leased' AND worker = ?",
+            (task_id, worker)
+        ).fetchone()
+        return row is not None
+
+    def heartbeat(self, task_id: int, worker: str) -> bool:
+        """延长租约，租约已经不属于这个worker时返回False"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                '''UPDATE tasks SET lease_expires = ?
+                   WHERE id = ? AND status = 'leased' AND worker = ?''',
+                (time.time() + self.lease_seconds, task_id, worker)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, task_id: int, worker: str, rows: list[Any]) -> bool:
+        """保存任务的数据并标记完成，租约已经不属于这个worker时丢弃数据并返回False
+
+        租约过期但还没有被别人租走时仍然接受，反正数据是一样的。
+        同一个worker重复提交已经完成的任务时（上次的响应没收到）直接返回True。
+        每行原样存成JSON，worker上传的是按字段顺序排列的列表。
+        """
+        with self._lock, self._conn:
+            if not self._holds(task_id, worker):
+                return self._conn.execute(
+                    "SELECT 1 FROM tasks WHERE id = ? AND status = 'done' AND worker = ?",
+                    (task_id, worker)
+                ).fetchone() is not None
+            self._conn.execute('DELETE FROM rows WHERE task_id = ?', (task_id,))
+            self._conn.executemany(
+                'INSERT INTO rows (task_id, seq, data) VALUES (?, ?, ?)',
+                ((task_id, seq, json.dumps(row, ensure_ascii=False)) for seq, row in enumerate(rows))
+            )
+            self._conn.execute(
+                "UPDATE tasks SET status = 'done', lease_expires = NULL WHERE id = ?",
+                (task_id,)
+            )
+            return True
+
+    def fail(self, task_id: int, worker: str) -> bool:
+        """归还失败的任务，失败次数过多的任务标记为failed"""
+        with self._lock, self._conn:
+            if not self._holds(task_id, worker):
+                return False
+            self._conn.execute(
+                '''UPDATE tasks SET attempts = attempts + 1, worker = NULL, lease_expires = NULL,
+                   status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+                   WHERE id = ?''',
+                (self.max_attempts, task_id)
+            )
+            return True
+
+    def status(self) -> dict[str, int]:
+        """各状态的任务数"""
+        with self._lock:
+            counts = dict(self._conn.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status'))
+        return {status: counts.get(status, 0) for status in ('pending', 'leased', 'done', 'failed')}
+
+    def finished(self) -> bool:
+        """所有任务都已完成或放弃"""
+        counts = self.status()
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+    def iter_rows(self, dataset: str) -> Iterator[Any]:
+        """按任务加入的顺序逐行读出一个数据集的数据"""
+        with self._lock:
+            cursor = self._conn.execute(
+                '''SELECT rows.data FROM tasks JOIN rows ON rows.task_id = tasks.id
+                   WHERE tasks.dataset = ? AND tasks.status = 'done'
+                   ORDER BY tasks.id, rows.seq''',
+                (dataset,)
+            )
+            batch = cursor.fetchmany(1000)
+        while batch:
+            for (data,) in batch:
+                yield json.loads(data)
+            with self._lock:
+                batch = cursor.fetchmany(1000)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def serve(coordinator: Coordinator, host: str, port: int) -> ThreadingHTTPServer:
+    """创建协调器的HTTP服务，调用方负责serve_forever和shutdown
+
+    所有接口都收发JSON：
+    POST /lease {worker} -> {task, univ, id, lease_seconds} 或 {task: null, finished}
+    POST /heartbeat {id, worker} -> {ok}
+    POST /complete {id, worker, rows} -> {ok}
+    POST /fail {id, worker} -> {ok}
+    GET /status -> 各状态的任务数
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, body: Any, status: int = 200):
+            data = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json;charset=UTF-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self._send(coordinator.status())
+            else:
+                self._send({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if self.path == '/lease':
+                lease = coordinator.lease(body['worker'])
+                if lease is None:
+                    self._send({'task': None, 'finished': coordinator.finished()})
+                else:
+                    self._send({
+                        'id': lease.id,
+                        'task': lease.task._asdict(),
+                        'univ': lease.univ,
+                        'lease_seconds': coordinator.lease_seconds
+                    })
+            elif self.path == '/heartbeat':
+                self._send({'ok': coordinator.heartbeat(body['id'], body['worker'])})
+            elif self.path == '/complete':
+                self._send({'ok': coordinator.complete(body['id'], body['worker'], body['rows'])})
+            elif self.path == '/fail':
+                self._send({'ok': coordinator.fail(body['id'], body['worker'])})
+            else:
+                self._send({'error': 'not found'}, 404)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    return httpd
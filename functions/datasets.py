@@ -0,0 +1,78 @@
+from type import MiniumScoreForUnivs, EnrollPlan, MiniumScoreForMajors
+from typing import Any, NamedTuple
+
+
+class DatasetInfo(NamedTuple):
+    """一个数据集的基本信息"""
+    name: str
+    """数据集名，也是爬虫输出的CSV文件名前缀"""
+    row_type: Any
+    """行的TypedDict类型"""
+    sheet_name: str
+    """XLSX中的表名"""
+    header: list[str]
+    """XLSX中的表头"""
+    key: tuple[str, ...]
+    """自然键，同一条数据在不同的运行里自然键相同，用于去重和排序"""
+
+
+DATASETS = {
+    'min_score': DatasetInfo(
+        'min_score', MiniumScoreForUnivs, '学校分数线',
+        [
+            '学校代码',
+            '学校名称全称',
+            '所在省份',
+            '面向省份',
+            '科类',
+            '年份',
+            '录取批次',
+            '招生类型',
+            '最低分',
+            '最低位次',
+            '省控线',
+            '专业组',
+            '选科要求'
+        ],
+        ('code', 'target_province', 'year', 'major', 'enroll_level', 'enroll_type', 'major_group')
+    ),
+    'enroll_plan': DatasetInfo(
+        'enroll_plan', EnrollPlan, '各专业招生计划',
+        [
+            '学校代码',
+            '学校名称全称',
+            '所在省份',
+            '面向省份',
+            '年份',
+            '科类',
+            '招生批次',
+            '招生专业名称',
+            '计划招生',
+            '学制',
+            '学费',
+            '专业组',
+            '选科要求'
+        ],
+        ('code', 'target_province', 'year', 'major', 'enroll_level', 'major_name', 'major_group')
+    ),
+    'major_score': DatasetInfo(
+        'major_score', MiniumScoreForMajors, '分专业录取分数线',
+        [
+            '学校代码',
+            '学校名称全称',
+            '所在省份',
+            '面向省份',
+            '年份',
+            '科类',
+            '录取专业名称',
+            '录取批次',
+            '平均分',
+            '最低分',
+            '最低位次',
+            '专业组',
+            '选科要求'
+        ],
+        ('code', 'target_province', 'year', 'major', 'major_name', 'enroll_level', 'major_group')
+    )
+}
+"""爬虫输出的三个数据集"""
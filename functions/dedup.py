@@ -0,0 +1,97 @@
+import hashlib
+import itertools
+import os
+import sqlite3
+import tempfile
+from typing import Any, Iterable, Iterator, Optional
+from functions.rows import to_record
+
+POLICIES = {
+    'newest': '来自最新的输入的那一行胜出',
+    'newest-non-null': '来自最新的输入的那一行胜出，它为空的字段用旧的行补上',
+    'first': '保留最先读到的那一行'
+}
+"""重复的行的取舍策略"""
+
+BATCH_ROWS = 10000
+"""每批写入索引的行数"""
+
+
+def key_digest(row, indexes: list[int]) -> bytes:
+    """自然键的16字节摘要，CSV和XLSX读出来的类型不一定相同，统一按字符串算"""
+    text = '\x1f'.join('' if row[i] is None else str(row[i]) for i in indexes)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class Deduplicator:
+    """按自然键去重，索引和行都放在磁盘上的临时SQLite文件里，数据量超出内存也没关系
+
+    索引的主键是自然键的16字节摘要，每行还记录第一次出现的顺序和新旧程度newness，
+    重复的行按policy（见POLICIES）决定留下哪些字段，输出按第一次出现的顺序。
+    """
+
+    def __init__(self, row_type: Any, key: tuple[str, ...], policy: str = 'newest', directory: Optional[str] = None):
+        if policy not in POLICIES:
+            raise ValueError(policy)
+        self.row_type = row_type
+        self.fields = list(row_type.__annotations__)
+        self.indexes = [self.fields.index(name) for name in key]
+        self.rows_in = 0
+        fd, self.path = tempfile.mkstemp(prefix='merge_dedup_', suffix='.sqlite3', dir=directory)
+        os.close(fd)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute('PRAGMA journal_mode = OFF')
+        self._conn.execute('PRAGMA synchronous = OFF')
+        columns = ', '.join(f'"{name}"' for name in self.fields)
+        self._conn.execute(
+            f'CREATE TABLE rows (hash BLOB PRIMARY KEY, seq INTEGER NOT NULL, newness INTEGER NOT NULL, {columns}) WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX rows_seq ON rows (seq)')
+        placeholders = ', '.join('?' * (len(self.fields) + 3))
+        insert = f'INSERT INTO rows (hash, seq, newness, {columns}) VALUES ({placeholders})'
+        if policy == 'first':
+            self._sql = f'{insert} ON CONFLICT (hash) DO NOTHING'
+        else:
+            # SET里引用的都是更新前的值，同样新的时候后读到的胜出
+            newer = 'excluded.newness >= newness'
+            if policy == 'newest':
+                updates = (f'"{f}" = CASE WHEN {newer} THEN excluded."{f}" ELSE "{f}" END' for f in self.fields)
+            else:
+                updates = (
+                    f'"{f}" = CASE WHEN {newer} THEN coalesce(excluded."{f}", "{f}") ELSE coalesce("{f}", excluded."{f}") END'
+                    for f in self.fields
+                )
+            self._sql = f'{insert} ON CONFLICT (hash) DO UPDATE SET newness = max(newness, excluded.newness), {", ".join(updates)}'
+
+    def add(self, rows: Iterable, newness: int = 0):
+        """加入一批行，newness越大越新"""
+        rows = iter(rows)
+        with self._conn:
+            while True:
+                batch = [
+                    (key_digest(row, self.indexes), self.rows_in + i, newness, *row)
+                    for i, row in enumerate(itertools.islice(rows, BATCH_ROWS))
+                ]
+                if not batch:
+                    return
+                self._conn.executemany(self._sql, batch)
+                self.rows_in += len(batch)
+
+    @property
+    def duplicates(self) -> int:
+        """去掉的重复行数"""
+        return self.rows_in - self._conn.execute('SELECT count(*) FROM rows').fetchone()[0]
+
+    def __iter__(self) -> Iterator:
+        columns = ', '.join(f'"{name}"' for name in self.fields)
+        cursor = self._conn.execute(f'SELECT {columns} FROM rows ORDER BY seq')
+        while True:
+            batch = cursor.fetchmany(1000)
+            if not batch:
+                return
+            for values in batch:
+                yield to_record(self.row_type, values)
+
+    def close(self):
+        self._conn.close()
+        os.remove(self.path)
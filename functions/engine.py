@@ -0,0 +1,30 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Callable, Coroutine, TypeVar
+
+T = TypeVar('T')
+
+
+class Engine:
+    """在后台线程中运行的asyncio事件循环，同步代码通过submit把协程丢进来执行"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever,
+            name='crawl-engine',
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> 'concurrent.futures.Future[T]':
+        """提交协程，返回可以在任意线程中等待的Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run_blocking(self, func: Callable[..., T], *args) -> T:
+        """在线程池中执行阻塞调用（比如requests），不卡住事件循环"""
+        return await self.loop.run_in_executor(None, func, *args)
+
+
+engine = Engine()
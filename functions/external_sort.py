@@ -0,0 +1,36 @@
+import heapq
+import itertools
+import os
+import tempfile
+from typing import Any, Callable, Iterable, Iterator, Optional
+from functions.sinks import CsvSink, iter_csv_rows
+
+
+def external_sort(
+    rows: Iterable,
+    row_type: Any,
+    key: Callable[[Any], Any],
+    buffer_rows: int = 100000,
+    directory: Optional[str] = None
+) -> Iterator:
+    """外部排序，内存里最多同时有buffer_rows行
+
+    每攒够buffer_rows行就排好序写成一个临时CSV（一个顺串），最后用k路归并逐行读出所有顺串，
+    临时文件放在directory（默认为系统临时目录）下，读完后删除。
+    经过CSV之后整数列会还原成int，空字符串还原成None，和iter_csv_rows一样。
+    """
+    rows = iter(rows)
+    with tempfile.TemporaryDirectory(prefix='merge_sort_', dir=directory) as tmpdir:
+        runs = []
+        while True:
+            chunk = list(itertools.islice(rows, buffer_rows))
+            if not chunk:
+                break
+            chunk.sort(key=key)
+            path = os.path.join(tmpdir, f'{len(runs)}.csv')
+            sink = CsvSink(path, row_type)
+            sink.write_rows(chunk)
+            sink.close()
+            runs.append(path)
+            del chunk
+        yield from heapq.merge(*(iter_csv_rows(path, row_type) for path in runs), key=key)
@@ -1,9 +1,20 @@
 from type import EolResponseData, EolResponse
 from functions.session import session
-from exceptions import NetworkException
-import copy
-import requests
+from functions.engine import engine
+from functions.rate_control import AimdController
+from functions.cache import response_cache
+from functions.archive import response_archive
+from functions.page_size import PageSizeManager
+from functions import metrics
+from exceptions import CacheMiss, NetworkException
+import concurrent.futures
+import asyncio
+import math
+import json
 import logging
+import os
+import requests
+import threading
 import time
 
 logging.basicConfig(
@@ -12,70 +23,176 @@ logging.basicConfig(
     format='[%(asctime)s][%(levelname)s] %(message)s'
 )
 
-QUERY_INTERVAL = 10
-
+API_URL = os.environ.get('EOL_API_URL', 'https://api.eol.cn/web/api/')
+"""eol.cn的接口地址，可以用环境变量EOL_API_URL指向测试用的替身服务器"""
+
+rate_controller = AimdController()
+"""api.eol.cn的速率控制器，速率和限速历史可以从这里读"""
+eol_limiter = rate_controller.bucket
+"""所有发往api.eol.cn的请求共用的令牌桶"""
+page_sizes = PageSizeManager()
+"""各接口各高校实际使用的每页条数"""
+_pending: set['concurrent.futures.Future[EolResponseData]'] = set()
+"""已经交给引擎、还没有完成的请求"""
+_pending_lock = threading.Lock()
+
+
+def configure_rate_control(interval: float, **kwargs):
+    """设置起步的请求间隔（秒），其余参数见AimdController.configure"""
+    engine.loop.call_soon_threadsafe(
+        lambda: rate_controller.configure(interval, **kwargs)
+    )
+
+
+async def eol_request(payload: dict, dataset: str = '') -> EolResponseData:
+    """向eol.cn的接口发送请求，录制模式下把拿到的数据写入档案，回放模式下只从档案里取
+
+    dataset为请求所属的数据集，只用作指标的标签，不属于任何数据集的请求（如高校列表）为空字符串。
+    """
+    if response_archive.replaying:
+        recorded = response_archive.get('api', payload)
+        if recorded is None:
+            raise CacheMiss('档案中没有这个请求的响应')
+        return json.loads(recorded.body)
+    data = await _eol_request(payload, dataset)
+    if response_archive.recording:
+        response_archive.record('api', payload, 200, json.dumps(data, ensure_ascii=False))
+    return data
+
+
+async def _eol_request(payload: dict, dataset: str) -> EolResponseData:
+    """向eol.cn的接口发送请求，发送前需要从令牌桶里拿到令牌，命中缓存时不消耗令牌"""
+    uri, school_id, size = payload['uri'], payload.get('school_id'), payload.get('size')
+    # 缓存是SQLite，淘汰和WAL检查点可能要等一会儿，放到线程池里，不卡住其它请求
+    cached = await engine.run_blocking(response_cache.get, API_URL, payload)
+    if cached is not None:
+        metrics.eol_cache_hits.inc(uri=uri)
+        return json.loads(cached.body)
+
+    if size is not None and 'page' in payload:
+        actual_size = page_sizes.size_for(uri, school_id, size)
+        if actual_size < size:
+            # 已经知道这么大的页会超出限制，直接拆开请求
+            metrics.eol_splits.inc(uri=uri, reason='learned')
+            return await split_request(payload, actual_size, dataset)
 
-def intercepted_eol_request(payload: dict, retry_interval=120) -> EolResponseData:
-    """向eol.cn的接口发送请求"""
     logging.debug('正在向eol.cn发送请求')
 
-    def send_request(payload):
-        return session.post('https://api.eol.cn/web/api/', json=payload)
+    async def send_request(payload) -> tuple[EolResponse, float]:
+        """返回响应和发出请求的时间"""
+        metrics.eol_queue_depth.inc()
+        try:
+            with metrics.eol_token_wait_seconds.time(uri=uri, dataset=dataset):
+                await eol_limiter.acquire()
+        finally:
+            metrics.eol_queue_depth.dec()
+        start = time.monotonic()
+        try:
+            res = await engine.run_blocking(
+                lambda: session.post(API_URL, json=payload)
+            )
+            body = res.json()
+        except (requests.exceptions.RequestException, ValueError):
+            metrics.eol_requests.inc(uri=uri, dataset=dataset, code='error')
+            raise
+        metrics.eol_request_seconds.observe(time.monotonic() - start, uri=uri, dataset=dataset, code=body['code'])
+        metrics.eol_requests.inc(uri=uri, dataset=dataset, code=body['code'])
+        return body, start
 
     # region 嗯造拦截器
     retries: int = 0
-    data: requests.Response | None = None
     while True:
-        data = send_request(payload)
-        body: EolResponse = data.json()
+        body, sent_at = await send_request(payload)
         code = body['code']
 
         logging.debug(f'响应代码：{code}')
 
         if code == '0000':
             """正常"""
+            rate_controller.on_success()
+            if size is not None:
+                page_sizes.on_success(uri, school_id, size)
             if retries > 0:
                 logging.info(f'第{retries}次重试成功')
             break
 
         if code == '1069':
-            """被限速"""
+            """被限速，降速并让所有请求一起停下来"""
             retries += 1
-            logging.warning(f'请求频率过高，{retry_interval}秒后进行第{retries}次重试')
-            time.sleep(retry_interval)
+            backoff = rate_controller.on_throttle(sent_at)
+            metrics.eol_backoff_seconds.inc(backoff, uri=uri)
+            logging.warning(
+                f'请求频率过高，请求间隔调整为{1 / rate_controller.rate:.2f}秒，'
+                f'{backoff:.0f}秒后进行第{retries}次重试'
+            )
             continue
 
         if code == '1090':
             """响应体大小超出限制"""
-            logging.warning('响应体大小超出限制，处理中')
-            modified_payload = copy.deepcopy(payload)
+            if size is None:
+                # 没有分页参数，无法拆开请求
+                raise NetworkException('单条数据超出响应体大小限制')
+            page_sizes.on_oversize(uri, school_id, size)
+            actual_size = page_sizes.size_for(uri, school_id, size)
+            if actual_size >= size:
+                raise NetworkException('单条数据超出响应体大小限制')
+            logging.warning(f'响应体大小超出限制，改为每页{actual_size}条')
+            metrics.eol_splits.inc(uri=uri, reason='oversize')
+            return await split_request(payload, actual_size, dataset)
 
-            modified_payload['size'] = payload['size'] // 3  # 10
-            modified_payload['page'] = (payload['page'] - 1) * 3 + 1
+        # 上边的if一个都没匹配到的话会跑到这里来
+        logging.fatal(f'未知错误：{code}')
+        logging.fatal(body['message'])
+        raise NetworkException('请求失败')
+    # endregion
 
-            time.sleep(QUERY_INTERVAL)
-            page_1 = intercepted_eol_request(modified_payload)
+    await engine.run_blocking(response_cache.put, API_URL, payload, 200, json.dumps(body['data'], ensure_ascii=False))
+    return body['data']
 
-            modified_payload['page'] += 1
 
-            time.sleep(QUERY_INTERVAL)
-            page_2 = intercepted_eol_request(modified_payload)
+async def split_request(payload: dict, sub_size: int, dataset: str = '') -> EolResponseData:
+    """用每页sub_size条的若干个小请求拼出原来的一页，小请求同样经过令牌桶并发发送"""
+    size, page = payload['size'], payload['page']
+    start = (page - 1) * size
+    first_sub_page = start // sub_size + 1
+    last_sub_page = math.ceil(page * size / sub_size)
 
-            page_1['item'] += page_2['item']
-            modified_payload['page'] += 1
+    sub_pages = await asyncio.gather(*(
+        eol_request({**payload, 'size': sub_size, 'page': sub_page}, dataset)
+        for sub_page in range(first_sub_page, last_sub_page + 1)
+    ))
 
-            time.sleep(QUERY_INTERVAL)
-            page_3 = intercepted_eol_request(modified_payload)
+    items = [item for sub_page in sub_pages for item in sub_page['item']]
+    offset = start - (first_sub_page - 1) * sub_size
+    data: EolResponseData = {
+        'item': items[offset:offset + size],
+        'numFound': sub_pages[0]['numFound']
+    }
+    await engine.run_blocking(response_cache.put, API_URL, payload, 200, json.dumps(data, ensure_ascii=False))
+    return data
 
-            page_1['item'] += page_3['item']
 
-            logging.info('处理完成')
-            return page_1
+def submit_eol_request(payload: dict, dataset: str = '') -> 'concurrent.futures.Future[EolResponseData]':
+    """把请求交给引擎排队，立即返回Future，调用方可以先去干别的"""
+    future = engine.submit(eol_request(payload, dataset))
+    with _pending_lock:
+        _pending.add(future)
+    future.add_done_callback(_forget)
+    return future
 
-        # 上边的if一个都没匹配到的话会跑到这里来
-        logging.fatal(f'未知错误：{code}')
-        logging.fatal(body['message'])
-        raise NetworkException('请求失败')
-    # endregion
 
-    return body['data']
+def _forget(future: concurrent.futures.Future):
+    with _pending_lock:
+        _pending.discard(future)
+
+
+def cancel_pending_requests() -> int:
+    """取消所有还在排队或等待响应的请求，等着它们的线程会收到CancelledError，返回取消的个数"""
+    with _pending_lock:
+        futures = list(_pending)
+    return sum(future.cancel() for future in futures)
+
+
+def intercepted_eol_request(payload: dict, dataset: str = '') -> EolResponseData:
+    """向eol.cn的接口发送请求并等待结果"""
+    return submit_eol_request(payload, dataset).result()
@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+
+class TaskKey(NamedTuple):
+    """一个爬取任务的标识，不适用的字段为None"""
+    dataset: str
+    """数据集，即输出CSV的前缀，如min_score"""
+    school_id: int
+    prov_id: Optional[int] = None
+    year: Optional[int] = None
+    type: Optional[int] = None
+    """科类"""
+    batch: Optional[int] = None
+    """招生批次"""
+    page: Optional[int] = None
+
+
+def _dump_field(v) -> str:
+    return '-' if v is None else str(v)
+
+
+def _load_field(v: str) -> Optional[int]:
+    return None if v == '-' else int(v)
+
+
+class Journal:
+    """只追加的任务完成记录，用于断点续爬
+
+    每行记录一个已完成的任务和此时对应CSV文件的长度（字节），
+    写入会先攒在内存里，攒够flush_every条或距上次写入超过flush_interval秒时一次性写入。
+    """
+
+    def __init__(self, path: str, flush_every: int = 50, flush_interval: float = 10):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.offsets: dict[str, int] = {}
+        """各数据集最后一条记录对应的CSV文件长度"""
+        self._done: set[TaskKey] = set()
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+        self._before_flush: list[Callable[[], None]] = []
+        self._lock = threading.RLock()
+
+        if os.path.exists(path):
+            self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        valid_length = 0
+        with open(self.path, 'rb') as f:
+            for raw_line in f:
+                line = raw_line.decode('utf-8')
+                fields = line.rstrip('\n').split('\t')
+                if not line.endswith('\n') or len(fields) != 8:
+                    # 写到一半就挂了的行
+                    break
+                key = TaskKey(fields[0], *(_load_field(v) for v in fields[1:7]))  # type: ignore
+                self._done.add(key)
+                self.offsets[key.dataset] = int(fields[7])
+                valid_length += len(raw_line)
+        os.truncate(self.path, valid_length)
+        logging.info(f'从{self.path}读取了{len(self._done)}条已完成任务')
+
+    def before_flush(self, callback: Callable[[], None]):
+        """注册在写入记录前调用的回调，用于先把CSV刷到磁盘"""
+        self._before_flush.append(callback)
+
+    def is_done(self, key: TaskKey) -> bool:
+        return key in self._done
+
+    def record(self, key: TaskKey, offset: int):
+        """记录任务完成，offset为写完该任务的行后CSV文件的长度，可以在多个线程中调用"""
+        with self._lock:
+            self._done.add(key)
+            self.offsets[key.dataset] = offset
+            self._buffer.append(
+                '\t'.join([key.dataset, *(_dump_field(v) for v in key[1:]), str(offset)]) + '\n'
+            )
+            if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush > self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._buffer:
+                for callback in self._before_flush:
+                    callback()
+                self._file.write(''.join(self._buffer))
+                self._file.flush()
+                self._buffer.clear()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._file.close()
+
+
+def read_school_offsets(path: str, dataset: str) -> list[tuple[int, int]]:
+    """从journal文件读出dataset各高校爬完时的(school_id, CSV文件长度)，按爬完的先后排列"""
+    offsets = []
+    with open(path, 'rb') as f:
+        for raw_line in f:
+            line = raw_line.decode('utf-8')
+            fields = line.rstrip('\n').split('\t')
+            if not line.endswith('\n') or len(fields) != 8:
+                break
+            if fields[0] == dataset and all(v == '-' for v in fields[2:7]):
+                offsets.append((int(fields[1]), int(fields[7])))
+    return offsets
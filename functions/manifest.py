@@ -0,0 +1,60 @@
+import datetime
+import os
+import threading
+from typing import Iterable
+from functions.journal import TaskKey, _dump_field, _load_field
+
+
+class Manifest:
+    """跨运行的已爬取清单，用于增量爬取
+
+    记录每所高校每个数据集已经完整爬过的(省份, 年份, 科类, 批次)组合，
+    新的运行用最新的元数据减去清单里的组合，只爬新出现的组合。
+    当年的数据在录取季里还会变，只记录final_before之前的年份。
+    清单只追加，一次记录一次write，多个分片进程写同一个文件也不会串行。
+    """
+
+    def __init__(self, path: str, final_before: int = datetime.date.today().year):
+        self.path = path
+        self.final_before = final_before
+        self._known: set[TaskKey] = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if not line.endswith('\n') or len(fields) != 6:
+                    continue
+                self._known.add(TaskKey(fields[0], *(_load_field(v) for v in fields[1:])))
+
+    @staticmethod
+    def combo_of(key: TaskKey) -> TaskKey:
+        """任务所属的组合，即去掉页码"""
+        return key._replace(page=None)
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def is_known(self, key: TaskKey) -> bool:
+        """key所属的组合是否已经完整爬过"""
+        return self.combo_of(key) in self._known
+
+    def record(self, keys: Iterable[TaskKey]):
+        """记录已经完整爬完的组合，当年的组合会被忽略"""
+        lines = []
+        with self._lock:
+            for key in map(self.combo_of, keys):
+                if key.year is None or key.year >= self.final_before or key in self._known:
+                    continue
+                self._known.add(key)
+                lines.append('\t'.join(_dump_field(v) for v in key[:6]) + '\n')
+            if lines:
+                os.write(self._fd, ''.join(lines).encode('utf-8'))
+
+    def close(self):
+        with self._lock:
+            os.close(self._fd)
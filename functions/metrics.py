@@ -0,0 +1,262 @@
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterator, Optional
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+"""直方图默认的分桶上限，单位为秒"""
+
+
+def _label_text(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """带标签的指标，同一组标签值对应一个样本"""
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple[tuple[str, str], ...], float] = {}
+
+    def _key(self, labels: dict) -> tuple[tuple[str, str], ...]:
+        return tuple((name, str(labels[name])) for name in self.labels)
+
+    def samples(self) -> list[tuple[dict[str, str], float]]:
+        with self._lock:
+            return [(dict(key), value) for key, value in self._values.items()]
+
+    def render(self) -> Iterator[str]:
+        """Prometheus文本格式"""
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.kind}'
+        with self._lock:
+            for key, value in self._values.items():
+                yield f'{self.name}{_label_text(key)} {_number(value)}'
+
+    def summary(self) -> list[dict]:
+        return [{'labels': labels, 'value': value} for labels, value in self.samples()]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._counts: dict[tuple[tuple[str, str], ...], list[int]] = {}
+        self._sums: dict[tuple[tuple[str, str], ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """记录with块的耗时，在协程里跨await使用记录的是挂钟时间"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} {self.kind}'
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    yield f'{self.name}_bucket{_label_text(key + (("le", _number(bound)),))} {cumulative}'
+                yield f'{self.name}_sum{_label_text(key)} {_number(self._sums[key])}'
+                yield f'{self.name}_count{_label_text(key)} {cumulative}'
+
+    def summary(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    'labels': dict(key),
+                    'count': sum(counts),
+                    'sum': self._sums[key],
+                    'mean': self._sums[key] / sum(counts),
+                    'buckets': {_number(bound): count for bound, count in zip(self.buckets, counts)}
+                }
+                for key, counts in self._counts.items()
+            ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        return ''.join(line + '\n' for metric in self.metrics.values() for line in metric.render())
+
+    def summary(self) -> dict:
+        return {
+            name: {'type': metric.kind, 'help': metric.help, 'samples': metric.summary()}
+            for name, metric in self.metrics.items()
+        }
+
+
+registry = Registry()
+"""全局的指标，一个进程一份，分片进程各自导出"""
+
+# region 指标
+
+eol_requests = registry.counter(
+    'gkcx_eol_requests_total', '发往api.eol.cn的请求数，dataset为空的是高校列表等不属于数据集的请求', ('uri', 'dataset', 'code')
+)
+eol_request_seconds = registry.histogram(
+    'gkcx_eol_request_seconds', 'api.eol.cn请求的网络耗时', ('uri', 'dataset', 'code')
+)
+eol_token_wait_seconds = registry.histogram(
+    'gkcx_eol_token_wait_seconds', '在令牌桶前排队等待的时间', ('uri', 'dataset')
+)
+eol_backoff_seconds = registry.counter(
+    'gkcx_eol_backoff_seconds_total', '被限速（1069）后退避的总时长', ('uri',)
+)
+eol_splits = registry.counter(
+    'gkcx_eol_splits_total', '因响应体超出限制（1090）被拆开的页数，reason为learned时是按学到的条数提前拆开的', ('uri', 'reason')
+)
+eol_cache_hits = registry.counter(
+    'gkcx_eol_cache_hits_total', '命中缓存、不用排队的api.eol.cn请求数', ('uri',)
+)
+eol_queue_depth = registry.gauge(
+    'gkcx_eol_queue_depth', '正在令牌桶前排队的请求数'
+)
+static_requests = registry.counter(
+    'gkcx_static_requests_total', '发往static-data.gaokao.cn的请求数', ('endpoint', 'status')
+)
+static_request_seconds = registry.histogram(
+    'gkcx_static_request_seconds', 'static-data.gaokao.cn请求的网络耗时', ('endpoint', 'status')
+)
+static_queue_depth = registry.gauge(
+    'gkcx_static_queue_depth', '已交给static线程池但还没完成的文件数'
+)
+rows_written = registry.counter(
+    'gkcx_rows_total', '写出的行数', ('dataset',)
+)
+rows_per_second = registry.gauge(
+    'gkcx_rows_per_second', '最近一个导出周期内每秒写出的行数', ('dataset',)
+)
+xlsx_save_seconds = registry.histogram(
+    'gkcx_xlsx_save_seconds', '生成一次xlsx的耗时'
+)
+
+# endregion
+
+
+class MetricsExporter:
+    """每隔interval秒把指标写成Prometheus文本文件（可交给node_exporter的textfile收集器），结束时再写一份JSON汇总"""
+
+    def __init__(self, path: str, interval: float = 60, registry: Registry = registry):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._started = time.monotonic()
+        self._last = (self._started, self._rows())
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+            self._thread.start()
+
+    def _rows(self) -> dict[str, float]:
+        return {labels['dataset']: value for labels, value in rows_written.samples()}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError:
+                logging.warning(f'写入{self.path}失败')
+
+    def export(self):
+        """更新速率类的gauge并写出文本文件，先写临时文件再替换，采集方不会读到半个文件"""
+        now, rows = time.monotonic(), self._rows()
+        last_time, last_rows = self._last
+        if now > last_time:
+            for dataset, value in rows.items():
+                rows_per_second.set((value - last_rows.get(dataset, 0)) / (now - last_time), dataset=dataset)
+        self._last = (now, rows)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.registry.render())
+        os.replace(temp_path, self.path)
+
+    def finish(self, summary_path: str):
+        """停止定期导出，最后写一次文本文件和JSON汇总"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        elapsed = time.monotonic() - self._started
+        # 汇总里的速率按整个运行计算
+        self._last = (self._started, {})
+        self.export()
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(
+                {'elapsed_seconds': elapsed, 'metrics': self.registry.summary()},
+                f, ensure_ascii=False, indent=2
+            )
@@ -0,0 +1,52 @@
+from typing import Optional
+
+
+class PageSizeManager:
+    """记住每个(uri, school_id)能成功返回的每页条数
+
+    遇到1090（响应体大小超出限制）后，之后的请求直接使用已知能成功的条数；
+    连续成功probe_after次后会在已知成功和已知失败的条数之间试探一个更大的值。
+    """
+
+    def __init__(self, probe_after: int = 20, split_factor: int = 3):
+        self.probe_after = probe_after
+        self.split_factor = split_factor
+        self._good: dict[tuple, int] = {}
+        """成功过的最大条数"""
+        self._bad: dict[tuple, int] = {}
+        """失败过的最小条数"""
+        self._streak: dict[tuple, int] = {}
+        """在当前条数下连续成功的次数"""
+
+    def size_for(self, uri: str, school_id: Optional[int], requested: int) -> int:
+        """实际请求时应该使用的每页条数，不会超过requested"""
+        key = (uri, school_id)
+        bad = self._bad.get(key)
+        if bad is None or requested < bad:
+            return requested
+        good = self._good.get(key)
+        if good is None:
+            return max(1, bad // self.split_factor)
+        if self._streak.get(key, 0) >= self.probe_after and bad - good > 1:
+            # 试探一下更大的条数
+            return (good + bad) // 2
+        return good
+
+    def on_success(self, uri: str, school_id: Optional[int], size: int):
+        key = (uri, school_id)
+        if size > self._good.get(key, 0):
+            self._good[key] = size
+            self._streak[key] = 0
+        else:
+            self._streak[key] = self._streak.get(key, 0) + 1
+        bad = self._bad.get(key)
+        if bad is not None and size >= bad:
+            # 服务器的限制可能放宽了
+            del self._bad[key]
+
+    def on_oversize(self, uri: str, school_id: Optional[int], size: int):
+        key = (uri, school_id)
+        self._bad[key] = min(size, self._bad.get(key, size))
+        if self._good.get(key, 0) >= size:
+            del self._good[key]
+        self._streak[key] = 0
@@ -0,0 +1,82 @@
+from type import EolResponseData
+from functions.intercepted_requests import intercepted_eol_request, submit_eol_request
+from exceptions import NetworkException
+from typing import Callable, Iterator, Optional
+import collections
+import math
+import requests
+
+PAGE_SIZES = {
+    'apidata/api/gk/school/lists': 20,
+    'apidata/api/gkv3/plan/school': 30,
+    'apidata/api/gk/score/special': 30,
+}
+"""各接口默认的每页条数，断点续爬时不要修改，否则页码对不上"""
+
+PREFETCH_PAGES = 8
+"""每个分页请求最多提前排队的页数，限制了同时留在内存里的响应数"""
+
+
+def _no_skip(page: int) -> bool:
+    return False
+
+
+def iter_pages(
+    payload: dict,
+    start_page: int = 1,
+    end_page: Optional[int] = None,
+    skip: Callable[[int], bool] = _no_skip,
+    dataset: str = ''
+) -> Iterator[tuple[int, EolResponseData]]:
+    """分页请求eol.cn的接口，逐页返回(页码, 响应)
+
+    第一页的响应直接返回，同时用它的numFound算出总页数，剩下的页面交给引擎排队，
+    最多提前PREFETCH_PAGES页，每拿走一页再补上一页。
+    skip返回True的页面不会被请求，但第一页总是需要请求的。dataset用作请求指标的标签。
+    """
+    size = payload.get('size') or PAGE_SIZES[payload['uri']]
+    try:
+        first = intercepted_eol_request({**payload, 'page': start_page, 'size': size}, dataset)
+    except requests.exceptions.RequestException:
+        raise NetworkException('网络错误')
+
+    page_count = math.ceil(first['numFound'] / size)
+    if end_page is not None:
+        page_count = min(page_count, end_page)
+
+    pending = (
+        page for page in range(start_page + 1, page_count + 1) if not skip(page)
+    )
+    futures: collections.deque = collections.deque()
+
+    def fill():
+        while len(futures) < PREFETCH_PAGES:
+            page = next(pending, None)
+            if page is None:
+                return
+            futures.append((page, submit_eol_request({**payload, 'page': page, 'size': size}, dataset)))
+
+    fill()
+
+    try:
+        if start_page <= page_count and not skip(start_page):
+            yield start_page, first
+
+        while futures:
+            page, future = futures.popleft()
+            try:
+                data = future.result()
+            except requests.exceptions.RequestException:
+                raise NetworkException('网络错误')
+            fill()
+            yield page, data
+    finally:
+        # 调用方提前停下时，还在排队的页面不必再请求
+        for _, future in futures:
+            future.cancel()
+
+
+def paginate(payload: dict, start_page: int = 1, end_page: Optional[int] = None) -> Iterator[dict]:
+    """分页请求eol.cn的接口，逐条返回item"""
+    for _, data in iter_pages(payload, start_page, end_page):
+        yield from data['item']
@@ -0,0 +1,59 @@
+import multiprocessing
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+_queues: Optional[list] = None
+"""工作进程里每个任务对应的队列，由Pool的initializer传入"""
+
+
+def _init_worker(queues: list):
+    global _queues
+    _queues = queues
+
+
+def _run_task(index: int, func: Callable[..., Iterable[list]], args: tuple):
+    """在工作进程里执行一个任务，把它产出的每一批放进对应的队列，最后放一个None表示结束"""
+    assert _queues is not None
+    queue = _queues[index]
+    try:
+        for batch in func(*args):
+            queue.put(batch)
+    finally:
+        queue.put(None)
+
+
+class BatchPool:
+    """在jobs个工作进程里并行执行一组生成器函数，按提交的顺序读回它们产出的批次
+
+    每个任务有一个最多容纳queue_size批的队列，读的一方跟不上时工作进程会停下来等，不会把整个文件读进内存。
+    任务按提交的顺序开始执行，读的一方也应按这个顺序读，这样正在读的任务一定已经开始或排在最前面，不会互相等待而卡住。
+    func和它产出的批次都要能被pickle，func中的异常会在读到它的结果时重新抛出。
+    """
+
+    def __init__(self, jobs: int, tasks: list[tuple[Callable[..., Iterable[list]], tuple]], queue_size: int = 4):
+        self._queues = [multiprocessing.Queue(queue_size) for _ in tasks]
+        self._pool = multiprocessing.Pool(jobs, _init_worker, (self._queues,))
+        self._results = [
+            self._pool.apply_async(_run_task, (i, func, args)) for i, (func, args) in enumerate(tasks)
+        ]
+        self._pool.close()
+
+    def iter_batches(self, index: int) -> Iterator[list[Any]]:
+        """逐批读出第index个任务的结果"""
+        queue = self._queues[index]
+        while True:
+            batch = queue.get()
+            if batch is None:
+                break
+            yield batch
+        self._results[index].get()
+
+    def close(self):
+        """结束所有工作进程，未读完的任务会被丢弃"""
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self) -> 'BatchPool':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
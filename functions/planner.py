@@ -0,0 +1,161 @@
+import collections
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+CDN_REQUEST_SECONDS = 0.2
+"""估算用时时假设的一次CDN请求的耗时，单位为秒"""
+
+
+def format_duration(seconds: float) -> str:
+    """把秒数格式化成H:MM:SS"""
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+class DatasetPlan:
+    """一个数据集要发出的请求
+
+    api为True时数据页来自api.eol.cn，受令牌桶限速，否则来自CDN。
+    没有请求过各批次的第一页时不知道有多少页，pages按每个组合一页计，是下限，exact为False。
+    """
+
+    def __init__(self, dataset: str, description: str, api: bool):
+        self.dataset = dataset
+        self.description = description
+        self.api = api
+        self.schools = 0
+        self.combos = 0
+        self.pages = 0
+        self.exact = not api
+
+
+class CrawlPlan:
+    """一次爬取的计划：各数据集的组合数、请求数，以及按当前速率估算的用时"""
+
+    def __init__(self):
+        self.datasets: dict[str, DatasetPlan] = {}
+        self.schools = 0
+        self.metadata_requests = 0
+        """元数据文件的CDN请求数"""
+        self.school_requests: collections.Counter = collections.Counter()
+        """各高校的api.eol.cn请求数，键为school_id，高校可能重名"""
+        self.school_names: dict[int, str] = {}
+        """school_id到高校名，显示时用"""
+
+    def add_school_requests(self, univ: dict, count: int):
+        self.school_requests[univ['school_id']] += count
+        self.school_names[univ['school_id']] = univ['name']
+
+    def add_dataset(self, dataset: str, description: str, api: bool) -> DatasetPlan:
+        self.datasets[dataset] = DatasetPlan(dataset, description, api)
+        return self.datasets[dataset]
+
+    @property
+    def exact(self) -> bool:
+        return all(plan.exact for plan in self.datasets.values())
+
+    @property
+    def api_requests(self) -> int:
+        return sum(plan.pages for plan in self.datasets.values() if plan.api)
+
+    @property
+    def cdn_requests(self) -> int:
+        return self.metadata_requests + sum(plan.pages for plan in self.datasets.values() if not plan.api)
+
+    def estimate_seconds(self, rate: float, static_concurrency: int) -> float:
+        """api.eol.cn的请求数除以速率（次/秒），和CDN请求同时进行，取较慢的一方"""
+        return max(
+            self.api_requests / rate,
+            self.cdn_requests * CDN_REQUEST_SECONDS / static_concurrency
+        )
+
+    def report(self, rate: float, static_concurrency: int, top: int = 5) -> list[str]:
+        """计划的文字说明，每个元素为一行"""
+        lines = [f'共{self.schools}所高校，元数据{self.metadata_requests}个']
+        for plan in self.datasets.values():
+            source = 'api.eol.cn' if plan.api else 'CDN'
+            bound = '' if plan.exact else '至少'
+            lines.append(
+                f'{plan.description}：{plan.schools}所高校，{plan.combos}个组合，'
+                f'{source}请求{bound}{plan.pages}次'
+            )
+        bound = '' if self.exact else '至少'
+        lines.append(
+            f'合计：api.eol.cn请求{bound}{self.api_requests}次，CDN请求{self.cdn_requests}次，'
+            f'按每{1 / rate:.2f}秒一次请求估计{bound}需要{format_duration(self.estimate_seconds(rate, static_concurrency))}'
+        )
+        if self.school_requests:
+            heaviest = '，'.join(
+                f'{self.school_names.get(school_id, school_id)}（{count}次）'
+                for school_id, count in self.school_requests.most_common(top)
+            )
+            lines.append(f'api.eol.cn请求最多的高校：{heaviest}')
+        return lines
+
+
+class ProgressTracker:
+    """根据计划和已完成的请求估算剩余时间
+
+    计划不精确时，用已开始的组合平均每个要几页来推算剩下的组合，随着爬取的进行越来越准。
+    剩余时间只算api.eol.cn的请求，它们受令牌桶限速，比CDN请求慢得多。
+    """
+
+    def __init__(self, plan: Optional[CrawlPlan], rate: Callable[[], float], interval: float = 60):
+        self.plan = plan
+        """plan为None时还在统计，统计完由set_plan补上，在此之前只计数"""
+        self.rate = rate
+        self.interval = interval
+        self.started: collections.Counter = collections.Counter()
+        """各数据集已经开始的组合数"""
+        self.pages: collections.Counter = collections.Counter()
+        """各数据集已经拿到的页数"""
+        self._last_log = time.monotonic()
+        self._lock = threading.Lock()
+
+    def combo_started(self, dataset: str):
+        with self._lock:
+            self.started[dataset] += 1
+
+    def page_done(self, dataset: str):
+        with self._lock:
+            self.pages[dataset] += 1
+            now = time.monotonic()
+            due = self.interval > 0 and now - self._last_log >= self.interval
+            if due:
+                self._last_log = now
+        if due and self.plan is not None:
+            logging.info(f'进度：{self.describe()}')
+
+    def set_plan(self, plan: CrawlPlan):
+        with self._lock:
+            self.plan = plan
+
+    def expected_pages(self, dataset: str) -> float:
+        """数据集预计的总页数"""
+        plan = self.plan.datasets[dataset]
+        if plan.exact or not self.started[dataset]:
+            return plan.pages
+        return max(plan.pages, plan.combos * self.pages[dataset] / self.started[dataset])
+
+    def api_done(self) -> int:
+        return sum(self.pages[plan.dataset] for plan in self.plan.datasets.values() if plan.api)
+
+    def api_total(self) -> float:
+        return sum(
+            max(self.expected_pages(plan.dataset), self.pages[plan.dataset])
+            for plan in self.plan.datasets.values() if plan.api
+        )
+
+    def eta(self) -> float:
+        """预计还需要的秒数"""
+        return max(self.api_total() - self.api_done(), 0) / self.rate()
+
+    def describe(self) -> str:
+        with self._lock:
+            if self.plan is None:
+                return '正在统计请求数'
+            done, total, eta = self.api_done(), self.api_total(), self.eta()
+        bound = '' if self.plan.exact else '约'
+        return f'api.eol.cn请求{done}/{bound}{total:.0f}次，预计还需{format_duration(eta)}'
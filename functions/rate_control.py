@@ -0,0 +1,149 @@
+import json
+import logging
+import math
+import os
+import random
+import time
+from typing import NamedTuple, Optional
+from functions.rate_limiter import TokenBucket
+
+
+class ThrottleEvent(NamedTuple):
+    """一次被限速（1069）的记录"""
+    time: float
+    """发生时间，Unix时间戳"""
+    rate_before: float
+    """降速前的速率，单位为次每秒"""
+    rate_after: float
+    """降速后的速率"""
+    backoff: float
+    """本次退避的秒数"""
+
+
+class AimdController:
+    """加性增、乘性减（AIMD）的速率控制器
+
+    响应为0000时每次把速率加上increase，遇到1069时把速率乘以decrease，
+    并让令牌桶暂停一段带随机抖动的指数退避时间。
+    降速之前发出的请求再返回1069时不会重复降速，一次拥塞只降一次。
+    得到过0000响应的速率才算安全，安全速率会写入state_file，下次运行从这个速率起步。
+    """
+
+    def __init__(
+        self,
+        initial_interval: float = 10,
+        min_interval: float = 1,
+        max_interval: float = 120,
+        increase: float = 0.001,
+        decrease: float = 0.5,
+        backoff_base: float = 30,
+        backoff_max: float = 600,
+        adaptive: bool = True,
+        state_file: Optional[str] = None
+    ):
+        self.bucket = TokenBucket(1 / initial_interval)
+        self.history: list[ThrottleEvent] = []
+        """被限速的历史记录"""
+        self.configure(
+            initial_interval, min_interval, max_interval, increase, decrease,
+            backoff_base, backoff_max, adaptive, state_file
+        )
+
+    def configure(
+        self,
+        initial_interval: float,
+        min_interval: float = 1,
+        max_interval: float = 120,
+        increase: float = 0.001,
+        decrease: float = 0.5,
+        backoff_base: float = 30,
+        backoff_max: float = 600,
+        adaptive: bool = True,
+        state_file: Optional[str] = None
+    ):
+        """重新设置参数，如果有保存的速率则从保存的速率起步"""
+        self.max_rate = 1 / min_interval
+        self.min_rate = 1 / max_interval
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.adaptive = adaptive
+        self.state_file = state_file
+        self._successes = 0
+        self._consecutive_throttles = 0
+        self._last_decrease = -math.inf
+        """上一次降速的时间，time.monotonic()"""
+        self._paused_until = -math.inf
+
+        rate = 1 / initial_interval
+        if adaptive:
+            saved = self._load()
+            if saved:
+                logging.info(f'从上次运行学到的速率起步：每{1 / saved:.2f}秒一次请求')
+                rate = saved
+        self.bucket.set_rate(self._clamp(rate))
+        self.safe_rate = self.rate
+        """得到过0000响应的速率，加速之后还没有被验证过的速率不算"""
+
+    @property
+    def rate(self) -> float:
+        """当前速率，单位为次每秒"""
+        return self.bucket.rate
+
+    def _clamp(self, rate: float) -> float:
+        return max(self.min_rate, min(self.max_rate, rate))
+
+    def _load(self) -> Optional[float]:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return float(json.load(f)['safe_rate'])
+        except (OSError, ValueError, KeyError):
+            logging.warning('速率状态文件损坏，已忽略')
+            return None
+
+    def save(self):
+        """把安全速率写入状态文件"""
+        if not self.adaptive or not self.state_file:
+            return
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump({'safe_rate': self.safe_rate, 'updated': time.time()}, f)
+
+    def on_success(self):
+        """响应为0000时调用"""
+        self._consecutive_throttles = 0
+        if not self.adaptive:
+            return
+        # 这个速率刚被验证过，加速后的速率要等下一次0000
+        self.safe_rate = self.rate
+        self.bucket.set_rate(self._clamp(self.rate + self.increase))
+        self._successes += 1
+        if self._successes % 50 == 0:
+            self.save()
+
+    def on_throttle(self, sent_at: Optional[float] = None) -> float:
+        """响应为1069时调用，返回需要退避的秒数，令牌桶已经被暂停
+
+        sent_at为这个请求发出的时间（time.monotonic()），早于上一次降速的说明是同一次拥塞，
+        只返回剩下的退避时间，不再降速。
+        """
+        now = time.monotonic()
+        if sent_at is not None and sent_at < self._last_decrease:
+            return max(self._paused_until - now, 0)
+        self._consecutive_throttles += 1
+        rate_before = self.rate
+        if self.adaptive:
+            self.bucket.set_rate(self._clamp(rate_before * self.decrease))
+            self.safe_rate = min(self.safe_rate, self.rate)
+        backoff = min(
+            self.backoff_max,
+            self.backoff_base * 2 ** (self._consecutive_throttles - 1)
+        ) * random.uniform(0.5, 1)
+        self.bucket.pause(backoff)
+        self._last_decrease = now
+        self._paused_until = now + backoff
+        self.history.append(ThrottleEvent(time.time(), rate_before, self.rate, backoff))
+        self.save()
+        return backoff
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """令牌桶限速器，每秒放出rate个令牌，桶中最多存放capacity个令牌"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens: float = capacity
+        self._updated = time.monotonic()
+        self._lock: asyncio.Lock | None = None  # 在事件循环里再创建，兼容3.9
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        """等待并取走一个令牌，等待者按先来后到的顺序放行"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """清空令牌桶，seconds秒内不再放出令牌"""
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+    def set_rate(self, rate: float):
+        """修改放出令牌的速率，已经积攒的令牌不受影响"""
+        self._refill()
+        self.rate = rate
@@ -0,0 +1,68 @@
+import functools
+import sys
+from typing import Any, Iterable, NamedTuple, Optional
+from type import EnrollPlan, MiniumScoreForMajors, MiniumScoreForUnivs, Univ, UnivBrief
+
+# 各行类型里取值重复很多的分类列才驻留，专业名、学费、分数之类几乎各不相同，驻留只是白白查一次表
+INTERNED_FIELDS = {
+    MiniumScoreForUnivs: {'name', 'located_province', 'target_province', 'major', 'enroll_level', 'enroll_type'},
+    EnrollPlan: {'name', 'located_province', 'target_province', 'major', 'enroll_level'},
+    MiniumScoreForMajors: {'name', 'located_province', 'target_province', 'major', 'enroll_level'}
+}
+
+
+def intern_value(value):
+    """字符串驻留，同样的高校名、省份名、批次名等在内存里只留一份"""
+    return sys.intern(value) if type(value) is str else value
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(row_type) -> Any:
+    """和TypedDict字段及顺序都相同的NamedTuple，作为行在内存里的紧凑表示
+
+    dict每行都带一张键表和哈希表，NamedTuple只有一个定长的元组，按字段名取值的写法不变。
+    """
+    return NamedTuple(f'{row_type.__name__}Record', list(row_type.__annotations__.items()))
+
+
+@functools.lru_cache(maxsize=None)
+def interned_flags(row_type) -> tuple[bool, ...]:
+    """按字段顺序标出哪些列要驻留，见INTERNED_FIELDS"""
+    fields = INTERNED_FIELDS.get(row_type, ())
+    return tuple(name in fields for name in record_type(row_type)._fields)
+
+
+def make_record(row_type, **fields) -> Any:
+    """按字段名构造一行，分类列驻留，其余列原样保留"""
+    cls = record_type(row_type)
+    return cls._make(
+        intern_value(fields[name]) if flag else fields[name]
+        for name, flag in zip(cls._fields, interned_flags(row_type))
+    )
+
+
+def to_record(row_type, values: Iterable) -> Any:
+    """按字段顺序构造一行，分类列驻留，其余列原样保留"""
+    return record_type(row_type)._make(
+        intern_value(value) if flag else value
+        for flag, value in zip(interned_flags(row_type), values)
+    )
+
+
+def parse_int(value) -> Optional[int]:
+    """整数列的值，接口偶尔在整数列里返回'-'之类的占位符，这时返回None"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.lstrip('-').isdigit():
+        return int(value)
+    return None
+
+
+def slim_univ(univ: Univ) -> UnivBrief:
+    """只保留爬取时用到的字段，大学列表接口返回的其余四十来个字段都丢掉"""
+    return {
+        'school_id': univ['school_id'],
+        'name': intern_value(univ['name']),
+        'code_enroll': univ['code_enroll'],
+        'province_name': intern_value(univ['province_name'])
+    }
@@ -5,7 +5,15 @@ Retry.DEFAULT_BACKOFF_MAX = 20
 
 session = requests.Session()
 retries = Retry(total=10, backoff_factor=1, status_forcelist=[500, 502])
-session.mount('https://', HTTPAdapter(max_retries=retries))
+
+
+def set_pool_size(maxsize: int):
+    """设置每个域名的连接池大小，不应小于同时发出的请求数，否则多出来的连接用完就被丢掉"""
+    for prefix in ('https://', 'http://'):
+        session.mount(prefix, HTTPAdapter(max_retries=retries, pool_maxsize=maxsize))
+
+
+set_pool_size(10)
 
 session.headers.update({
     'accept': 'application/json, text/plain, */*',
@@ -0,0 +1,75 @@
+import csv
+import heapq
+import io
+import json
+import os
+from typing import Any, Iterator
+from type import UnivBrief
+from functions.journal import read_school_offsets
+from functions.sinks import CsvSink, read_csv_rows
+
+
+def shard_of(univ: UnivBrief, shards: int) -> int:
+    """高校所属的分片，只取决于school_id，换个顺序或者重跑都不会变"""
+    return int(univ['school_id']) % shards
+
+
+def shard_run_id(run_id: str, shard: int) -> str:
+    """分片的运行ID，分片的输出文件和journal都以它命名"""
+    return f'{run_id}_s{shard}'
+
+
+def save_univ_list(path: str, univ_list: list[UnivBrief]):
+    """保存全部高校列表，重跑某个分片时用同一份列表分片"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(univ_list, f, ensure_ascii=False)
+
+
+def load_univ_list(path: str) -> list[UnivBrief]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def done_marker(run_id: str, shard: int) -> str:
+    """分片完成后创建的标记文件"""
+    return f'{shard_run_id(run_id, shard)}.done'
+
+
+def _iter_shard_rows(dataset: str, row_type: Any, run_id: str, order: dict[int, int]) -> Iterator[tuple[int, Any]]:
+    """逐行返回分片的(高校在高校列表中的位置, 行)
+
+    行里没有school_id，靠分片journal记下的各高校爬完时CSV的长度，按字节把CSV切成一段段，每段是一所高校的行。
+    最后一所高校之后的行（分片没有爬完时才会有）排在所有高校后面。
+    """
+    csv_path = f'{dataset}_{run_id}.csv'
+    journal_path = f'journal_{run_id}.tsv'
+    schools = read_school_offsets(journal_path, dataset) if os.path.exists(journal_path) else []
+    with open(csv_path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8')]), [])
+        for school_id, end in schools:
+            chunk = f.read(max(end - f.tell(), 0)).decode('utf-8')
+            position = order.get(school_id, len(order))
+            for row in read_csv_rows(io.StringIO(chunk, newline=''), row_type, header):
+                yield position, row
+        rest = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        for row in read_csv_rows(rest, row_type, header):
+            yield len(order), row
+
+
+def merge_shard_outputs(dataset: str, row_type: Any, run_id: str, shards: int, univ_list: list[UnivBrief]) -> str:
+    """把各分片的输出按高校在univ_list中的顺序合并成一个文件，返回合并后的文件路径
+
+    每个分片内部的行已经按高校列表的顺序排好，一所高校只属于一个分片，
+    所以用k路归并逐行合并即可，不需要把数据全部读进内存。高校可能重名，顺序按school_id确定。
+    """
+    order = {int(univ['school_id']): i for i, univ in enumerate(univ_list)}
+    parts = [
+        _iter_shard_rows(dataset, row_type, shard_run_id(run_id, shard), order)
+        for shard in range(shards)
+        if os.path.exists(f'{dataset}_{shard_run_id(run_id, shard)}.csv')
+    ]
+    path = f'{dataset}_{run_id}.csv'
+    sink = CsvSink(path, row_type)
+    sink.write_rows(row for _, row in heapq.merge(*parts, key=lambda item: item[0]))
+    sink.close()
+    return path
@@ -0,0 +1,222 @@
+import abc
+import csv
+import itertools
+import os
+import sqlite3
+import threading
+import openpyxl
+from typing import Any, Iterable, Iterator, Optional, Sequence
+from functions.rows import to_record
+
+
+def _restore(value: Optional[str], annotation) -> Any:
+    if value is None or value == '':
+        return None
+    if annotation is int and value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+
+def iter_csv_rows(path: str, row_type: Any) -> Iterator[Any]:
+    """逐行读取爬虫输出的CSV，返回row_type对应的NamedTuple，空字符串还原为None，整数列还原为int
+
+    按表头找列，列的顺序与row_type不同或者缺了某列也能读。
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from read_csv_rows(f, row_type)
+
+
+def read_csv_rows(lines: Iterable[str], row_type: Any, header: Optional[list[str]] = None) -> Iterator[Any]:
+    """同iter_csv_rows，从lines中读取，header为None时第一行是表头"""
+    reader = csv.reader(lines)
+    if header is None:
+        header = next(reader, [])
+    columns = [(header.index(k) if k in header else None, t) for k, t in row_type.__annotations__.items()]
+    for row in reader:
+        if not row:
+            continue
+        yield to_record(row_type, (
+            _restore(row[i] if i is not None and i < len(row) else None, t) for i, t in columns
+        ))
+
+
+class RowSink(abc.ABC):
+    """行的去处，爬虫和merge.py都通过它输出数据
+
+    每行是按row_type字段顺序排列的序列，通常是functions/rows.py中的NamedTuple。
+    子类必须实现write_rows，没实现的在创建时就会报TypeError。
+    """
+
+    @abc.abstractmethod
+    def write_rows(self, rows: Iterable[Sequence]):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CsvSink(RowSink):
+    """写入CSV文件
+
+    offset不为None时为续写模式：先把文件截断到offset字节，再追加写入，
+    offset为0或文件不存在时重新写表头。
+    """
+
+    def __init__(self, path: str, row_type: Any, offset: Optional[int] = None):
+        self.path = path
+        fieldnames = list(row_type.__annotations__.keys())
+        if offset is not None and os.path.exists(path):
+            os.truncate(path, offset)
+            self.file = open(path, 'a', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.file)
+            if offset == 0:
+                self.writer.writerow(fieldnames)
+        else:
+            self.file = open(path, 'w', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(fieldnames)
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        self.writer.writerows(rows)
+
+    def tell(self) -> int:
+        """当前文件长度，会把缓冲区里的内容刷到系统"""
+        return self.file.tell()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxWorkbookSink:
+    """write-only模式的XLSX文件，每张表是一个RowSink，close时保存"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+
+    def add_sheet(self, title: str, header: list[str]) -> 'XlsxSheetSink':
+        ws = self.workbook.create_sheet(title)
+        ws.append(header)
+        return XlsxSheetSink(ws)
+
+    def close(self):
+        tmp_path = f'{self.path}.tmp'
+        self.workbook.save(tmp_path)
+        os.replace(tmp_path, self.path)
+
+
+class XlsxSheetSink(RowSink):
+    """XLSX中的一张表"""
+
+    def __init__(self, ws):
+        self.ws = ws
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        for row in rows:
+            self.ws.append(list(row))
+
+
+SQLITE_INDEXES = (
+    ('name',),
+    ('target_province', 'year', 'minium_score'),
+    ('target_province', 'year', 'minium_rank')
+)
+"""SQLite中各表除自然键外的索引，对应按高校名称、按面向省份和年份查分数或位次范围，表里没有的列会被略去"""
+
+
+def _quote(name: str) -> str:
+    return f'"{name}"'
+
+
+class SqliteDatabaseSink:
+    """SQLite数据库，每个数据集一张表，每张表是一个RowSink
+
+    所有表共用一个WAL模式的连接，可以在多个线程里写入。写入攒在一个事务里，
+    攒够commit_rows行或调用commit时提交，close时也会提交。
+    """
+
+    def __init__(self, path: str, commit_rows: int = 10000):
+        self.path = path
+        self.commit_rows = commit_rows
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+
+    def add_table(self, name: str, row_type: Any, key: tuple[str, ...]) -> 'SqliteTableSink':
+        """建表（已存在时沿用），key为自然键，自然键相同的行会原地更新"""
+        fields = list(row_type.__annotations__)
+        columns = ', '.join(
+            f'"{k}" {"INTEGER" if t is int else "TEXT"}' for k, t in row_type.__annotations__.items()
+        )
+        # NULL在唯一索引里互不相等，专业组等可能为空的列按空字符串参与比较
+        key_exprs = ', '.join(f"ifnull({_quote(k)}, '')" for k in key)
+        with self._lock:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" ({columns})')
+            self._conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{name}_key" ON "{name}" ({key_exprs})')
+            seen = set()
+            for index in SQLITE_INDEXES:
+                index_columns = tuple(k for k in index if k in fields)
+                if not index_columns or index_columns in seen:
+                    continue
+                seen.add(index_columns)
+                index_name = _quote(f'{name}_{"_".join(index_columns)}')
+                self._conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS {index_name} ON "{name}" ({", ".join(map(_quote, index_columns))})'
+                )
+        updates = ', '.join(f'"{k}" = excluded."{k}"' for k in fields if k not in key)
+        sql = (
+            f'INSERT INTO "{name}" ({", ".join(map(_quote, fields))}) VALUES ({", ".join("?" * len(fields))}) '
+            f'ON CONFLICT ({key_exprs}) DO UPDATE SET {updates}'
+        )
+        return SqliteTableSink(self, sql)
+
+    def execute_batch(self, sql: str, rows: list[Sequence]):
+        with self._lock:
+            if not self._conn.in_transaction:
+                self._conn.execute('BEGIN')
+            self._conn.executemany(sql, rows)
+            self._pending += len(rows)
+            if self._pending >= self.commit_rows:
+                self._commit()
+
+    def _commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute('COMMIT')
+        self._pending = 0
+
+    def commit(self):
+        """提交已写入的行，可以在任意线程里调用"""
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+
+class SqliteTableSink(RowSink):
+    """SQLite中的一张表，按自然键upsert"""
+
+    def __init__(self, database: SqliteDatabaseSink, sql: str):
+        self.database = database
+        self.sql = sql
+
+    def write_rows(self, rows: Iterable[Sequence]):
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.database.commit_rows))
+            if not batch:
+                return
+            self.database.execute_batch(self.sql, batch)
+
+    def flush(self):
+        self.database.commit()
@@ -0,0 +1,167 @@
+from functions.session import session, set_pool_size
+from functions.cache import CACHE_TTL, response_cache
+from functions.archive import response_archive
+from functions import metrics
+from exceptions import CacheMiss, NetworkException
+from typing import Iterable, Iterator, Optional
+import collections
+import concurrent.futures
+import json
+import os
+import requests
+import threading
+import time
+
+STATIC_URL = os.environ.get('GAOKAO_STATIC_URL', 'https://static-data.gaokao.cn/www/2.0/')
+"""static-data.gaokao.cn的地址，可以用环境变量GAOKAO_STATIC_URL指向测试用的替身服务器"""
+
+STATIC_CONCURRENCY = 8
+"""同时向static-data.gaokao.cn发出的请求数，它是CDN，不受api.eol.cn的限速影响"""
+
+API_CONNECTIONS = 4
+"""给api.eol.cn留的连接数，令牌桶限速下同时在路上的请求很少"""
+
+static_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=STATIC_CONCURRENCY, thread_name_prefix='static'
+)
+"""获取static-data上文件的线程池"""
+set_pool_size(STATIC_CONCURRENCY + API_CONNECTIONS)
+
+
+def set_static_concurrency(concurrency: int):
+    """修改static-data的并发数，连接池大小随之调整"""
+    global static_pool, STATIC_CONCURRENCY
+    old_pool = static_pool
+    STATIC_CONCURRENCY = concurrency
+    static_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix='static'
+    )
+    old_pool.shutdown(wait=False)
+    set_pool_size(concurrency + API_CONNECTIONS)
+
+
+def _endpoint_of(path: str) -> str:
+    """指标里用的文件类别，不按高校区分"""
+    return next((endpoint for endpoint in CACHE_TTL if endpoint in path), 'other')
+
+
+def _submit(path: str) -> 'concurrent.futures.Future[Optional[dict]]':
+    metrics.static_queue_depth.inc()
+    future = static_pool.submit(fetch_static_json, path)
+    future.add_done_callback(lambda _: metrics.static_queue_depth.dec())
+    return future
+
+
+def fetch_static_json(path: str) -> Optional[dict]:
+    """从static-data.gaokao.cn获取JSON文件，文件不存在（404）时返回None
+
+    缓存过期的文件会带上ETag和Last-Modified发条件请求，返回304时直接使用缓存中的内容。
+    录制模式下把拿到的文件写入档案，回放模式下只从档案里取。
+    """
+    url = STATIC_URL + path
+    if response_archive.replaying:
+        cached = response_archive.get(path)
+        if cached is None:
+            raise CacheMiss('档案中没有这个文件')
+    else:
+        cached = response_cache.get(url)
+    if cached is not None:
+        status, text = cached.status, cached.body
+    else:
+        stale = response_cache.get_stale(url)
+        endpoint = _endpoint_of(path)
+        start = time.monotonic()
+        try:
+            res = session.get(url, headers=stale.validators() if stale is not None else None)
+        except requests.exceptions.RequestException:
+            metrics.static_requests.inc(endpoint=endpoint, status='error')
+            raise NetworkException('网络错误')
+        metrics.static_request_seconds.observe(time.monotonic() - start, endpoint=endpoint, status=res.status_code)
+        metrics.static_requests.inc(endpoint=endpoint, status=res.status_code)
+        if res.status_code == 304 and stale is not None:
+            response_cache.renew(url, None, stale)
+            status, text = stale.status, stale.body
+        else:
+            status, text = res.status_code, res.content.decode('utf-8')
+            if status in (200, 404):
+                response_cache.put(
+                    url, None, status, text,
+                    etag=res.headers.get('ETag'),
+                    last_modified=res.headers.get('Last-Modified')
+                )
+
+    if response_archive.recording and status in (200, 404):
+        response_archive.record(path, None, status, text)
+    if status == 404:
+        return None
+    if status != 200:
+        raise NetworkException(f'网络错误，状态码{status}')
+    return json.loads(text)
+
+
+def fetch_static_many(paths: Iterable[str]) -> Iterator[Optional[dict]]:
+    """在线程池中并发获取多个文件，按paths的顺序逐个返回，同一时间最多有两倍并发数的文件在排队"""
+    window: collections.deque = collections.deque()
+    for path in paths:
+        window.append(_submit(path))
+        if len(window) >= STATIC_CONCURRENCY * 2:
+            yield window.popleft().result()
+    while window:
+        yield window.popleft().result()
+
+
+class Prefetcher:
+    """在后台提前获取static-data上的文件，取用时如果还没下完就等它下完"""
+
+    def __init__(self):
+        self._futures: dict[str, concurrent.futures.Future[Optional[dict]]] = {}
+        self._taken: set[str] = set()
+        """已经取走的文件，fetch_many不再为它们留下结果"""
+        self._generation = 0
+        """clear的次数，clear之后还没结束的fetch_many不再留下结果"""
+        self._lock = threading.Lock()
+
+    def prefetch(self, path: str):
+        with self._lock:
+            if path not in self._futures:
+                self._futures[path] = _submit(path)
+
+    def fetch_many(self, paths: Iterable[str]) -> Iterator[Optional[dict]]:
+        """同fetch_static_many，但结果留在预取器里，之后get时不用再下载一次
+
+        已经预取过的文件不会再下载；已经被取走的文件会另外下载一次，结果不再留下。
+        """
+        window: collections.deque = collections.deque()
+        generation = self._generation
+        for path in paths:
+            with self._lock:
+                future = self._futures.get(path)
+                if future is None:
+                    future = _submit(path)
+                    if path not in self._taken and generation == self._generation:
+                        self._futures[path] = future
+            window.append(future)
+            if len(window) >= STATIC_CONCURRENCY * 2:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+    def clear(self):
+        """丢掉没有取用的结果，一次爬取结束时调用"""
+        with self._lock:
+            self._futures.clear()
+            self._taken.clear()
+            self._generation += 1
+
+    def get(self, path: str) -> Optional[dict]:
+        """取出预取的结果，没有预取过就直接获取"""
+        with self._lock:
+            future = self._futures.pop(path, None)
+            self._taken.add(path)
+        if future is None:
+            return fetch_static_json(path)
+        return future.result()
+
+
+static_prefetcher = Prefetcher()
+"""高校元数据的预取器"""
@@ -0,0 +1,63 @@
+import logging
+import time
+from typing import Any, NamedTuple
+from functions.sinks import XlsxWorkbookSink, iter_csv_rows
+from functions import metrics
+
+
+class SheetSource(NamedTuple):
+    """XLSX中的一张表，数据来自一个CSV文件"""
+    title: str
+    """表名"""
+    header: list[str]
+    """表头"""
+    csv_path: str
+    """数据来源"""
+    row_type: Any
+    """行的TypedDict类型，用来把CSV里的字符串还原成数字"""
+
+
+def export_xlsx(sheets: list[SheetSource], path: str):
+    """用write-only模式逐行把CSV写成XLSX，内存占用与数据量无关
+
+    先写到临时文件再替换，写到一半中断也不会弄坏已有的文件。
+    """
+    book = XlsxWorkbookSink(path)
+    for sheet in sheets:
+        book.add_sheet(sheet.title, sheet.header).write_rows(
+            iter_csv_rows(sheet.csv_path, sheet.row_type)
+        )
+    book.close()
+
+
+class XlsxSnapshotter:
+    """定期从CSV重新生成XLSX
+
+    每行数据只写入CSV一次，XLSX只在距上次生成超过interval秒时重新生成，
+    interval为0时只在finish时生成一次。
+    """
+
+    def __init__(self, path: str, interval: float = 0):
+        self.path = path
+        self.interval = interval
+        self.sheets: list[SheetSource] = []
+        self._last_snapshot = time.monotonic()
+
+    def add_sheet(self, sheet: SheetSource):
+        self.sheets.append(sheet)
+
+    def maybe_snapshot(self):
+        """距上次生成超过interval秒时重新生成，调用前需要先flush CSV"""
+        if self.interval > 0 and time.monotonic() - self._last_snapshot > self.interval:
+            self.snapshot()
+
+    def snapshot(self):
+        start = time.monotonic()
+        export_xlsx(self.sheets, self.path)
+        self._last_snapshot = time.monotonic()
+        metrics.xlsx_save_seconds.observe(self._last_snapshot - start)
+        logging.info(f'已生成{self.path}，用时{self._last_snapshot - start:.1f}秒')
+
+    def finish(self):
+        if self.sheets:
+            self.snapshot()
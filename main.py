@@ -1,24 +1,57 @@
+import collections
+import concurrent.futures
 import math
-import requests
+import multiprocessing
+import os
+import threading
 import csv
 import logging
-import time
-import openpyxl
+import click
+import requests
+from typing import Callable, Iterator, Optional
 from functions.hash import generate_random_hash
 from exceptions import NetworkException
-from functions.intercepted_requests import intercepted_eol_request
-from functions.session import session
+from functions.intercepted_requests import cancel_pending_requests, configure_rate_control, rate_controller, submit_eol_request
+from functions.paginator import PAGE_SIZES, PREFETCH_PAGES, iter_pages, paginate
+from functions.static_requests import Prefetcher, fetch_static_json, fetch_static_many, set_static_concurrency, static_prefetcher
+from functions.cache import response_cache
+from functions.archive import response_archive
+from functions.journal import Journal, TaskKey
+from functions.manifest import Manifest
+from functions.metrics import MetricsExporter, rows_written
+from functions.rows import make_record, slim_univ
+from functions.planner import CrawlPlan, ProgressTracker, format_duration
+from functions.xlsx_export import SheetSource, XlsxSnapshotter
+from functions.datasets import DATASETS, DatasetInfo
+from functions.columnar import export_parquet, require_pyarrow
+from functions.sinks import CsvSink, RowSink, SqliteDatabaseSink, iter_csv_rows
+from functions.shards import done_marker, load_univ_list, merge_shard_outputs, save_univ_list, shard_of, shard_run_id
 from type import *
 
 NO_UNIV_SCORE = False  # 是否不查询分数线
 NO_ENROLL_PLAN = False  # 是否不查询招生计划
 NO_MAJOR_SCORE = False  # 是否不查询专业分数线
-PAGE_RANGE = []  # 大学列表页数范围
+PAGE_RANGE = []  # 大学列表页数范围，每页20所
 ITEM_OFFSET = 0  # 起始位置偏移，或者说从起始页的第n + 1个大学开始查询，只能为非负值
 YEAR_SINCE = 2020  # 数据起始年份
-QUERY_INTERVAL = 10  # 每次查询的间隔，单位为秒，低于10的值可能导致IP暂时被封
-PROVINCE = '北京'  # 大学所在的省份，可以参考下面的PROVIENCE_DICT填写
+QUERY_INTERVAL = 10  # 每次查询的间隔，单位为秒，低于10的值可能导致IP暂时被封，由全局令牌桶保证，等待期间会继续处理其它工作
+ADAPTIVE_RATE = True  # 是否根据限速情况自动调整查询间隔，开启时QUERY_INTERVAL仅作为没有历史记录时的起步间隔
+MIN_QUERY_INTERVAL = 2  # 自动调整时允许的最小查询间隔，单位为秒
+RATE_STATE_FILE = 'rate_state.json'  # 自动调整学到的安全速率保存在这里，下次运行从这个速率起步
+STATIC_CONCURRENCY = 8  # 向static-data.gaokao.cn同时发出的请求数，它是CDN，不受上面的查询间隔限制
+CACHE_FILE = 'cache.sqlite3'  # 响应缓存文件，设为None则不使用缓存，往年的数据缓存后永不过期
+CACHE_MAX_SIZE = 1024  # 缓存文件大小上限，单位为MB，超出后淘汰最久未使用的记录
+CACHE_ONLY = False  # 是否只使用缓存，开启后不会发出任何网络请求，缓存未命中视为网络错误
+PROVINCE = '北京'  # 大学所在的省份，可以参考下面的PROVIENCE_DICT填写，使用--all-provinces时忽略
+SHARD_QUERY_INTERVAL = None  # --all-provinces时每个分片进程的查询间隔，None表示QUERY_INTERVAL乘以分片数，即总速率与单进程相同
 GENERATE_XLSX = True  # 是否生成xlsx文件
+GENERATE_PARQUET = False  # 是否在爬完后生成列式存储的<数据集>_<ID>.parquet，便于用pandas等分析工具读取，需要另外安装pyarrow
+SQLITE_FILE = None  # 同时把数据写入这个SQLite数据库，每个数据集一张表，按自然键upsert，重新爬取会原地更新，设为None则不写
+PAGE_SIZE_OVERRIDES: dict[str, int] = {}  # 覆盖各接口的默认每页条数，键为接口uri，默认值见functions/paginator.py
+XLSX_SNAPSHOT_INTERVAL = 1800  # 爬取过程中每隔多少秒从CSV重新生成一次xlsx，设为0则只在全部爬完后生成
+METRICS_INTERVAL = 60  # 每隔多少秒把指标写入metrics_<ID>.prom（Prometheus文本格式），结束时另写metrics_<ID>.json汇总，设为0则只在结束时写
+MANIFEST_FILE = 'manifest.tsv'  # 已爬取清单，记录往年已经完整爬过的组合，使用--incremental时跳过这些组合，设为None则不记录
+PROGRESS_INTERVAL = 60  # 开爬前先用元数据统计要发出的请求数并估算用时，爬取过程中每隔多少秒显示一次进度和预计剩余时间，设为0则不统计
 
 # region 但是这是碰都不能碰的Region
 
@@ -70,285 +103,795 @@ logging.basicConfig(
     format='[%(asctime)s][%(levelname)s] %(message)s'
 )
 
+configure_rate_control(
+    QUERY_INTERVAL,
+    min_interval=MIN_QUERY_INTERVAL,
+    adaptive=ADAPTIVE_RATE,
+    state_file=RATE_STATE_FILE
+)
+PAGE_SIZES.update(PAGE_SIZE_OVERRIDES)
+set_static_concurrency(STATIC_CONCURRENCY)
+response_cache.configure(
+    CACHE_FILE,
+    max_bytes=CACHE_MAX_SIZE * 1024 * 1024,
+    cache_only=CACHE_ONLY
+)
+
 
 def load_dictionary() -> dict[str, str]:
     """加载用于渲染表格的字典"""
     try:
-        res = session.get(
-            'https://static-data.gaokao.cn/www/2.0/config/dicprovince/dic.json')
-    except requests.exceptions.RequestException:
+        res = fetch_static_json('config/dicprovince/dic.json')
+    except NetworkException:
         raise NetworkException('加载字典时发生网络错误')
-    return res.json()['data']
+    if res is None:
+        raise NetworkException('加载字典时发生网络错误')
+    return res['data']
 
 
-def get_univ_list(prov: str, rev_prov_dict: dict[str, int] = REV_PROVIENCE_DICT) -> list[Univ]:
+def get_univ_list(prov: str, rev_prov_dict: dict[str, int] = REV_PROVIENCE_DICT) -> list[UnivBrief]:
     """Get the list of universities in a province."""
     prov_id: int = rev_prov_dict[prov]
-    try:
-        preflight_res = intercepted_eol_request(
+    start_page = 1
+    end_page = None
+    if len(PAGE_RANGE) == 2:
+        start_page = max(PAGE_RANGE[0], 1)
+        end_page = PAGE_RANGE[1]
+
+    univ_list = [
+        slim_univ(univ)  # type: ignore
+        for univ in paginate(
             {
                 'province_id': prov_id,
                 'uri': 'apidata/api/gk/school/lists',
-                'page': 1,
-                'size': 1,
                 'request_type': 1
-            }
+            },
+            start_page,
+            end_page
         )
-    except requests.exceptions.RequestException:
-        raise NetworkException('网络错误')
+    ]
 
-    item_count: int = preflight_res['numFound']
-    page_count = math.ceil(item_count / 20)
-    start_page = 1
-    if len(PAGE_RANGE) == 2:
-        page_count = min(PAGE_RANGE[1], math.ceil(item_count / 20))
-        start_page = max(PAGE_RANGE[0], 1)
+    return univ_list[ITEM_OFFSET:]
 
-    univ_list = []
 
-    for page in range(start_page, page_count + 1):
-        try:
-            res = intercepted_eol_request(
-                {
-                    'province_id': int(prov_id),
-                    'uri': 'apidata/api/gk/school/lists',
-                    'size': 20,
-                    'page': page,
-                    'request_type': 1
-                }
-            )
-            time.sleep(QUERY_INTERVAL)
+def _never(key: TaskKey) -> bool:
+    return False
 
-        except requests.exceptions.RequestException:
-            raise NetworkException('网络错误')
 
-        univ_list += res['item']
+def iter_prov_years(newsdata, only: Optional[tuple[int, int]] = None) -> Iterator[tuple[int, int]]:
+    """元数据中YEAR_SINCE及以后的(省份ID, 年份)，only不为None时只返回这一组"""
+    for prov_id in newsdata['province']:
+        for year in newsdata['year'][str(prov_id)]:
+            if year >= YEAR_SINCE and (only is None or only == (prov_id, year)):
+                yield prov_id, year
 
-    return univ_list[ITEM_OFFSET:]
+
+def iter_combos(dataset: str, school_id: int, newsdata, only: Optional[tuple[int, int]] = None) -> Iterator[TaskKey]:
+    """元数据中要爬的组合（不带页码的TaskKey），分数线到科类为止，其余两个数据集到批次为止"""
+    for prov_id, year in iter_prov_years(newsdata, only):
+        for major_id in newsdata['type'][f'{prov_id}_{year}']:
+            if dataset == 'min_score':
+                yield TaskKey(dataset, school_id, prov_id, year, major_id)
+                continue
+            for batch_id in newsdata['batch'][f'{prov_id}_{year}_{major_id}']:
+                yield TaskKey(dataset, school_id, prov_id, year, major_id, batch_id)
 
 
-def get_minium_score_of_univ(univ: Univ, dictionary: dict[str, str], prov_dict: dict[int, str] = PROVIENCE_DICT) -> list[MiniumScoreForUnivs]:
+API_URIS = {
+    'enroll_plan': 'apidata/api/gkv3/plan/school',
+    'major_score': 'apidata/api/gk/score/special'
+}
+"""按批次分页请求api.eol.cn的数据集对应的接口"""
+
+
+def batch_payload(combo: TaskKey) -> dict:
+    """请求一个批次的payload，不含页码"""
+    return {
+        'local_batch_id': combo.batch,
+        'local_province_id': combo.prov_id,
+        'local_type_id': str(combo.type),
+        'school_id': combo.school_id,
+        'uri': API_URIS[combo.dataset],
+        'year': combo.year
+    }
+
+
+def iter_minium_score_of_univ(
+    univ: UnivBrief,
+    dictionary: dict[str, str],
+    prov_dict: dict[int, str] = PROVIENCE_DICT,
+    skip: Callable[[TaskKey], bool] = _never,
+    only: Optional[tuple[int, int]] = None
+) -> Iterator[tuple[TaskKey, list[tuple]]]:
+    """逐个任务获取高校各省各年份分数线，skip返回True的任务不会被请求，only不为None时只获取这个(省份ID, 年份)
+
+    skip会先以不带页码的组合调用一次，返回True时整个组合都不会被请求。
+    每行是字段与MiniumScoreForUnivs相同的NamedTuple，见functions/rows.py。
+    """
+    school_id = univ['school_id']
+    res = static_prefetcher.get(f'school/{school_id}/dic/provincescore.json')
+    if res is None:
+        # 某些学校，如军校，不公开招生，没有元数据可以爬
+        logging.info('该校无信息，已跳过')
+        return
+    metadata: MetaMiniumScoreForUnivs = res['data']
+
+    keys: list[TaskKey] = []
+    for combo in iter_combos('min_score', school_id, metadata['newsdata'], only):
+        key = combo._replace(page=1)
+        if not skip(combo) and not skip(key):
+            keys.append(key)
+
+    # 这些都是CDN上的静态文件，不用排队限速，交给线程池并发获取
+    pages = fetch_static_many(
+        f'schoolprovinceindex/{key.year}/{school_id}/{key.prov_id}/{key.type}/1.json'
+        for key in keys
+    )
+    for key, res in zip(keys, pages):
+        if res is None:
+            raise NetworkException('网络错误')
+        data = res['data']
+        rows: list = []
+        for item in data['item']:
+            rows.append(make_record(
+                MiniumScoreForUnivs,
+                code=univ['code_enroll'][:5],
+                name=univ['name'],
+                located_province=univ['province_name'],
+                target_province=prov_dict[key.prov_id],  # type: ignore
+                major=dictionary[str(key.type)],
+                year=key.year,  # type: ignore
+                enroll_level=item['local_batch_name'],
+                enroll_type=item['zslx_name'],
+                minium_score=item["min"],
+                minium_rank=item["min_section"],
+                prov_minium_score=item['proscore'],
+                major_group=item['sg_name'] or None,
+                subject_requirements=item['sg_info'] or None
+            ))
+        yield key, rows
+
+
+def get_minium_score_of_univ(univ: UnivBrief, dictionary: dict[str, str], prov_dict: dict[int, str] = PROVIENCE_DICT) -> list[MiniumScoreForUnivs]:
     """获取高校各省各年份分数线"""
+    return [row._asdict() for _, rows in iter_minium_score_of_univ(univ, dictionary, prov_dict) for row in rows]
+
+
+def iter_enroll_plan_of_majors(
+    univ: UnivBrief,
+    dictionary: dict[str, str],
+    prov_dict: dict[int, str] = PROVIENCE_DICT,
+    skip: Callable[[TaskKey], bool] = _never,
+    only: Optional[tuple[int, int]] = None
+) -> Iterator[tuple[TaskKey, list[tuple]]]:
+    """逐页获取高校招生计划，skip返回True的页面不会被请求，only不为None时只获取这个(省份ID, 年份)
+
+    skip会先以不带页码的组合调用一次，返回True时整个组合都不会被请求。
+    每行是字段与EnrollPlan相同的NamedTuple，见functions/rows.py。
+    """
     school_id = univ['school_id']
-    try:
-        res = session.get(
-            f'https://static-data.gaokao.cn/www/2.0/school/{school_id}/dic/provincescore.json'
-        )
-        if res.status_code == 404:
-            # 某些学校，如军校，不公开招生，没有元数据可以爬
-            logging.info('该校无信息，已跳过')
-            return []
-    except requests.exceptions.RequestException:
-        raise NetworkException('网络错误')
-    metadata: MetaMiniumScoreForUnivs = res.json()['data']
-
-    ret_list: list[MiniumScoreForUnivs] = []
-
-    for prov_id in metadata['newsdata']['province']:
-        year_list = metadata['newsdata']['year'][str(prov_id)]
-        year_list = filter(lambda x: x >= YEAR_SINCE, year_list)
-        for year in year_list:
-            for major_id in metadata['newsdata']['type'][f'{prov_id}_{year}']:
-                try:
-                    res = session.get(
-                        f'https://static-data.gaokao.cn/www/2.0/schoolprovinceindex/{year}/{school_id}/{prov_id}/{major_id}/1.json')
-                    if res.status_code != 200:
-                        raise NetworkException('网络错误')
-                except requests.exceptions.RequestException:
-                    raise NetworkException('网络错误')
-                data = res.json()['data']
-                for item in data['item']:
-                    new_row: MiniumScoreForUnivs = {
-                        'code': univ['code_enroll'][:5],
-                        'name': univ['name'],
-                        'located_province': univ['province_name'],
-                        'target_province': prov_dict[prov_id],
-                        'major': dictionary[str(major_id)],
-                        'year': year,
-                        'enroll_level': item['local_batch_name'],
-                        'enroll_type': item['zslx_name'],
-                        'minium_score': item["min"],
-                        'minium_rank': item["min_section"],
-                        'prov_minium_score': item['proscore'],
-                        'major_group': item['sg_name'] or None,
-                        'subject_requirements': item['sg_info'] or None
-                    }
-                    ret_list.append(new_row)
-
-    return ret_list
-
-
-def get_enroll_plan_of_majors(univ: Univ, dictionary: dict[str, str], prov_dict: dict[int, str] = PROVIENCE_DICT) -> list[EnrollPlan]:
+    res = static_prefetcher.get(f'school/{school_id}/dic/specialplan.json')
+    if res is None:
+        logging.info('该校无信息，已跳过')
+        return
+    metadata: MetaEnrollPlan = res['data']
+
+    for combo in iter_combos('enroll_plan', school_id, metadata['newsdata'], only):
+        if skip(combo):
+            continue
+        prov_id, year, major_id = combo.prov_id, combo.year, combo.type
+        pages = iter_pages(batch_payload(combo), skip=lambda page: skip(combo._replace(page=page)), dataset=combo.dataset)
+
+        for page, data in pages:
+            key = combo._replace(page=page)
+            rows: list = []
+
+            for item in data['item']:
+                rows.append(make_record(
+                    EnrollPlan,
+                    code=univ['code_enroll'][:5],
+                    name=univ['name'],
+                    located_province=univ['province_name'],
+                    target_province=prov_dict[prov_id],
+                    year=year,
+                    major=dictionary[str(major_id)],
+                    enroll_level=data['item'][0]['local_batch_name'],
+                    major_name=item['spname'],
+                    planned_number=item['num'],
+                    duration=item['length'],
+                    tuition=item['tuition'],
+                    major_group=item['sg_name'] or None,
+                    subject_requirements=item['sg_info'] or None,
+                ))
+            yield key, rows
+
+
+def get_enroll_plan_of_majors(univ: UnivBrief, dictionary: dict[str, str], prov_dict: dict[int, str] = PROVIENCE_DICT) -> list[EnrollPlan]:
     """获取高校招生计划"""
+    return [row._asdict() for _, rows in iter_enroll_plan_of_majors(univ, dictionary, prov_dict) for row in rows]
+
+
+def iter_minium_score_of_majors(
+    univ: UnivBrief,
+    dictionary: dict[str, str],
+    prov_dict: dict[int, str] = PROVIENCE_DICT,
+    skip: Callable[[TaskKey], bool] = _never,
+    only: Optional[tuple[int, int]] = None
+) -> Iterator[tuple[TaskKey, list[tuple]]]:
+    """逐页获取高校专业分数线，skip返回True的页面不会被请求，only不为None时只获取这个(省份ID, 年份)
+
+    skip会先以不带页码的组合调用一次，返回True时整个组合都不会被请求。
+    每行是字段与MiniumScoreForMajors相同的NamedTuple，见functions/rows.py。
+    """
     school_id = univ['school_id']
-    try:
-        res = session.get(
-            f'https://static-data.gaokao.cn/www/2.0/school/{school_id}/dic/specialplan.json'
-        )
-        if res.status_code == 404:
-            logging.info('该校无信息，已跳过')
-            return []
-    except requests.exceptions.RequestException:
-        raise NetworkException('网络错误')
-    metadata: MetaEnrollPlan = res.json()['data']
-
-    ret_list: list[EnrollPlan] = []
-
-    for prov_id in metadata['newsdata']['province']:
-        year_list = metadata['newsdata']['year'][str(prov_id)]
-        year_list = filter(lambda x: x >= YEAR_SINCE, year_list)
-        for year in year_list:
-            for major_id in metadata['newsdata']['type'][f'{prov_id}_{year}']:
-                for batch_id in metadata['newsdata']['batch'][f'{prov_id}_{year}_{major_id}']:
-                    try:
-                        res = intercepted_eol_request(
-                            {
-                                'local_batch_id': batch_id,
-                                'local_province_id': prov_id,
-                                'local_type_id': str(major_id),
-                                'page': 1,
-                                'school_id': school_id,
-                                'size': 30,
-                                'uri': 'apidata/api/gkv3/plan/school',
-                                'year': year
-                            }
-                        )
-                    except requests.exceptions.RequestException:
-                        raise NetworkException('网络错误')
-
-                    total_items = res['numFound']
-                    total_pages = math.ceil(total_items / 30)
-
-                    for page in range(1, total_pages + 1):
-                        try:
-                            time.sleep(QUERY_INTERVAL)
-                            res = intercepted_eol_request(
-                                {
-                                    'local_batch_id': batch_id,
-                                    'local_province_id': prov_id,
-                                    'local_type_id': str(major_id),
-                                    'page': page,
-                                    'school_id': school_id,
-                                    'size': 30,
-                                    'uri': 'apidata/api/gkv3/plan/school',
-                                    'year': year
-                                }
-                            )
-                        except requests.exceptions.RequestException:
-                            raise NetworkException('网络错误')
-
-                        data = res
-
-                        for item in data['item']:
-                            new_row: EnrollPlan = {
-                                'code': univ['code_enroll'][:5],
-                                'name': univ['name'],
-                                'located_province': univ['province_name'],
-                                'target_province': prov_dict[prov_id],
-                                'year': year,
-                                'major': dictionary[str(major_id)],
-                                'enroll_level': data['item'][0]['local_batch_name'],
-                                'major_name': item['spname'],
-                                'planned_number': item['num'],
-                                'duration': item['length'],
-                                'tuition': item['tuition'],
-                                'major_group': item['sg_name'] or None,
-                                'subject_requirements': item['sg_info'] or None,
-                            }
-                            ret_list.append(new_row)
-
-    return ret_list
-
-
-def get_minium_score_of_majors(univ: Univ, dictionary: dict[str, str], prov_dict: dict[int, str] = PROVIENCE_DICT) -> list[MiniumScoreForMajors]:
+    res = static_prefetcher.get(f'school/{school_id}/dic/specialscore.json')
+    if res is None:
+        logging.info('该校无信息，已跳过')
+        return
+    metadata: MetaMiniumScoreForMajors = res['data']
+
+    for combo in iter_combos('major_score', school_id, metadata['newsdata'], only):
+        if skip(combo):
+            continue
+        prov_id, year, major_id = combo.prov_id, combo.year, combo.type
+        pages = iter_pages(batch_payload(combo), skip=lambda page: skip(combo._replace(page=page)), dataset=combo.dataset)
+
+        for page, data in pages:
+            key = combo._replace(page=page)
+            rows: list = []
+
+            for item in data['item']:
+                rows.append(make_record(
+                    MiniumScoreForMajors,
+                    code=univ['code_enroll'][:5],
+                    name=univ['name'],
+                    located_province=univ['province_name'],
+                    target_province=prov_dict[prov_id],
+                    year=year,
+                    major=dictionary[str(major_id)],
+                    major_name=item['spname'],
+                    enroll_level=data['item'][0]['local_batch_name'],
+                    avg_score=item['average'],
+                    minium_score=item["min"],
+                    minium_rank=item["min_section"],
+                    major_group=item['sg_name'] or None,
+                    subject_requirements=item['sg_info'] or None,
+                ))
+            yield key, rows
+
+
+def get_minium_score_of_majors(univ: UnivBrief, dictionary: dict[str, str], prov_dict: dict[int, str] = PROVIENCE_DICT) -> list[MiniumScoreForMajors]:
     """获取高校专业分数线"""
-    school_id = univ['school_id']
+    return [row._asdict() for _, rows in iter_minium_score_of_majors(univ, dictionary, prov_dict) for row in rows]
+
+
+class DatasetOutput:
+    """一个数据集的输出，负责把一所高校的数据逐页写入各个sink并记入journal"""
+
+    def __init__(
+        self,
+        info: DatasetInfo,
+        description: str,
+        fetch: Callable[..., Iterator[tuple[TaskKey, list]]]
+    ):
+        self.info = info
+        self.dataset = info.name
+        self.description = description
+        self.fetch = fetch
+
+    def open(self, run_id: str, journal: Journal, snapshotter: Optional[XlsxSnapshotter], manifest: Optional[Manifest] = None, incremental: bool = False, progress: Optional[ProgressTracker] = None, database: Optional[SqliteDatabaseSink] = None):
+        self.journal = journal
+        self.progress = progress
+        self.manifest = manifest
+        self.incremental = incremental and manifest is not None
+        self.skipped = 0
+        """增量模式下跳过的组合数"""
+        path = f'{self.dataset}_{run_id}.csv'
+        self.csv = CsvSink(path, self.info.row_type, journal.offsets.get(self.dataset))
+        self.sinks: list[RowSink] = [self.csv]
+        # tell()已经把写入的内容刷到了系统，这里只需要刷底层的缓冲区，它是线程安全的
+        journal.before_flush(self.csv.file.buffer.flush)
+        if snapshotter is not None:
+            snapshotter.add_sheet(SheetSource(self.info.sheet_name, self.info.header, path, self.info.row_type))
+        if database is not None:
+            # 续爬时会重写一遍journal之后的行，upsert不会因此产生重复
+            self.sinks.append(database.add_table(self.dataset, self.info.row_type, self.info.key))
+
+    def crawl(self, univ: UnivBrief, dictionary: dict[str, str], stop: threading.Event):
+        """爬取一所高校，每拿到一页就写出去，stop被设置时尽快停下"""
+        school_key = TaskKey(self.dataset, univ['school_id'])
+        if self.journal.is_done(school_key):
+            return
+        logging.info(f'正在获取{univ["name"]}{self.description}')
+        combos: list[TaskKey] = []
+
+        def skip(key: TaskKey) -> bool:
+            if stop.is_set():
+                return True
+            if key.page is not None:
+                return self.journal.is_done(key)
+            if self.incremental and self.manifest.is_known(key):  # type: ignore
+                self.skipped += 1
+                return True
+            combos.append(key)
+            if self.progress is not None:
+                self.progress.combo_started(self.dataset)
+            return False
+
+        for key, rows in self.fetch(univ, dictionary, skip=skip):
+            if stop.is_set():
+                return
+            for sink in self.sinks:
+                sink.write_rows(rows)
+            rows_written.inc(len(rows), dataset=self.dataset)
+            self.journal.record(key, self.csv.tell())
+            if self.progress is not None:
+                self.progress.page_done(self.dataset)
+        if stop.is_set():
+            return
+        # 先记清单再记journal，中间挂掉的话续爬时会重新记一遍清单
+        if self.manifest is not None:
+            self.manifest.record(combos)
+        self.journal.record(school_key, self.csv.tell())
+        logging.info(f'成功获取{univ["name"]}{self.description}信息')
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+OUTPUTS = {
+    'min_score': DatasetOutput(DATASETS['min_score'], '分数线', iter_minium_score_of_univ),
+    'enroll_plan': DatasetOutput(DATASETS['enroll_plan'], '招生计划', iter_enroll_plan_of_majors),
+    'major_score': DatasetOutput(DATASETS['major_score'], '各专业分数线', iter_minium_score_of_majors)
+}
+"""三个数据集的输出"""
+
+METADATA_FILES = {
+    'min_score': 'provincescore.json',
+    'enroll_plan': 'specialplan.json',
+    'major_score': 'specialscore.json'
+}
+"""各数据集对应的高校元数据文件"""
+
+
+def prefetch_metadata(univ: UnivBrief, datasets: list[str], journal: Journal):
+    """在后台预取一所高校还没爬完的数据集的元数据"""
+    for dataset in datasets:
+        if not journal.is_done(TaskKey(dataset, univ['school_id'])):
+            static_prefetcher.prefetch(f'school/{univ["school_id"]}/dic/{METADATA_FILES[dataset]}')
+
+
+def plan_crawl(univ_list: list[UnivBrief], datasets: list[str], skip: Callable[[TaskKey], bool] = _never, exact: bool = False, keep: Optional[Prefetcher] = None) -> CrawlPlan:
+    """统计爬取univ_list要发出的请求数
+
+    先并发获取各高校的元数据，数出每个数据集的组合，只花CDN请求；exact为True时再请求每个批次的第一页，
+    按numFound算出精确的页数（不算1090拆页），第一页会进缓存和档案，正式爬取时不会再请求一次。
+    skip会以只有数据集和school_id的键调用，返回True的高校整个跳过，其余用法同各个iter_*函数。
+    keep不为None时把拿到的元数据放进这个预取器，爬取时不用再下载一次。
+    """
+    plan = CrawlPlan()
+    plan.schools = len(univ_list)
+    for dataset in datasets:
+        plan.add_dataset(dataset, OUTPUTS[dataset].description, dataset in API_URIS)
+    todo = [
+        (univ, dataset) for univ in univ_list for dataset in datasets
+        if not skip(TaskKey(dataset, univ['school_id']))
+    ]
+    plan.metadata_requests = len(todo)
+    paths = [f'school/{univ["school_id"]}/dic/{METADATA_FILES[dataset]}' for univ, dataset in todo]
+    batches: list[tuple[UnivBrief, TaskKey]] = []
+    metadata = fetch_static_many(paths) if keep is None else keep.fetch_many(paths)
+    for (univ, dataset), res in zip(todo, metadata):
+        if res is None:
+            continue
+        dataset_plan = plan.datasets[dataset]
+        dataset_plan.schools += 1
+        for combo in iter_combos(dataset, univ['school_id'], res['data']['newsdata']):
+            if skip(combo):
+                continue
+            dataset_plan.combos += 1
+            dataset_plan.pages += 1
+            if dataset_plan.api:
+                plan.add_school_requests(univ, 1)
+                batches.append((univ, combo))
+    if not exact or not batches:
+        return plan
+
+    logging.info(
+        f'元数据显示共有{len(batches)}个批次，正在请求各批次的第一页，'
+        f'预计需要{format_duration(len(batches) / rate_controller.rate)}'
+    )
+    window: collections.deque = collections.deque()
+    pending = iter(batches)
+    while True:
+        # 和分页一样只提前排队有限的几页，免得响应都堆在内存里
+        while len(window) < PREFETCH_PAGES:
+            batch = next(pending, None)
+            if batch is None:
+                break
+            univ, combo = batch
+            payload = {**batch_payload(combo), 'page': 1, 'size': PAGE_SIZES[API_URIS[combo.dataset]]}
+            window.append((univ, combo, payload['size'], submit_eol_request(payload, combo.dataset)))
+        if not window:
+            break
+        univ, combo, size, future = window.popleft()
+        try:
+            data = future.result()
+        except requests.exceptions.RequestException:
+            raise NetworkException('网络错误')
+        # 没有数据的批次也要请求一次第一页
+        extra = max(math.ceil(data['numFound'] / size), 1) - 1
+        plan.datasets[combo.dataset].pages += extra
+        plan.add_school_requests(univ, extra)
+    for dataset_plan in plan.datasets.values():
+        dataset_plan.exact = True
+    return plan
+
+
+def show_plan(univ_list: list[UnivBrief], run_ids: list[str], incremental: bool, rate: float):
+    """--plan-only：统计精确的请求数，按rate（次/秒）估算用时，不爬取也不写输出文件
+
+    run_ids为各进程的运行ID，续爬时跳过它们的journal里已经爬完的高校。
+    """
+    journals = [Journal(f'journal_{run_id}.tsv') for run_id in run_ids if os.path.exists(f'journal_{run_id}.tsv')]
+    manifest = Manifest(MANIFEST_FILE) if incremental and MANIFEST_FILE is not None and os.path.exists(MANIFEST_FILE) else None
+
+    def skip(key: TaskKey) -> bool:
+        if key.prov_id is None:
+            return any(journal.is_done(key) for journal in journals)
+        return manifest is not None and manifest.is_known(key)
+
+    try:
+        plan = plan_crawl(univ_list, enabled_datasets(), skip, exact=True)
+    finally:
+        for journal in journals:
+            journal.close()
+        if manifest is not None:
+            manifest.close()
+    for line in plan.report(rate, STATIC_CONCURRENCY):
+        logging.info(line)
+
+
+def crawl(univ_list: list[UnivBrief], dictionary: dict[str, str], datasets: list[str], run_id: str, generate_xlsx: bool = GENERATE_XLSX, incremental: bool = False, sqlite_file: Optional[str] = SQLITE_FILE, generate_parquet: bool = GENERATE_PARQUET):
+    """逐个高校同时爬取所有数据集
+
+    同一所高校的各个数据集在不同线程里同时爬取，发往api.eol.cn的请求共用同一个令牌桶排队，
+    爬取当前高校时会预取下一所高校的元数据。incremental为True时跳过清单里已经爬过的组合。
+    sqlite_file不为None时数据还会写入这个SQLite数据库，generate_parquet为True时爬完后从CSV生成Parquet。
+    """
+    exporter = MetricsExporter(f'metrics_{run_id}.prom', METRICS_INTERVAL)
+    try:
+        _crawl(univ_list, dictionary, datasets, run_id, generate_xlsx, incremental, sqlite_file, generate_parquet)
+    finally:
+        # 中途失败也写出汇总，方便分析是卡在了哪里
+        exporter.finish(f'metrics_{run_id}.json')
+
+
+def _crawl(univ_list: list[UnivBrief], dictionary: dict[str, str], datasets: list[str], run_id: str, generate_xlsx: bool, incremental: bool, sqlite_file: Optional[str], generate_parquet: bool):
+    if generate_parquet:
+        # 缺少pyarrow时在开爬前就报错，而不是爬完才发现
+        require_pyarrow()
+    snapshotter = None
+    if generate_xlsx:
+        snapshotter = XlsxSnapshotter(f'data_{run_id}.xlsx', XLSX_SNAPSHOT_INTERVAL)
+
+    journal = Journal(f'journal_{run_id}.tsv')
+    database = None
+    if sqlite_file is not None:
+        database = SqliteDatabaseSink(sqlite_file)
+        # 记入journal的任务的行要先提交，否则中断后续爬时会漏掉
+        journal.before_flush(database.commit)
+    manifest = Manifest(MANIFEST_FILE) if MANIFEST_FILE is not None else None
+    if incremental and manifest is not None:
+        logging.info(f'增量爬取，清单中已有{len(manifest)}个组合')
+
+    progress = None
+    if PROGRESS_INTERVAL > 0:
+        progress = ProgressTracker(None, lambda: rate_controller.rate, PROGRESS_INTERVAL)
+
+        def skip(key: TaskKey) -> bool:
+            if key.prov_id is None:
+                return journal.is_done(key)
+            return incremental and manifest is not None and manifest.is_known(key)
+
+        def plan_in_background(progress: ProgressTracker):
+            try:
+                plan = plan_crawl(univ_list, datasets, skip, keep=static_prefetcher)
+            except NetworkException:
+                logging.warning('统计请求数时发生网络异常，本次不显示预计剩余时间')
+                return
+            for line in plan.report(rate_controller.rate, STATIC_CONCURRENCY):
+                logging.info(line)
+            progress.set_plan(plan)
+
+        # 统计只花CDN请求，和爬取同时进行，拿到的元数据留给爬取用
+        threading.Thread(target=plan_in_background, args=(progress,), name='planner', daemon=True).start()
+
+    outputs = [OUTPUTS[dataset] for dataset in datasets]
+    for output in outputs:
+        output.open(run_id, journal, snapshotter, manifest, incremental, progress, database)
+
+    stop = threading.Event()
+    pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=len(outputs) or 1, thread_name_prefix='dataset'
+    )
+    try:
+        if univ_list:
+            prefetch_metadata(univ_list[0], datasets, journal)
+        for i, univ in enumerate(univ_list):
+            if i + 1 < len(univ_list):
+                prefetch_metadata(univ_list[i + 1], datasets, journal)
+            futures = {
+                pool.submit(output.crawl, univ, dictionary, stop): output
+                for output in outputs
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except NetworkException:
+                    stop.set()
+                    cancel_pending_requests()
+                    logging.fatal(f'获取{univ["name"]}的{futures[future].description}时发生网络异常')
+                    concurrent.futures.wait(futures)
+                    logging.fatal(f'可使用 --resume {run_id} 从断点继续')
+                    exit(1)
+            if snapshotter is not None:
+                journal.flush()
+                snapshotter.maybe_snapshot()
+            if progress is not None:
+                logging.info(f'进度：{i + 1}/{len(univ_list)}，{progress.describe()}')
+            else:
+                logging.info(f'进度：{i + 1}/{len(univ_list)}')
+    finally:
+        # Ctrl-C或其它异常时也要让各数据集的线程马上停下，不能等它们爬完手上的高校
+        stop.set()
+        cancel_pending_requests()
+        pool.shutdown(cancel_futures=True)
+        static_prefetcher.clear()
+        journal.close()
+        if manifest is not None:
+            manifest.close()
+        for output in outputs:
+            output.close()
+        if database is not None:
+            database.close()
+        if incremental:
+            for output in outputs:
+                logging.info(f'{output.description}跳过了{output.skipped}个已爬过的组合')
+
+    if snapshotter is not None:
+        snapshotter.finish()
+    if generate_parquet:
+        # Parquet文件不能追加，续爬时的数据以CSV为准，所以在爬完后整体转换
+        for output in outputs:
+            export_parquet(output.csv.path, output.info.row_type, f'{output.dataset}_{run_id}.parquet')
+
+
+def enabled_datasets() -> list[str]:
+    """按开关决定要爬的数据集"""
+    datasets = []
+    if not NO_UNIV_SCORE:
+        datasets.append('min_score')
+    if not NO_ENROLL_PLAN:
+        datasets.append('enroll_plan')
+    if not NO_MAJOR_SCORE:
+        datasets.append('major_score')
+    return datasets
+
+
+def log_summary():
+    rate_controller.save()
+    if response_archive.recording:
+        logging.info(f'本次录制了{response_archive.recorded}条响应')
+    if response_archive.replaying:
+        logging.info(f'本次回放了{response_archive.replayed}条响应')
+    if response_cache.enabled:
+        logging.info(f'缓存命中{response_cache.hits}次，未命中{response_cache.misses}次')
+        if response_cache.not_modified:
+            logging.info(
+                f'其中{response_cache.not_modified}次经条件请求确认未变（304），'
+                f'省下{response_cache.not_modified_bytes / 1024:.1f}KB'
+            )
+    logging.info(f'最终查询间隔为{1 / rate_controller.rate:.2f}秒，共被限速{len(rate_controller.history)}次')
+
+
+def crawl_shard(run_id: str, shard: int, shards: int, incremental: bool = False, archive: Optional[tuple[str, str]] = None):
+    """在子进程里爬取一个分片，子进程有自己的令牌桶，速率状态也单独保存
+
+    archive为(档案目录, 'record'或'replay')，录制时每个分片写自己的分段。
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%m/%d %H:%M:%S",
+        format=f'[%(asctime)s][%(levelname)s][分片{shard}] %(message)s',
+        force=True
+    )
+    configure_rate_control(
+        SHARD_QUERY_INTERVAL or QUERY_INTERVAL * shards,
+        min_interval=MIN_QUERY_INTERVAL,
+        adaptive=ADAPTIVE_RATE,
+        state_file=f'rate_state_s{shard}.json'
+    )
+    if archive is not None:
+        response_archive.configure(archive[0], archive[1], segment=shard_run_id(run_id, shard))
+    univ_list = [
+        univ for univ in load_univ_list(f'univ_list_{run_id}.json')
+        if shard_of(univ, shards) == shard
+    ]
+    logging.info(f'本分片共{len(univ_list)}所高校')
     try:
-        res = session.get(
-            f'https://static-data.gaokao.cn/www/2.0/school/{school_id}/dic/specialscore.json'
+        dictionary = load_dictionary()
+    except NetworkException:
+        logging.fatal('获取专业字典时发生网络异常')
+        exit(1)
+    crawl(univ_list, dictionary, enabled_datasets(), shard_run_id(run_id, shard), generate_xlsx=False, incremental=incremental, sqlite_file=None, generate_parquet=False)
+    log_summary()
+    open(done_marker(run_id, shard), 'w').close()
+
+
+def crawl_all_provinces(run_id: str, shards: int, only_shard: Optional[int], resuming: bool, incremental: bool = False, archive: Optional[tuple[str, str]] = None, plan_only: bool = False):
+    """把所有省份的高校按school_id分到shards个子进程里爬取，全部完成后按顺序合并，plan_only为True时只统计请求数"""
+    list_path = f'univ_list_{run_id}.json'
+    if resuming and os.path.exists(list_path):
+        univ_list = load_univ_list(list_path)
+    else:
+        univ_list = []
+        for prov in PROVIENCE_DICT.values():
+            try:
+                logging.info(f'开始获取{prov}的大学列表')
+                univ_list += get_univ_list(prov)
+            except NetworkException:
+                logging.fatal(f'获取{prov}的大学列表时发生网络异常')
+                exit(1)
+        save_univ_list(list_path, univ_list)
+    logging.info(f'共{len(univ_list)}所高校，分为{shards}个分片')
+    if plan_only:
+        # 各分片有自己的令牌桶，总速率是各分片速率之和
+        show_plan(
+            univ_list, [shard_run_id(run_id, shard) for shard in range(shards)], incremental,
+            shards / (SHARD_QUERY_INTERVAL or QUERY_INTERVAL * shards)
         )
-        if res.status_code == 404:
-            logging.info('该校无信息，已跳过')
-            return []
-    except requests.exceptions.RequestException:
-        raise NetworkException('网络错误')
-    metadata: MetaMiniumScoreForMajors = res.json()['data']
-
-    ret_list: list[MiniumScoreForMajors] = []
-
-    for prov_id in metadata['newsdata']['province']:
-        year_list = metadata['newsdata']['year'][str(prov_id)]
-        year_list = filter(lambda x: x >= YEAR_SINCE, year_list)
-        for year in year_list:
-            for major_id in metadata['newsdata']['type'][f'{prov_id}_{year}']:
-                for batch_id in metadata['newsdata']['batch'][f'{prov_id}_{year}_{major_id}']:
-                    try:
-                        res = intercepted_eol_request(
-                            {
-                                'local_batch_id': batch_id,
-                                'local_province_id': prov_id,
-                                'local_type_id': str(major_id),
-                                'page': 1,
-                                'school_id': school_id,
-                                'size': 30,
-                                'uri': 'apidata/api/gk/score/special',
-                                'year': year
-                            }
-                        )
-                    except requests.exceptions.RequestException:
-                        raise NetworkException('网络错误')
-
-                    total_items = res['numFound']
-                    total_pages = math.ceil(total_items / 30)
-
-                    for page in range(1, total_pages + 1):
-                        try:
-                            time.sleep(QUERY_INTERVAL)
-                            res = intercepted_eol_request(
-                                {
-                                    'local_batch_id': batch_id,
-                                    'local_province_id': prov_id,
-                                    'local_type_id': str(major_id),
-                                    'page': page,
-                                    'school_id': school_id,
-                                    'size': 30,
-                                    'uri': 'apidata/api/gk/score/special',
-                                    'year': year
-                                }
-                            )
-                        except requests.exceptions.RequestException:
-                            raise NetworkException('网络错误')
-
-                        data = res
-
-                        for item in data['item']:
-                            new_row: MiniumScoreForMajors = {
-                                'code': univ['code_enroll'][:5],
-                                'name': univ['name'],
-                                'located_province': univ['province_name'],
-                                'target_province': prov_dict[prov_id],
-                                'year': year,
-                                'major': dictionary[str(major_id)],
-                                'major_name': item['spname'],
-                                'enroll_level': data['item'][0]['local_batch_name'],
-                                'avg_score': item['average'],
-                                'minium_score': item["min"],
-                                'minium_rank': item["min_section"],
-                                'major_group': item['sg_name'] or None,
-                                'subject_requirements': item['sg_info'] or None
-                            }
-                            ret_list.append(new_row)
-    return ret_list
-
-
-def main():
+        return
+
+    todo = [
+        shard for shard in range(shards)
+        if (only_shard is None or shard == only_shard) and not os.path.exists(done_marker(run_id, shard))
+    ]
+    # 子进程用spawn启动，不继承父进程里的事件循环线程
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=len(todo) or 1, mp_context=multiprocessing.get_context('spawn')
+    ) as pool:
+        futures = {pool.submit(crawl_shard, run_id, shard, shards, incremental, archive): shard for shard in todo}
+        for future in concurrent.futures.as_completed(futures):
+            shard = futures[future]
+            try:
+                future.result()
+                logging.info(f'分片{shard}已完成')
+            except (Exception, SystemExit):
+                logging.error(f'分片{shard}失败，可使用 --all-provinces --shards {shards} --shard {shard} --resume {run_id} 单独重跑')
+
+    unfinished = [shard for shard in range(shards) if not os.path.exists(done_marker(run_id, shard))]
+    if unfinished:
+        logging.fatal(f'分片{unfinished}尚未完成，全部完成后才会合并')
+        exit(1)
+
+    if GENERATE_PARQUET:
+        require_pyarrow()
+    logging.info('开始合并各分片的数据')
+    snapshotter = None
+    if GENERATE_XLSX:
+        snapshotter = XlsxSnapshotter(f'data_{run_id}.xlsx')
+    # 分片进程不写SQLite，避免多个进程争同一个数据库的写锁，合并后一次性导入
+    database = SqliteDatabaseSink(SQLITE_FILE) if SQLITE_FILE is not None else None
+    for dataset in enabled_datasets():
+        info = DATASETS[dataset]
+        path = merge_shard_outputs(dataset, info.row_type, run_id, shards, univ_list)
+        if snapshotter is not None:
+            snapshotter.add_sheet(SheetSource(info.sheet_name, info.header, path, info.row_type))
+        if database is not None:
+            database.add_table(dataset, info.row_type, info.key).write_rows(iter_csv_rows(path, info.row_type))
+        if GENERATE_PARQUET:
+            export_parquet(path, info.row_type, f'{dataset}_{run_id}.parquet')
+    if database is not None:
+        database.close()
+    if snapshotter is not None:
+        snapshotter.finish()
+
+
+@click.command('main', help='爬取掌上高考的高校分数线、招生计划和专业分数线')
+@click.option(
+    '--resume', 'run_id',
+    metavar='RUN_ID',
+    default=None,
+    help='从断点继续之前的运行，RUN_ID为输出文件名中的8位hash'
+)
+@click.option(
+    '--all-provinces',
+    is_flag=True,
+    help='爬取所有省份的高校，忽略PROVINCE，按school_id分片在多个进程中爬取'
+)
+@click.option(
+    '--shards',
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help='--all-provinces模式下的分片（进程）数，续爬时必须与第一次运行时相同'
+)
+@click.option(
+    '--shard', 'only_shard',
+    type=click.IntRange(min=0),
+    default=None,
+    help='--all-provinces模式下只运行这一个分片，用于重跑失败的分片'
+)
+@click.option(
+    '--incremental',
+    is_flag=True,
+    help='增量爬取，跳过MANIFEST_FILE中记录的已经爬过的组合，只爬新出现的省份、年份、科类和批次'
+)
+@click.option(
+    '--record', 'record_dir',
+    metavar='DIR',
+    default=None,
+    help='把拿到的每个原始响应连同请求一起录制到DIR这个档案目录里'
+)
+@click.option(
+    '--replay', 'replay_dir',
+    metavar='DIR',
+    default=None,
+    help='不联网，只用DIR里录制的响应重新生成数据，配合--all-provinces可以用多个进程并行回放'
+)
+@click.option(
+    '--plan-only',
+    is_flag=True,
+    help='只统计要发出的请求数并按当前速率估算用时，不爬取；需要请求每个批次的第一页，它们会进缓存，正式爬取时不再请求'
+)
+def main(run_id: Optional[str], all_provinces: bool, shards: int, only_shard: Optional[int], incremental: bool, record_dir: Optional[str], replay_dir: Optional[str], plan_only: bool):
+    resuming = run_id is not None
+    if run_id is None:
+        run_id = HASH
+    else:
+        logging.info(f'继续运行{run_id}')
+    logging.info(f'本次运行的ID为{run_id}')
+
+    if record_dir is not None and replay_dir is not None:
+        raise click.BadParameter('不能同时录制和回放', param_hint='--record')
+    archive = None
+    if record_dir is not None:
+        archive = (record_dir, 'record')
+    elif replay_dir is not None:
+        archive = (replay_dir, 'replay')
+
+    if all_provinces:
+        if only_shard is not None and only_shard >= shards:
+            raise click.BadParameter('分片编号必须小于分片数', param_hint='--shard')
+        if archive is not None:
+            # 大学列表在主进程里获取，也要录制或回放
+            response_archive.configure(*archive, segment=run_id)
+        crawl_all_provinces(run_id, shards, only_shard, resuming, incremental, archive, plan_only)
+        if not plan_only:
+            logging.info('已成功爬取所有数据')
+        return
+
+    if archive is not None:
+        response_archive.configure(*archive, segment=run_id)
+
     try:
         logging.info('开始获取大学列表')
-        univ_list: list[Univ] = get_univ_list(PROVINCE)
+        univ_list: list[UnivBrief] = get_univ_list(PROVINCE)
     except NetworkException:
         logging.fatal('获取大学列表时发生网络异常')
         exit(1)
 
+    if plan_only:
+        try:
+            show_plan(univ_list, [run_id], incremental, rate_controller.rate)
+        except NetworkException:
+            logging.fatal('统计请求数时发生网络异常')
+            exit(1)
+        rate_controller.save()
+        return
+
     try:
         logging.info('开始获取专业字典')
         dictionary = load_dictionary()
@@ -356,128 +899,11 @@ def main():
         logging.fatal('获取专业字典时发生网络异常')
         exit(1)
 
-    wb = openpyxl.Workbook()
-    wb.remove(wb.active)  # type: ignore
-
-    if not NO_UNIV_SCORE:
-        logging.info('开始获取高校各省分数线')
-        if GENERATE_XLSX:
-            wb.create_sheet('学校分数线')
-            wb['学校分数线'].append([
-                '学校代码',
-                '学校名称全称',
-                '所在省份',
-                '面向省份',
-                '科类',
-                '年份',
-                '录取批次',
-                '招生类型',
-                '最低分',
-                '最低位次',
-                '省控线',
-                '专业组',
-                '选科要求'
-            ])
-        with open(f'min_score_{HASH}.csv', 'w', encoding='utf-8', newline='') as csvfile:
-            csvwriter = csv.DictWriter(
-                csvfile, fieldnames=MiniumScoreForUnivs.__annotations__.keys()
-            )
-            csvwriter.writeheader()
-            for univ in univ_list:
-                try:
-                    logging.info(f'正在获取{univ["name"]}分数线')
-                    score_list = get_minium_score_of_univ(univ, dictionary)
-                except NetworkException:
-                    logging.fatal(f'获取{univ["name"]}的分数线时发生网络异常')
-                    exit(1)
-                for score in score_list:
-                    csvwriter.writerow(score)
-                    if GENERATE_XLSX:
-                        wb['学校分数线'].append([v for v in score.values()])
-                if GENERATE_XLSX:
-                    wb.save(f'data_{HASH}.xlsx')
-                logging.info(f'成功获取{univ["name"]}分数线信息')
-        logging.info('已获取全部高校分数线信息')
-
-    if not NO_ENROLL_PLAN:
-        logging.info('开始获取高校各专业招生计划')
-        if GENERATE_XLSX:
-            wb.create_sheet('各专业招生计划')
-            wb['各专业招生计划'].append([
-                '学校代码',
-                '学校名称全称',
-                '所在省份',
-                '面向省份',
-                '年份',
-                '科类',
-                '招生批次',
-                '招生专业名称',
-                '计划招生',
-                '学制',
-                '学费',
-                '专业组',
-                '选科要求'
-            ])
-        with open(f'enroll_plan_{HASH}.csv', 'w', encoding='utf-8', newline='') as csvfile:
-            csvwriter = csv.DictWriter(
-                csvfile, fieldnames=EnrollPlan.__annotations__.keys()
-            )
-            csvwriter.writeheader()
-            for univ in univ_list:
-                try:
-                    logging.info(f'正在获取{univ["name"]}招生计划')
-                    plan_list = get_enroll_plan_of_majors(univ, dictionary)
-                except NetworkException:
-                    logging.fatal(f'获取{univ["name"]}的招生计划时发生网络异常')
-                    exit(1)
-                for plan in plan_list:
-                    csvwriter.writerow(plan)
-                    if GENERATE_XLSX:
-                        wb['各专业招生计划'].append([v for v in plan.values()])
-                if GENERATE_XLSX:
-                    wb.save(f'data_{HASH}.xlsx')
-                logging.info(f'成功获取{univ["name"]}招生计划信息')
-        logging.info('已获取全部高校招生计划信息')
-
-    if not NO_MAJOR_SCORE:
-        logging.info('开始获取高校各专业分数线')
-        if GENERATE_XLSX:
-            wb.create_sheet('分专业录取分数线')
-            wb['分专业录取分数线'].append([
-                '学校代码',
-                '学校名称全称',
-                '所在省份',
-                '面向省份',
-                '年份',
-                '科类',
-                '录取专业名称',
-                '录取批次',
-                '平均分',
-                '最低分',
-                '最低位次',
-                '专业组',
-                '选科要求'
-            ])
-        with open(f'major_score_{HASH}.csv', 'w', encoding='utf-8', newline='') as csvfile:
-            csvwriter = csv.DictWriter(
-                csvfile, fieldnames=MiniumScoreForMajors.__annotations__.keys()
-            )
-            csvwriter.writeheader()
-            for univ in univ_list:
-                try:
-                    logging.info(f'正在获取{univ["name"]}各专业分数线')
-                    major_score = get_minium_score_of_majors(univ, dictionary)
-                except NetworkException:
-                    logging.fatal(f'获取{univ["name"]}的各专业分数线时发生网络异常')
-                    exit(1)
-                for score in major_score:
-                    csvwriter.writerow(score)
-                    wb['分专业录取分数线'].append([v for v in score.values()])
-                if GENERATE_XLSX:
-                    wb.save(f'data_{HASH}.xlsx')
-                logging.info(f'成功获取{univ["name"]}各专业分数线信息')
-        logging.info('已获取全部高校各专业分数线信息')
+    logging.info('开始逐个获取高校的分数线、招生计划和专业分数线')
+    crawl(univ_list, dictionary, enabled_datasets(), run_id, incremental=incremental)
+    logging.info('已获取全部高校信息')
 
+    log_summary()
     logging.info('已成功爬取所有数据')
 
 
@@ -1,83 +1,145 @@
 import click
+import itertools
 import openpyxl
+import os
 import csv as _csv
-from type import MiniumScoreForUnivs, EnrollPlan, MiniumScoreForMajors
-from typing import TypedDict, cast
+from typing import Any, Iterable, Iterator, Optional
 from functions.hash import generate_random_hash
+from functions.datasets import DATASETS
+from functions.columnar import ParquetSink, require_pyarrow
+from functions.dedup import POLICIES, Deduplicator
+from functions.external_sort import external_sort
+from functions.parallel import BatchPool
+from functions.rows import to_record
+from functions.sinks import CsvSink, RowSink, SqliteDatabaseSink, XlsxWorkbookSink, iter_csv_rows
 
 
-class Form(TypedDict):
-    """完整表格"""
-    province: list[MiniumScoreForUnivs]
-    """省分数线"""
-    major: list[MiniumScoreForMajors]
-    """专业分数线"""
-    enroll: list[EnrollPlan]
-    """招生计划"""
-
+FORM_DATASETS = {
+    'province': DATASETS['min_score'],
+    'enroll': DATASETS['enroll_plan'],
+    'major': DATASETS['major_score']
+}
+"""表格各部分对应的数据集，依次为省分数线、招生计划、专业分数线"""
 
-HEADERS = (
-    'code,name,located_province,target_province,major,year,enroll_level,enroll_type,minium_score,minium_rank,prov_minium_score,major_group,subject_requirements',  # 省分数线
-    'code,name,located_province,target_province,year,major,enroll_level,major_name,planned_number,duration,tuition,major_group,subject_requirements',  # 招生计划
-    'code,name,located_province,target_province,year,major,major_name,enroll_level,avg_score,minium_score,minium_rank,major_group,subject_requirements'  # 专业分数线
+HEADERS = tuple(
+    ','.join(info.row_type.__annotations__.keys()) for info in FORM_DATASETS.values()
 )
+"""爬虫输出的CSV文件的表头，依次为省分数线、招生计划、专业分数线"""
 
-READABLE_HEADERS = {
-    'province': [
-        '学校代码',
-        '学校名称全称',
-        '所在省份',
-        '面向省份',
-        '科类',
-        '年份',
-        '录取批次',
-        '招生类型',
-        '最低分',
-        '最低位次',
-        '省控线',
-        '专业组',
-        '选科要求'
-    ],
-    'enroll': [
-        '学校代码',
-        '学校名称全称',
-        '所在省份',
-        '面向省份',
-        '年份',
-        '科类',
-        '招生批次',
-        '招生专业名称',
-        '计划招生',
-        '学制',
-        '学费',
-        '专业组'
-        '选科要求'
-    ],
-    'major': [
-        '学校代码',
-        '学校名称全称',
-        '所在省份',
-        '面向省份',
-        '年份',
-        '科类',
-        '录取专业名称',
-        '录取批次',
-        '平均分',
-        '最低分',
-        '最低位次',
-        '专业组',
-        '选科要求'
-    ]
-}
-
-NAME_DICT = {
-    'province': '学校分数线',
-    'enroll': '各专业招生计划',
-    'major': '分专业录取分数线'
-}
+NAME_DICT = {k: info.sheet_name for k, info in FORM_DATASETS.items()}
 
 HASH = generate_random_hash()
 
+PARSE_BATCH_ROWS = 5000
+"""--jobs大于1时工作进程每次传回的行数"""
+
+
+def _record(form_key: str, values: Iterable) -> Any:
+    """把一行的值装进紧凑的行记录，多出的列丢掉，缺的列补None"""
+    row_type = FORM_DATASETS[form_key].row_type
+    return to_record(row_type, itertools.islice(
+        itertools.chain(values, itertools.repeat(None)), len(row_type.__annotations__)
+    ))
+
+
+def _csv_kind(file: str) -> Optional[str]:
+    """按表头判断CSV文件属于哪个表格，都不是时返回None"""
+    with open(file, 'r', encoding='utf-8', newline='') as f:
+        header = ','.join(next(_csv.reader(f), []))
+    for k, expected in zip(FORM_DATASETS, HEADERS):
+        if header == expected:
+            return k
+    return None
+
+
+def _iter_xlsx_rows(file: str, form_key: str) -> Iterator:
+    """以只读模式逐行读出XLSX中的一张表，不会把整个文件读进内存"""
+    wb = openpyxl.load_workbook(file, read_only=True)
+    try:
+        if NAME_DICT[form_key] not in wb.sheetnames:
+            return
+        for values in wb[NAME_DICT[form_key]].iter_rows(values_only=True):
+            if values and values[0] == '学校代码':
+                continue
+            yield _record(form_key, values)
+    finally:
+        wb.close()
+
+
+def list_sources(csv_kinds: list[tuple[str, Optional[str]]], xlsx: list[str]) -> list[tuple[str, str, bool]]:
+    """所有的来源(表格, 文件路径, 是否为XLSX)，一个来源是一个CSV文件或XLSX中的一张表
+
+    按表格排列，同一表格内按输入的顺序，先CSV后XLSX。
+    """
+    sources = []
+    for k in FORM_DATASETS:
+        sources += [(k, file, False) for file, kind in csv_kinds if kind == k]
+        sources += [(k, file, True) for file in xlsx]
+    return sources
+
+
+def _open_source(form_key: str, file: str, is_xlsx: bool, remove_empty_lines: bool) -> Iterator:
+    """逐行读出一个来源"""
+    rows: Iterator
+    if is_xlsx:
+        rows = _iter_xlsx_rows(file, form_key)
+    else:
+        rows = iter_csv_rows(file, FORM_DATASETS[form_key].row_type)
+    if remove_empty_lines:
+        rows = itertools.filterfalse(_is_empty, rows)
+    return rows
+
+
+def _parse_source(form_key: str, file: str, is_xlsx: bool, remove_empty_lines: bool) -> Iterator[list[tuple]]:
+    """在工作进程里解析一个来源，每PARSE_BATCH_ROWS行一批，以普通的tuple传回"""
+    rows = _open_source(form_key, file, is_xlsx, remove_empty_lines)
+    while True:
+        batch = [tuple(row) for row in itertools.islice(rows, PARSE_BATCH_ROWS)]
+        if not batch:
+            return
+        yield batch
+
+
+def iter_sources(sources: list[tuple[str, str, bool]], remove_empty_lines: bool, jobs: int = 1) -> Iterator[tuple[str, str, Iterator]]:
+    """按顺序返回每个来源的(表格, 文件路径, 行迭代器)，读下一个来源前要先读完上一个的行
+
+    jobs大于1时所有来源一开始就交给jobs个工作进程并行解析，这里按顺序读回，输出的顺序与jobs无关。
+    """
+    if jobs <= 1:
+        for k, file, is_xlsx in sources:
+            yield k, file, _open_source(k, file, is_xlsx, remove_empty_lines)
+        return
+    tasks = [(_parse_source, (k, file, is_xlsx, remove_empty_lines)) for k, file, is_xlsx in sources]
+    with BatchPool(jobs, tasks) as pool:
+        for i, (k, file, _) in enumerate(sources):
+            row_type = FORM_DATASETS[k].row_type
+            yield k, file, (to_record(row_type, values) for batch in pool.iter_batches(i) for values in batch)
+
+
+def newness_ranks(files: list[str]) -> dict[str, int]:
+    """按修改时间给输入文件排名，越新排名越大，修改时间相同时命令行里靠后的算新"""
+    order = sorted(range(len(files)), key=lambda i: (os.path.getmtime(files[i]), i))
+    return {files[i]: rank for rank, i in enumerate(order)}
+
+
+def _is_empty(row) -> bool:
+    return all(value is None or value == '' for value in row)
+
+
+def _sort_key(form_key: str):
+    info = FORM_DATASETS[form_key]
+    indexes = [list(info.row_type.__annotations__).index(name) for name in info.key]
+    # CSV和XLSX读出来的类型不一定相同，统一按字符串比较
+    return lambda row: tuple('' if row[i] is None else str(row[i]) for i in indexes)
+
+
+def _peek(rows: Iterator) -> Optional[Iterator]:
+    """没有数据时返回None，否则返回包含第一行在内的迭代器"""
+    first = next(rows, None)
+    if first is None:
+        return None
+    return itertools.chain((first,), rows)
+
 
 @click.command('merge', help='合并多个CSV或XLSX文件，也可用于转换表格格式')
 @click.option(
@@ -100,8 +162,8 @@ HASH = generate_random_hash()
 )
 @click.option(
     '--type', '-t',
-    type=click.Choice(['csv', 'xlsx']),
-    help='输出文件类型，默认为csv，输出的文件将位于当前工作目录下',
+    type=click.Choice(['csv', 'xlsx', 'sqlite', 'parquet']),
+    help='输出文件类型，默认为csv，输出的文件将位于当前工作目录下，sqlite为每个表格一张表、按自然键upsert的数据库，parquet需要另外安装pyarrow',
     default='csv'
 )
 @click.option(
@@ -109,89 +171,100 @@ HASH = generate_random_hash()
     default=True,
     help='是否使生成文件中不包含来自CSV源文件的空行，默认开启'
 )
-def merge(csv: list[str], xlsx: list[str], type: str, remove_empty_lines: bool):
-    form: Form = {
-        'province': [],
-        'enroll': [],
-        'major': []
-    }
-
+@click.option(
+    '--sort',
+    is_flag=True,
+    help='按自然键（学校代码、面向省份、年份、科类、批次和专业等）排序，数据量超出--sort-buffer时借助磁盘上的临时文件排序'
+)
+@click.option(
+    '--sort-buffer',
+    type=click.IntRange(min=1),
+    default=100000,
+    show_default=True,
+    help='排序时内存里最多保留的行数'
+)
+@click.option(
+    '--dedup',
+    is_flag=True,
+    help='按自然键去掉重复的行，例如续爬或重复爬取同一省份产生的重复数据，索引放在磁盘上的临时文件里'
+)
+@click.option(
+    '--dedup-policy',
+    type=click.Choice(list(POLICIES)),
+    default='newest',
+    show_default=True,
+    help='重复的行留下哪一个：newest为修改时间最新的输入文件里的行，newest-non-null在此基础上用旧的行补上空字段，first为最先读到的行'
+)
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help='解析输入文件的进程数，XLSX的每张表可以在不同的进程里解析，合并多个文件时可设为CPU核数'
+)
+@click.option(
+    '--tmpdir',
+    type=click.Path(file_okay=False, writable=True),
+    default=None,
+    help='排序和去重用的临时文件目录，默认为系统临时目录'
+)
+def merge(
+    csv: list[str], xlsx: list[str], type: str, remove_empty_lines: bool, sort: bool, sort_buffer: int,
+    dedup: bool, dedup_policy: str, jobs: int, tmpdir: Optional[str]
+):
     if not csv and not xlsx:
         ctx = click.get_current_context()
         ctx.fail('请至少指定一个CSV或XLSX文件')
+    if type == 'parquet':
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            raise click.ClickException(str(e))
 
-    for file in csv:
-        with open(file, 'r', encoding='utf-8') as f:
-            """你用cast强制转类型的样子真的很狼狈"""
-            reader = _csv.DictReader(f)  # type: ignore
-            header = ','.join(reader.fieldnames)  # type: ignore
-            if header == HEADERS[0]:
-                """省分数线"""
-                form['province'].extend(list(reader))  # type: ignore
-            elif header == HEADERS[1]:
-                """招生计划"""
-                form['enroll'].extend(list(reader))  # type: ignore
-            elif header == HEADERS[2]:
-                """专业分数线"""
-                form['major'].extend(list(reader))  # type: ignore
-
-    for file in xlsx:
-        wb = openpyxl.load_workbook(file)
-        if '学校分数线' in wb:
-            for row in wb['学校分数线'].rows:
-                if row[0].value == '学校代码':
-                    continue
-                new_row = cast(MiniumScoreForUnivs,
-                               {k: v for k, v in zip(
-                                   MiniumScoreForUnivs.__annotations__.keys(),
-                                   (v.value for v in row)
-                               )})
-                form['province'].append(new_row)
-        if '各专业招生计划' in wb:
-            for row in wb['各专业招生计划'].rows:
-                if row[0].value == '学校代码':
-                    continue
-                new_row = cast(EnrollPlan,
-                               {k: v for k, v in zip(
-                                   EnrollPlan.__annotations__.keys(),
-                                   (v.value for v in row)
-                               )})
-                form['enroll'].append(new_row)
-        if '分专业录取分数线' in wb:
-            for row in wb['分专业录取分数线'].rows:
-                if row[0].value == '学校代码':
-                    continue
-                new_row = cast(MiniumScoreForMajors,
-                               {k: v for k, v in zip(
-                                   MiniumScoreForMajors.__annotations__.keys(),
-                                   (v.value for v in row)
-                               )})
-                form['major'].append(new_row)
-
-    if remove_empty_lines:
-        for k, v in form.items():
-            v = cast(list, v)  # 这个语法真的好丑
-            form[k] = list(filter(lambda x: x, v))
-
-    if type == 'csv':
-        for k, v in form.items():
-            if v:
-                v = cast(list, v)
-                with open(f'{k}_output_{HASH}.csv', 'w', encoding='utf-8', newline='') as f:
-                    writer = _csv.DictWriter(f, fieldnames=v[0].keys())
-                    writer.writeheader()
-                    writer.writerows(v)
-    elif type == 'xlsx':
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)  # type: ignore
-        for k, v in form.items():
-            if v:
-                v = cast(list, v)
-                ws = wb.create_sheet(NAME_DICT[k])
-                ws.append(READABLE_HEADERS[k])
-                for row in v:
-                    ws.append(list(row.values()))
-        wb.save(f'output_{HASH}.xlsx')
+    # 整个流程逐行进行，内存占用与输入的大小无关
+    csv_kinds = [(file, _csv_kind(file)) for file in csv]
+    ranks = newness_ranks(list(csv) + list(xlsx))
+    book = XlsxWorkbookSink(f'output_{HASH}.xlsx') if type == 'xlsx' else None
+    database = SqliteDatabaseSink(f'output_{HASH}.sqlite3') if type == 'sqlite' else None
+    sources = iter_sources(list_sources(csv_kinds, list(xlsx)), remove_empty_lines, jobs)
+    for k, group in itertools.groupby(sources, key=lambda source: source[0]):
+        info = FORM_DATASETS[k]
+        deduplicator = None
+        rows: Iterator
+        if dedup:
+            # 去重要读完全部输入才知道哪一行胜出，行先进磁盘上的索引，再按第一次出现的顺序读出
+            deduplicator = Deduplicator(info.row_type, info.key, dedup_policy, tmpdir)
+            for _, file, source in group:
+                deduplicator.add(source, ranks[file])
+            if deduplicator.rows_in:
+                click.echo(f'{info.sheet_name}：读入{deduplicator.rows_in}行，去掉{deduplicator.duplicates}行重复')
+            rows = iter(deduplicator)
+        else:
+            rows = itertools.chain.from_iterable(source for _, _, source in group)
+        if sort:
+            rows = external_sort(rows, info.row_type, _sort_key(k), sort_buffer, tmpdir)
+        peeked = _peek(rows)
+        if peeked is None:
+            if deduplicator is not None:
+                deduplicator.close()
+            continue
+        sink: RowSink
+        if book is not None:
+            sink = book.add_sheet(info.sheet_name, info.header)
+        elif database is not None:
+            sink = database.add_table(info.name, info.row_type, info.key)
+        elif type == 'parquet':
+            sink = ParquetSink(f'{k}_output_{HASH}.parquet', info.row_type)
+        else:
+            sink = CsvSink(f'{k}_output_{HASH}.csv', info.row_type)
+        sink.write_rows(peeked)
+        sink.close()
+        if deduplicator is not None:
+            deduplicator.close()
+    if book is not None:
+        book.close()
+    if database is not None:
+        database.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,110 @@
+import csv
+import sys
+import time
+import click
+import numpy as np
+from functions.admission_index import AdmissionIndex, build_index
+
+INDEX_DIR = 'admission_index'  # 索引目录
+
+DISPLAY_FIELDS = ('code', 'name', 'major_name', 'enroll_level', 'enroll_type', 'major_group', 'minium_score', 'minium_rank')
+"""查询结果里显示的列，数据集里没有的列略去"""
+
+_path = click.Path(exists=True, dir_okay=False, readable=True, resolve_path=True)
+
+
+@click.group('query', help='按面向省份、年份、科类和位次或分数查询能被录取的高校和专业')
+def cli():
+    pass
+
+
+@cli.command('build', help='从爬虫输出的CSV生成查询用的索引，已有的索引会被覆盖')
+@click.option('--major-score', '-m', type=_path, multiple=True, help='major_score_*.csv（分专业录取分数线），此选项可重复使用')
+@click.option('--univ-score', '-u', type=_path, multiple=True, help='min_score_*.csv（各省分数线），此选项可重复使用')
+@click.option('--index', '-i', 'directory', default=INDEX_DIR, show_default=True, help='索引目录')
+def build(major_score: list[str], univ_score: list[str], directory: str):
+    if not major_score and not univ_score:
+        click.get_current_context().fail('请至少指定一个CSV文件')
+    sources = {}
+    if major_score:
+        sources['major_score'] = list(major_score)
+    if univ_score:
+        sources['min_score'] = list(univ_score)
+    start = time.perf_counter()
+    counts = build_index(sources, directory)
+    click.echo('，'.join(f'{dataset}：{n}行' for dataset, n in counts.items()) + f'，用时{time.perf_counter() - start:.1f}秒')
+
+
+def _open(directory: str, schools: bool) -> tuple[AdmissionIndex, str]:
+    index = AdmissionIndex(directory)
+    dataset = 'min_score' if schools else 'major_score'
+    if dataset not in index.datasets:
+        raise click.ClickException(f'索引里没有{dataset}的数据，生成索引时请用{"-u" if schools else "-m"}指定CSV')
+    return index, dataset
+
+
+def _echo_rows(index: AdmissionIndex, dataset: str, row_ids: np.ndarray, limit: int):
+    records = index.records(dataset, row_ids[:limit])
+    if not records:
+        click.echo('没有符合条件的数据')
+        return
+    fields = [k for k in DISPLAY_FIELDS if k in records[0]]
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerow(fields)
+    writer.writerows([record[k] for k in fields] for record in records)
+    if len(row_ids) > limit:
+        click.echo(f'……共{len(row_ids)}条，只显示前{limit}条')
+
+
+_common = [
+    click.option('--index', '-i', 'directory', default=INDEX_DIR, show_default=True, help='索引目录'),
+    click.option('--province', '-p', required=True, help='招生面向省份，如河南'),
+    click.option('--year', '-y', type=int, required=True, help='年份'),
+    click.option('--major', '-t', required=True, help='科类，如理科、文科、物理类'),
+    click.option('--schools', is_flag=True, help='查各省分数线（按院校），默认查分专业录取分数线'),
+    click.option('--limit', type=click.IntRange(min=1), default=50, show_default=True, help='最多显示的条数')
+]
+
+
+def common_options(f):
+    for option in reversed(_common):
+        f = option(f)
+    return f
+
+
+@cli.command('rank', help='考到这个位次能被录取的专业，即最低位次不高于它的，从最难考的开始列出')
+@common_options
+@click.option('--rank', '-r', type=int, required=True, help='位次')
+def rank(directory: str, province: str, year: int, major: str, schools: bool, limit: int, rank: int):
+    index, dataset = _open(directory, schools)
+    _echo_rows(index, dataset, index.by_rank(dataset, province, year, major, rank), limit)
+
+
+@cli.command('score', help='考到这个分数能被录取的专业，即最低分不高于它的，从最难考的开始列出')
+@common_options
+@click.option('--score', '-s', type=int, required=True, help='分数')
+def score(directory: str, province: str, year: int, major: str, schools: bool, limit: int, score: int):
+    index, dataset = _open(directory, schools)
+    _echo_rows(index, dataset, index.by_score(dataset, province, year, major, score), limit)
+
+
+@cli.command('batch', help='批量查询，输入CSV每行为“面向省份,年份,科类,位次或分数”，输出在每行末尾加上能被录取的条数')
+@click.argument('queries', type=click.File('r', encoding='utf-8'))
+@click.option('--index', '-i', 'directory', default=INDEX_DIR, show_default=True, help='索引目录')
+@click.option('--by', type=click.Choice(['rank', 'score']), default='rank', show_default=True, help='第四列是位次还是分数')
+@click.option('--schools', is_flag=True, help='查各省分数线（按院校），默认查分专业录取分数线')
+def batch(queries, directory: str, by: str, schools: bool):
+    index, dataset = _open(directory, schools)
+    rows = [row for row in csv.reader(queries) if row]
+    if not rows:
+        return
+    provinces, years, majors, values = zip(*(row[:4] for row in rows))
+    groups = index.group_ids(dataset, provinces, [int(y) for y in years], majors)
+    ranges = index.rank_ranges if by == 'rank' else index.score_ranges
+    lo, hi = ranges(dataset, groups, [int(v) for v in values])
+    writer = csv.writer(sys.stdout, lineterminator='\n')
+    writer.writerows([*row, count] for row, count in zip(rows, (hi - lo).tolist()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,101 @@
+from functions.archive import INDEX_SUFFIX, SEGMENT_SUFFIX, ResponseArchive, response_archive
+from functions import intercepted_requests, static_requests
+from functions.cache import response_cache
+from exceptions import CacheMiss
+from tests.fake_server import FakeEolServer
+from unittest import mock
+import gzip
+import json
+import os
+import tempfile
+import unittest
+import main
+
+
+class ResponseArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = ResponseArchive()
+
+    def tearDown(self):
+        self.archive.close()
+
+    def record(self, n: int, segment: str = 'main'):
+        self.archive.configure(self.directory, 'record', segment)
+        for i in range(n):
+            self.archive.record('api', {'page': i}, 200, json.dumps({'page': i}))
+        self.archive.close()
+
+    def test_replay(self):
+        self.record(3)
+        self.record(2, 'other')
+        self.archive.configure(self.directory, 'replay')
+        self.assertEqual(json.loads(self.archive.get('api', {'page': 2}).body), {'page': 2})
+        self.assertIsNone(self.archive.get('api', {'page': 3}))
+        # 分段是合法的.gz文件
+        with gzip.open(os.path.join(self.directory, 'main' + SEGMENT_SUFFIX), 'rt', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_recover_unindexed_and_partial(self):
+        self.record(3)
+        base = os.path.join(self.directory, 'main')
+        with open(base + INDEX_SUFFIX, 'r+', encoding='utf-8') as f:
+            lines = f.readlines()
+            f.seek(0)
+            f.truncate()
+            f.writelines(lines[:1])
+        with open(base + SEGMENT_SUFFIX, 'ab') as f:
+            f.write(b'\x1f\x8b\x08')
+        self.record(4)
+        self.archive.configure(self.directory, 'replay')
+        for i in range(4):
+            self.assertEqual(json.loads(self.archive.get('api', {'page': i}).body), {'page': i})
+        with gzip.open(base + SEGMENT_SUFFIX, 'rt', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+
+class RecordReplayTestCase(unittest.TestCase):
+    """录制一次爬取，关掉替身服务器后回放，数据完全一样"""
+
+    def setUp(self):
+        self.server = FakeEolServer(schools_per_province=2).start()
+        self.cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        intercepted_requests.configure_rate_control(0.001, min_interval=0.001, adaptive=False)
+        response_cache.configure(None)
+        self.patches = [
+            mock.patch.object(intercepted_requests, 'API_URL', self.server.api_url),
+            mock.patch.object(static_requests, 'STATIC_URL', self.server.static_url),
+            mock.patch.object(main, 'MANIFEST_FILE', None)
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        response_archive.configure(None)
+        for patch in self.patches:
+            patch.stop()
+        os.chdir(self.cwd)
+
+    def crawl(self, run_id: str):
+        main.crawl(main.get_univ_list('北京'), main.load_dictionary(), main.enabled_datasets(), run_id, generate_xlsx=False)
+
+    def read(self, dataset: str, run_id: str) -> str:
+        with open(f'{dataset}_{run_id}.csv', encoding='utf-8-sig') as f:
+            return f.read()
+
+    def test_replay(self):
+        response_archive.configure('archive', 'record', 'recorded')
+        self.crawl('recorded')
+        self.server.stop()
+
+        response_archive.configure('archive', 'replay')
+        self.crawl('replayed')
+        for dataset in main.enabled_datasets():
+            self.assertEqual(self.read(dataset, 'replayed'), self.read(dataset, 'recorded'))
+        with self.assertRaises(CacheMiss):
+            main.get_univ_list('河南')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""端到端性能测试：对着本地替身服务器爬一个合成的省份，报告吞吐量、峰值内存和总用时
+
+在仓库根目录下运行，不会被pytest收集：
+
+    python -m tests.benchmark --schools 20 --latency 0.02 --repeat 3 --json before.json
+
+每次爬取都在新的子进程里进行，峰值内存只算爬虫本身，互不影响。
+"""
+
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+from typing import Optional
+import click
+from tests.fake_server import FakeEolServer
+
+
+def _sample_sum(metric) -> float:
+    return sum(value for _, value in metric.samples())
+
+
+def run_crawl(workdir: str, query_interval: float, backoff: float, cache: bool, xlsx: bool) -> dict:
+    """在子进程里爬一次，返回爬虫这边看到的数字"""
+    os.chdir(workdir)
+    import main
+    from functions import metrics
+    from functions.cache import response_cache
+    from functions.intercepted_requests import configure_rate_control
+
+    configure_rate_control(
+        query_interval,
+        min_interval=query_interval,
+        backoff_base=backoff,
+        backoff_max=backoff * 8,
+        state_file=None
+    )
+    if not cache:
+        response_cache.configure(None)
+    main.METRICS_INTERVAL = 0
+
+    start = time.perf_counter()
+    univ_list = main.get_univ_list('北京')
+    dictionary = main.load_dictionary()
+    main.crawl(univ_list, dictionary, main.enabled_datasets(), 'bench', generate_xlsx=xlsx)
+    wall = time.perf_counter() - start
+
+    api_requests = _sample_sum(metrics.eol_requests)
+    static_requests = _sample_sum(metrics.static_requests)
+    rows = _sample_sum(metrics.rows_written)
+    return {
+        'wall_seconds': wall,
+        'api_requests': api_requests,
+        'static_requests': static_requests,
+        'rows': rows,
+        'api_requests_per_second': api_requests / wall,
+        'rows_per_second': rows / wall,
+        'token_wait_seconds': sum(s['sum'] for s in metrics.eol_token_wait_seconds.summary()),
+        # Linux上ru_maxrss的单位是KB
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def format_result(result: dict) -> str:
+    return (
+        f'用时{result["wall_seconds"]:.2f}秒，'
+        f'接口{result["api_requests"]:.0f}次（{result["api_requests_per_second"]:.1f}次/秒），'
+        f'静态文件{result["static_requests"]:.0f}次，'
+        f'{result["rows"]:.0f}行（{result["rows_per_second"]:.0f}行/秒），'
+        f'峰值内存{result["peak_rss_mb"]:.1f}MB，'
+        f'被限速{result["server"]["throttled"]}次，响应体过大{result["server"]["oversize"]}次'
+    )
+
+
+@click.command('benchmark', help='对着本地替身服务器爬一个合成的省份，报告请求数/秒、行数/秒、峰值内存和总用时')
+@click.option('--schools', type=int, default=20, show_default=True, help='合成省份的高校数')
+@click.option('--target-provinces', type=int, default=2, show_default=True, help='每所高校面向的省份数')
+@click.option('--years', type=int, default=3, show_default=True, help='每个省份的年份数')
+@click.option('--max-items', type=int, default=120, show_default=True, help='每个批次最多的专业数')
+@click.option('--latency', type=float, default=0.02, show_default=True, help='接口的响应延迟，单位为秒')
+@click.option('--static-latency', type=float, default=0.01, show_default=True, help='静态文件的响应延迟，单位为秒')
+@click.option('--query-interval', type=float, default=0.001, show_default=True, help='爬虫的查询间隔，单位为秒')
+@click.option('--server-min-interval', type=float, default=0.0, show_default=True, help='替身服务器允许的最小请求间隔，更快时返回1069')
+@click.option('--throttle-probability', type=float, default=0.0, show_default=True, help='每个接口请求返回1069的概率')
+@click.option('--max-page-items', type=int, default=None, help='一页超过这么多条时返回1090')
+@click.option('--backoff', type=float, default=0.2, show_default=True, help='被限速后的起步退避时间，单位为秒')
+@click.option('--cache', is_flag=True, help='使用响应缓存（每次运行都是新的缓存文件）')
+@click.option('--xlsx', is_flag=True, help='同时生成xlsx')
+@click.option('--repeat', type=int, default=1, show_default=True, help='重复次数，报告中位数')
+@click.option('--json', 'json_path', default=None, help='把结果写入这个JSON文件，方便比较改动前后的结果')
+def main(
+    schools: int, target_provinces: int, years: int, max_items: int, latency: float, static_latency: float,
+    query_interval: float, server_min_interval: float, throttle_probability: float, max_page_items: Optional[int],
+    backoff: float, cache: bool, xlsx: bool, repeat: int, json_path: Optional[str]
+):
+    results = []
+    for i in range(repeat):
+        server = FakeEolServer(
+            schools_per_province=schools,
+            target_provinces=(11, 12, 41)[:target_provinces],
+            years=tuple(range(2023 - years, 2023)),
+            max_items=max_items
+        )
+        server.latency = latency
+        server.static_latency = static_latency
+        server.min_interval = server_min_interval
+        server.throttle_probability = throttle_probability
+        server.max_page_items = max_page_items
+        server.start()
+        os.environ.update(server.env())
+        try:
+            # 子进程用spawn启动，读到的是替身服务器的地址
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                result = pool.submit(run_crawl, tempfile.mkdtemp(), query_interval, backoff, cache, xlsx).result()
+        finally:
+            server.stop()
+        result['server'] = {**server.requests, 'bytes_sent': server.bytes_sent}
+        results.append(result)
+        click.echo(f'第{i + 1}次：{format_result(result)}')
+
+    if repeat > 1:
+        median = {
+            key: statistics.median(result[key] for result in results)
+            for key in results[0] if key != 'server'
+        }
+        median['server'] = results[0]['server']
+        click.echo(f'中位数：{format_result(median)}')
+
+    if json_path is not None:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({'options': click.get_current_context().params, 'runs': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
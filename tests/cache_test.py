@@ -0,0 +1,95 @@
+from functions.cache import ResponseCache, is_immutable, response_cache
+from functions import cache, static_requests
+from exceptions import CacheMiss
+from tests.fake_server import DICTIONARY, FakeEolServer
+from unittest import mock
+import datetime
+import os
+import sqlite3
+import tempfile
+import unittest
+
+API_URL = 'https://api.eol.cn/web/api/'
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache()
+        self.cache.configure(os.path.join(tempfile.mkdtemp(), 'cache.sqlite3'))
+
+    def test_payload_is_canonicalised(self):
+        self.cache.put(API_URL, {'page': 1, 'uri': 'apidata/api/gk/school/lists'}, 200, '{}')
+        cached = self.cache.get(API_URL, {'uri': 'apidata/api/gk/school/lists', 'page': 1})
+        self.assertIsNotNone(cached)
+        self.assertIsNone(self.cache.get(API_URL, {'uri': 'apidata/api/gk/school/lists', 'page': 2}))
+
+    def test_past_years_are_immutable(self):
+        this_year = datetime.date.today().year
+        self.assertTrue(is_immutable(API_URL, {'year': this_year - 1}))
+        self.assertFalse(is_immutable(API_URL, {'year': this_year}))
+        self.assertTrue(is_immutable(
+            f'https://static-data.gaokao.cn/www/2.0/schoolprovinceindex/{this_year - 1}/1/11/1/1.json'
+        ))
+
+    def test_lru_eviction(self):
+        self.cache.max_bytes = 2000
+        for i in range(10):
+            self.cache.put(API_URL, {'page': i}, 200, os.urandom(200).hex())
+            self.cache.get(API_URL, {'page': 0})  # 一直访问第0条，不应被淘汰
+        self.assertIsNotNone(self.cache.get(API_URL, {'page': 0}))
+        self.assertIsNone(self.cache.get(API_URL, {'page': 1}))
+
+    def test_cache_only(self):
+        self.cache.cache_only = True
+        with self.assertRaises(CacheMiss):
+            self.cache.get(API_URL, {'page': 1})
+
+    def test_old_schema(self):
+        path = os.path.join(tempfile.mkdtemp(), 'old.sqlite3')
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE responses (
+                key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, body BLOB NOT NULL,
+                size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL, expires REAL
+            )
+        ''')
+        conn.close()
+        self.cache.configure(path)
+        self.cache.put(API_URL, {'page': 1}, 200, '{}', etag='"a"')
+        self.assertEqual(self.cache.get_stale(API_URL, {'page': 1}).etag, '"a"')
+
+
+class ConditionalGetTestCase(unittest.TestCase):
+    """缓存过期的静态文件发条件请求，304时使用缓存中的内容"""
+
+    def setUp(self):
+        self.server = FakeEolServer().start()
+        response_cache.configure(os.path.join(tempfile.mkdtemp(), 'cache.sqlite3'))
+        self.patches = [
+            mock.patch.object(static_requests, 'STATIC_URL', self.server.static_url),
+            mock.patch.dict(cache.CACHE_TTL, {'dicprovince/dic.json': -1})
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        response_cache.configure(None)
+        self.server.stop()
+
+    def test_not_modified(self):
+        for _ in range(3):
+            self.assertEqual(static_requests.fetch_static_json('config/dicprovince/dic.json')['data'], DICTIONARY)
+        self.assertEqual(self.server.requests['static'], 3)
+        self.assertEqual(self.server.requests['not_modified'], 2)
+        self.assertEqual(response_cache.not_modified, 2)
+        self.assertGreater(response_cache.not_modified_bytes, 0)
+
+    def test_missing_files_are_not_revalidated(self):
+        self.assertIsNone(static_requests.fetch_static_json('school/1/dic/none.json'))
+        self.assertIsNone(response_cache.get_stale(self.server.static_url + 'school/1/dic/none.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from functions.rows import make_record
+from type import EnrollPlan
+import importlib.util
+import os
+import tempfile
+import unittest
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+def enroll_row(i: int, target_province: str, year: int, planned_number):
+    return make_record(
+        EnrollPlan,
+        code='10001', name='测试大学', located_province='北京', target_province=target_province, year=year,
+        major='理科', enroll_level='本科批', major_name=f'专业{i}', planned_number=planned_number,
+        duration='四年', tuition='5000', major_group=None, subject_requirements=None
+    )
+
+
+@unittest.skipUnless(HAS_PYARROW, '没有安装pyarrow')
+class ParquetSinkTestCase(unittest.TestCase):
+    def test_row_groups(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from functions.columnar import ParquetSink
+
+        # 爬虫按高校输出，同一所高校的各省份、各年份交替出现
+        rows = [
+            enroll_row(i, province, year, '-' if i == 0 else i)
+            for i in range(10) for province in ('河南', '河北') for year in (2021, 2022)
+        ]
+        path = os.path.join(tempfile.mkdtemp(), 'enroll_plan.parquet')
+        sink = ParquetSink(path, EnrollPlan, row_group_rows=4, buffer_rows=9)
+        sink.write_rows(rows)
+        sink.close()
+
+        f = pq.ParquetFile(path)
+        self.assertEqual(f.schema_arrow.field('planned_number').type, pa.int32())
+        self.assertEqual(f.schema_arrow.field('name').type, pa.dictionary(pa.int32(), pa.string()))
+        read = []
+        for i in range(f.num_row_groups):
+            group = f.read_row_group(i)
+            self.assertLessEqual(group.num_rows, 4)
+            self.assertEqual(len(set(zip(group.column('year').to_pylist(), group.column('target_province').to_pylist()))), 1)
+            read += group.to_pylist()
+
+        def key(row):
+            return row['target_province'], row['year'], row['major_name']
+
+        expected = [row._replace(planned_number=None if row.planned_number == '-' else row.planned_number)._asdict() for row in rows]
+        self.assertEqual(sorted(read, key=key), sorted(expected, key=key))
+
+
+if __name__ == '__main__':
+    unittest.main()
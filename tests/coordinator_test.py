@@ -0,0 +1,173 @@
+from functions.coordinator import Coordinator, CrawlTask
+from tests.fake_server import FakeEolServer
+import csv
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CoordinatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = Coordinator(os.path.join(tempfile.mkdtemp(), 'coordinator.sqlite3'), lease_seconds=0.2, max_attempts=2)
+        self.univ = {'school_id': 1, 'name': '测试大学'}
+        self.coordinator.seed([
+            (CrawlTask('enroll_plan', 1, 11, 2022), self.univ),
+            (CrawlTask('enroll_plan', 1, 11, 2023), self.univ)
+        ])
+
+    def tearDown(self):
+        self.coordinator.close()
+
+    def test_seed_once(self):
+        self.assertEqual(self.coordinator.seed([(CrawlTask('enroll_plan', 1, 11, 2022), self.univ)]), 0)
+        self.assertEqual(self.coordinator.status()['pending'], 2)
+
+    def test_lease_in_order(self):
+        first = self.coordinator.lease('a')
+        second = self.coordinator.lease('b')
+        self.assertEqual(first.task.year, 2022)
+        self.assertEqual(second.task.year, 2023)
+        self.assertEqual(first.univ, self.univ)
+        self.assertIsNone(self.coordinator.lease('c'))
+        self.assertFalse(self.coordinator.finished())
+
+    def test_expired_lease(self):
+        lease = self.coordinator.lease('a')
+        self.coordinator.lease('b')
+        time.sleep(0.3)
+        # a的租约过期后被c接手，a上传的数据会被丢弃
+        self.assertEqual(self.coordinator.lease('c').id, lease.id)
+        self.assertFalse(self.coordinator.heartbeat(lease.id, 'a'))
+        self.assertFalse(self.coordinator.complete(lease.id, 'a', [{'name': 'a'}]))
+        self.assertTrue(self.coordinator.complete(lease.id, 'c', [{'name': 'c'}]))
+        self.assertEqual(list(self.coordinator.iter_rows('enroll_plan')), [{'name': 'c'}])
+
+    def test_heartbeat(self):
+        lease = self.coordinator.lease('a')
+        for _ in range(3):
+            time.sleep(0.1)
+            self.assertTrue(self.coordinator.heartbeat(lease.id, 'a'))
+        self.assertNotEqual(self.coordinator.lease('b').id, lease.id)
+
+    def test_complete_and_fail(self):
+        first = self.coordinator.lease('a')
+        second = self.coordinator.lease('a')
+        self.assertTrue(self.coordinator.complete(second.id, 'a', [{'n': 3}, {'n': 4}]))
+        self.assertTrue(self.coordinator.fail(first.id, 'a'))
+        self.assertTrue(self.coordinator.complete(self.coordinator.lease('a').id, 'a', [{'n': 1}]))
+        # 导出顺序按任务顺序，而不是完成顺序
+        self.assertEqual([row['n'] for row in self.coordinator.iter_rows('enroll_plan')], [1, 3, 4])
+        self.assertTrue(self.coordinator.finished())
+
+    def test_complete_retry(self):
+        lease = self.coordinator.lease('a')
+        self.assertTrue(self.coordinator.complete(lease.id, 'a', [{'n': 1}]))
+        # 上次的响应没收到，重新提交也算成功，数据只有一份
+        self.assertTrue(self.coordinator.complete(lease.id, 'a', [{'n': 1}]))
+        self.assertFalse(self.coordinator.complete(lease.id, 'b', [{'n': 2}]))
+        self.assertEqual(list(self.coordinator.iter_rows('enroll_plan')), [{'n': 1}])
+
+    def test_give_up(self):
+        for _ in range(2):
+            self.coordinator.fail(self.coordinator.lease('a').id, 'a')
+        self.assertEqual(self.coordinator.status()['failed'], 1)
+
+
+class MultiWorkerTestCase(unittest.TestCase):
+    """在本机用替身服务器跑一个协调器和三个worker进程"""
+
+    def setUp(self):
+        self.server = FakeEolServer().start()
+        self.cwd = tempfile.mkdtemp()
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def spawn(self, *args: str) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'coordinator.py'), *args],
+            cwd=self.cwd,
+            env={**os.environ, **self.server.env()},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    def read_csv(self, dataset: str) -> list[dict]:
+        with open(os.path.join(self.cwd, f'{dataset}_test.csv'), encoding='utf-8-sig') as f:
+            return list(csv.DictReader(f))
+
+    def serve(self) -> subprocess.Popen:
+        return self.spawn(
+            'serve', '--host', '127.0.0.1', '--port', str(self.port), '--province', '北京',
+            '--exit-when-done', '--run-id', 'test', '--no-xlsx', '--lease-seconds', '30'
+        )
+
+    def work(self, n: int) -> list[subprocess.Popen]:
+        return [
+            self.spawn(
+                'work', '--coordinator', f'http://127.0.0.1:{self.port}', '--worker-id', f'w{i}',
+                '--query-interval', '0.01', '--no-cache'
+            )
+            for i in range(n)
+        ]
+
+    def check_output(self):
+        server = self.server
+        schools = [univ['school_id'] for univ in server.schools(11)]
+        tasks = [(s, p, y) for s in schools for p in server.target_provinces for y in server.years]
+        self.assertEqual(len(self.read_csv('min_score')), len(tasks) * len(server.types))
+        expected = sum(
+            server.item_count(s, y, t, b)
+            for s, p, y in tasks for t in server.types for b in server.batches
+        )
+        for dataset in ('enroll_plan', 'major_score'):
+            rows = self.read_csv(dataset)
+            self.assertEqual(len(rows), expected)
+            # 每个任务只有一份数据，且按高校的顺序导出
+            self.assertEqual(len({(row['name'], row['target_province'], row['major_name']) for row in rows}), expected)
+            names = [row['name'] for row in rows]
+            self.assertEqual(names, sorted(names, key=lambda name: name[-1]))
+
+    def test_crawl(self):
+        coordinator = self.serve()
+        workers = self.work(3)
+        try:
+            for worker in workers:
+                self.assertEqual(worker.wait(timeout=120), 0)
+            self.assertEqual(coordinator.wait(timeout=60), 0)
+        finally:
+            for process in (coordinator, *workers):
+                process.kill()
+        self.check_output()
+
+    def test_coordinator_restart(self):
+        # 放慢替身服务器，协调器被杀掉时worker还在干活
+        self.server.latency = 0.05
+        coordinator = self.serve()
+        workers = self.work(2)
+        try:
+            time.sleep(3)
+            self.assertTrue(all(worker.poll() is None for worker in workers))
+            coordinator.kill()
+            coordinator.wait()
+            time.sleep(2)
+            coordinator = self.serve()
+            for worker in workers:
+                self.assertEqual(worker.wait(timeout=180), 0)
+            self.assertEqual(coordinator.wait(timeout=60), 0)
+        finally:
+            for process in (coordinator, *workers):
+                process.kill()
+        self.check_output()
+
+if __name__ == '__main__':
+    unittest.main()
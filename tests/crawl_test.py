@@ -0,0 +1,69 @@
+from functions.journal import Journal, TaskKey
+from functions import intercepted_requests, static_requests
+from functions.cache import response_cache
+from tests.fake_server import FakeEolServer
+from unittest import mock
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+import main
+
+
+@unittest.skipIf(os.name == 'nt', '需要向自己发送SIGINT')
+class InterruptTestCase(unittest.TestCase):
+    """爬到一半按下Ctrl-C，各数据集的线程马上停下，不会等爬完手上的高校"""
+
+    def setUp(self):
+        self.server = FakeEolServer(schools_per_province=1).start()
+        self.cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        # 一所高校要请求几十页，按这个间隔要爬半分钟以上
+        intercepted_requests.configure_rate_control(0.5, min_interval=0.5, adaptive=False)
+        response_cache.configure(None)
+        self.patches = [
+            mock.patch.object(intercepted_requests, 'API_URL', self.server.api_url),
+            mock.patch.object(static_requests, 'STATIC_URL', self.server.static_url),
+            mock.patch.object(main, 'MANIFEST_FILE', None)
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        os.chdir(self.cwd)
+        self.server.stop()
+        intercepted_requests.configure_rate_control(0.001, min_interval=0.001, adaptive=False)
+
+    def test_keyboard_interrupt(self):
+        univ_list = main.get_univ_list('北京')
+        dictionary = main.load_dictionary()
+        interrupted = []
+
+        def interrupt():
+            interrupted.append(time.monotonic())
+            os.kill(os.getpid(), signal.SIGINT)
+
+        timer = threading.Timer(3, interrupt)
+        timer.start()
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                main.crawl(univ_list, dictionary, main.enabled_datasets(), 'interrupted', generate_xlsx=False)
+        finally:
+            timer.cancel()
+        self.assertLess(time.monotonic() - interrupted[0], 2)
+        self.assertFalse(any(thread.name.startswith('dataset') for thread in threading.enumerate()))
+
+        # 各省分数线只有几页，可能在中断前爬完；分专业录取分数线的页数最多，一定没爬完
+        journal = Journal('journal_interrupted.tsv')
+        try:
+            self.assertFalse(journal.is_done(TaskKey('major_score', univ_list[0]['school_id'])))
+        finally:
+            journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,313 @@
+"""api.eol.cn和static-data.gaokao.cn的本地替身，数据是确定性生成的
+
+字段和单条数据的大小参照真实接口，可以按需注入1069（限速）、1090（响应体过大）和延迟，
+用于离线的端到端测试和性能测试（见tests/benchmark.py）。
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+PROVINCES = {11: '北京', 12: '天津', 41: '河南'}
+"""替身服务器上有高校的省份"""
+
+DICTIONARY = {'1': '理科', '2': '文科', '3': '综合'}
+
+LAST_MODIFIED = 'Mon, 01 Jul 2024 00:00:00 GMT'
+
+_SCORE_PAGE_RE = re.compile(r'^/www/2.0/schoolprovinceindex/(\d+)/(\d+)/(\d+)/(\d+)/1.json$')
+_METADATA_RE = re.compile(r'^/www/2.0/school/(\d+)/dic/(provincescore|specialplan|specialscore).json$')
+
+
+class FakeEolServer:
+    """在后台线程里运行的替身服务器
+
+    每个省份有schools_per_province所高校，每所高校面向target_provinces招生，
+    年份为years，科类为types，批次为batches，每个批次的条数由高校、年份、科类和批次决定，最多max_items条。
+
+    以下属性可以随时修改，用来注入故障：
+    min_interval：两次接口请求的间隔小于这个值时返回1069，和真实接口按IP限速一样；
+    throttle_probability：每个接口请求以这个概率返回1069；
+    max_page_items：一页超过这么多条时返回1090；
+    latency、static_latency：接口和静态文件的响应延迟，单位为秒，会有±jitter比例的随机抖动。
+    """
+
+    def __init__(
+        self,
+        schools_per_province: int = 3,
+        target_provinces: tuple[int, ...] = (11, 41),
+        years: tuple[int, ...] = (2021, 2022),
+        types: tuple[int, ...] = (1, 2),
+        batches: tuple[int, ...] = (7, 8),
+        max_items: int = 60,
+        seed: int = 0
+    ):
+        self.schools_per_province = schools_per_province
+        self.target_provinces = target_provinces
+        self.years = years
+        self.types = types
+        self.batches = batches
+        self.max_items = max_items
+        self.min_interval = 0.0
+        self.throttle_probability = 0.0
+        self.max_page_items: Optional[int] = None
+        self.latency = 0.0
+        self.static_latency = 0.0
+        self.jitter = 0.2
+        self.requests = {'api': 0, 'static': 0, 'not_modified': 0, 'throttled': 0, 'oversize': 0}
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._last_api_request = 0.0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def api_url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_port}/web/api/'
+
+    @property
+    def static_url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_port}/www/2.0/'
+
+    def env(self) -> dict[str, str]:
+        """让爬虫连到替身服务器的环境变量"""
+        return {'EOL_API_URL': self.api_url, 'GAOKAO_STATIC_URL': self.static_url}
+
+    def start(self) -> 'FakeEolServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # region 数据
+
+    def schools(self, prov_id: int) -> list[dict]:
+        return [self.school(prov_id, i) for i in range(1, self.schools_per_province + 1)]
+
+    def school(self, prov_id: int, i: int) -> dict:
+        school_id = prov_id * 100 + i
+        return {
+            'admissions': '1',
+            'answerurl': '',
+            'belong': '教育部',
+            'central': '1',
+            'city_id': str(prov_id * 100 + 1),
+            'city_name': f'{PROVINCES[prov_id]}市',
+            'code_enroll': f'{school_id:05d}00',
+            'county_id': str(prov_id * 10000 + 101),
+            'county_name': '某某区',
+            'department': '1',
+            'doublehigh': '0',
+            'dual_class': '38000',
+            'dual_class_name': '双一流',
+            'f211': '1',
+            'f985': '0',
+            'is_logo': '1',
+            'is_recruitment': '1',
+            'is_top': 0,
+            'level': '2001',
+            'level_name': '普通本科',
+            'name': f'{PROVINCES[prov_id]}测试大学{i}',
+            'nature': '36000',
+            'nature_name': '公办',
+            'province_id': str(prov_id),
+            'province_name': PROVINCES[prov_id],
+            'rank': str(i),
+            'rank_type': '0',
+            'school_id': school_id,
+            'school_type': '6000',
+            'special': [],
+            'type': '5000',
+            'type_name': '综合类',
+            'view_month': '12.3万',
+            'view_month_number': '123456',
+            'view_total': '1234.5万',
+            'view_total_number': '12345678',
+            'view_week': '1.2万',
+            'view_week_number': '12345',
+            'view_year': 1234567
+        }
+
+    def item_count(self, school_id: int, year: int, type_id: int, batch_id: int) -> int:
+        return 1 + (school_id * 7 + year + type_id * 13 + batch_id * 31) % self.max_items
+
+    def metadata(self, kind: str) -> dict:
+        newsdata: dict = {
+            'province': list(self.target_provinces),
+            'year': {str(p): list(self.years) for p in self.target_provinces},
+            'type': {f'{p}_{y}': list(self.types) for p in self.target_provinces for y in self.years}
+        }
+        if kind != 'provincescore':
+            newsdata['batch'] = {
+                f'{p}_{y}_{t}': list(self.batches)
+                for p in self.target_provinces for y in self.years for t in self.types
+            }
+            newsdata['group'] = {}
+            newsdata['groups'] = {}
+        return {
+            'newsdata': newsdata,
+            'pids': list(self.target_provinces),
+            'year': list(self.years)
+        }
+
+    def items(self, uri: str, school_id: int, prov_id: int, year: int, type_id: int, batch_id: int) -> list[dict]:
+        return [
+            {
+                'spname': f'专业{school_id}-{year}-{type_id}-{batch_id}-{k}',
+                'spcode': f'{80900 + k:06d}',
+                'special_id': str(1000 + k),
+                'num': k % 9 + 1,
+                'length': '四年',
+                'tuition': '5000',
+                'local_batch_name': f'批次{batch_id}',
+                'local_province_name': PROVINCES.get(prov_id, str(prov_id)),
+                'local_type_name': DICTIONARY[str(type_id)],
+                'level1_name': '本科',
+                'level2_name': '工学',
+                'level3_name': '计算机类',
+                'zslx_name': '普通类',
+                'sg_name': '',
+                'sg_info': '',
+                'sg_type': 0,
+                'first_km': 0,
+                'is_top': 0,
+                'info': '含计算机科学与技术、软件工程、网络工程、信息安全等专业',
+                'remark': '',
+                'school_id': school_id,
+                'year': year,
+                'average': str(550 + k),
+                'max': str(560 + k),
+                'min': 540 + k,
+                'min_section': 20000 - k * 100 - school_id,
+                'proscore': 450
+            }
+            for k in range(self.item_count(school_id, year, type_id, batch_id))
+        ]
+
+    def api(self, payload: dict) -> dict:
+        uri = payload['uri']
+        with self._lock:
+            now = time.monotonic()
+            throttled = (
+                now - self._last_api_request < self.min_interval
+                or self._random.random() < self.throttle_probability
+            )
+            if throttled:
+                self.requests['throttled'] += 1
+            else:
+                self._last_api_request = now
+        if throttled:
+            return {'code': '1069', 'message': '访问太过频繁，请稍后再试', 'data': '', 'encrydata': '', 'location': ''}
+
+        if uri == 'apidata/api/gk/school/lists':
+            items = self.schools(int(payload['province_id'])) if int(payload['province_id']) in PROVINCES else []
+        else:
+            items = self.items(
+                uri, int(payload['school_id']), int(payload['local_province_id']), int(payload['year']),
+                int(payload['local_type_id']), int(payload['local_batch_id'])
+            )
+        # 不带分页参数时和真实接口一样返回第一页
+        size, page = int(payload.get('size', 10)), int(payload.get('page', 1))
+        page_items = items[(page - 1) * size:page * size]
+        if self.max_page_items is not None and len(page_items) > self.max_page_items:
+            with self._lock:
+                self.requests['oversize'] += 1
+            return {'code': '1090', 'message': '响应体大小超出限制', 'data': '', 'encrydata': '', 'location': ''}
+        return {
+            'code': '0000',
+            'message': '成功',
+            'data': {'item': page_items, 'numFound': len(items)},
+            'encrydata': '',
+            'location': ''
+        }
+
+    def static(self, path: str) -> tuple[int, dict]:
+        if path == '/www/2.0/config/dicprovince/dic.json':
+            return 200, {'data': DICTIONARY}
+        match = _METADATA_RE.match(path)
+        if match:
+            return 200, {'data': self.metadata(match.group(2))}
+        match = _SCORE_PAGE_RE.match(path)
+        if match:
+            year, school_id, prov_id, type_id = (int(v) for v in match.groups())
+            return 200, {'data': {'item': [
+                {
+                    'local_batch_name': '本科批',
+                    'zslx_name': '普通类',
+                    'min': 500 + type_id,
+                    'min_section': 30000 - school_id,
+                    'proscore': '450',
+                    'sg_name': '',
+                    'sg_info': '',
+                    'average': '510',
+                    'max': '530',
+                    'local_province_name': PROVINCES.get(prov_id, str(prov_id)),
+                    'local_type_name': DICTIONARY[str(type_id)],
+                    'year': year
+                }
+            ]}}
+        return 404, {}
+
+    # endregion
+
+    def _delay(self, latency: float):
+        if latency > 0:
+            with self._lock:
+                factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+            time.sleep(latency * factor)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send(self, status: int, body: dict, headers: Optional[dict[str, str]] = None):
+                data = json.dumps(body, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                with server._lock:
+                    server.bytes_sent += len(data)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with server._lock:
+                    server.requests['api'] += 1
+                server._delay(server.latency)
+                self._send(200, server.api(payload))
+
+            def do_GET(self):
+                # 和CDN一样支持条件请求
+                status, body = server.static(self.path)
+                etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16] + '"'
+                not_modified = status == 200 and self.headers.get('If-None-Match') == etag
+                with server._lock:
+                    server.requests['static'] += 1
+                    server.requests['not_modified'] += not_modified
+                server._delay(server.static_latency)
+                if not_modified:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self._send(status, body, {'ETag': etag, 'Last-Modified': LAST_MODIFIED} if status == 200 else {})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
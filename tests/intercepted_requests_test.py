@@ -0,0 +1,54 @@
+from functions import intercepted_requests
+from functions.cache import response_cache
+from functions.paginator import paginate
+from exceptions import NetworkException
+from tests.fake_server import FakeEolServer
+from unittest import mock
+import unittest
+
+
+class FaultInjectionTestCase(unittest.TestCase):
+    """替身服务器返回1069和1090时，拼出来的数据和正常时一样"""
+
+    payload = {
+        'local_batch_id': 7,
+        'local_province_id': 11,
+        'local_type_id': '1',
+        'school_id': 1101,
+        'uri': 'apidata/api/gkv3/plan/school',
+        'year': 2022
+    }
+
+    def setUp(self):
+        self.server = FakeEolServer(max_items=100).start()
+        intercepted_requests.configure_rate_control(
+            0.001, min_interval=0.001, backoff_base=0.01, backoff_max=0.05, adaptive=False
+        )
+        response_cache.configure(None)
+        self.patch = mock.patch.object(intercepted_requests, 'API_URL', self.server.api_url)
+        self.patch.start()
+        self.expected = [item['spname'] for item in self.server.items('', 1101, 11, 2022, 1, 7)]
+
+    def tearDown(self):
+        self.patch.stop()
+        self.server.stop()
+
+    def test_throttled(self):
+        self.server.throttle_probability = 0.3
+        self.assertEqual([item['spname'] for item in paginate(self.payload)], self.expected)
+        self.assertGreater(self.server.requests['throttled'], 0)
+
+    def test_oversize(self):
+        self.server.max_page_items = 7
+        self.assertEqual([item['spname'] for item in paginate(self.payload)], self.expected)
+        self.assertGreater(self.server.requests['oversize'], 0)
+
+    def test_oversize_without_size(self):
+        self.server.max_page_items = 7
+        with self.assertRaises(NetworkException):
+            intercepted_requests.intercepted_eol_request(self.payload)
+        self.assertEqual(self.server.requests['oversize'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
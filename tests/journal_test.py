@@ -0,0 +1,52 @@
+from functions.journal import Journal, TaskKey
+import os
+import tempfile
+import unittest
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'journal.tsv')
+
+    def test_reload(self):
+        journal = Journal(self.path, flush_every=2)
+        journal.record(TaskKey('enroll_plan', 1, 11, 2022, 1, 7, 1), 100)
+        journal.record(TaskKey('enroll_plan', 1), 100)
+        journal.record(TaskKey('min_score', 1, 11, 2022, 1, None, 1), 50)
+        journal.close()
+
+        journal = Journal(self.path)
+        self.assertTrue(journal.is_done(TaskKey('enroll_plan', 1, 11, 2022, 1, 7, 1)))
+        self.assertTrue(journal.is_done(TaskKey('min_score', 1, 11, 2022, 1, None, 1)))
+        self.assertFalse(journal.is_done(TaskKey('enroll_plan', 1, 11, 2022, 1, 7, 2)))
+        self.assertEqual(journal.offsets, {'enroll_plan': 100, 'min_score': 50})
+        journal.close()
+
+    def test_batched_writes(self):
+        flushed = []
+        journal = Journal(self.path, flush_every=3)
+        journal.before_flush(lambda: flushed.append(True))
+        journal.record(TaskKey('min_score', 1), 10)
+        journal.record(TaskKey('min_score', 2), 20)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        journal.record(TaskKey('min_score', 3), 30)
+        self.assertEqual(len(flushed), 1)
+        self.assertGreater(os.path.getsize(self.path), 0)
+        journal.close()
+
+    def test_partial_line_is_dropped(self):
+        journal = Journal(self.path)
+        journal.record(TaskKey('min_score', 1), 10)
+        journal.close()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('min_score\t2\t-')
+
+        journal = Journal(self.path)
+        self.assertFalse(journal.is_done(TaskKey('min_score', 2)))
+        journal.record(TaskKey('min_score', 3), 30)
+        journal.close()
+        self.assertTrue(Journal(self.path).is_done(TaskKey('min_score', 3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+from functions.journal import TaskKey
+from functions.manifest import Manifest
+from functions import intercepted_requests, static_requests
+from functions.cache import response_cache
+from tests.fake_server import FakeEolServer
+from unittest import mock
+import csv
+import os
+import tempfile
+import unittest
+import main
+
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'manifest.tsv')
+
+    def test_reload(self):
+        manifest = Manifest(self.path, final_before=2023)
+        manifest.record([
+            TaskKey('enroll_plan', 1, 11, 2022, 1, 7),
+            TaskKey('min_score', 1, 11, 2022, 2, None, 1),
+            TaskKey('min_score', 1, 11, 2023, 2)
+        ])
+        manifest.close()
+
+        manifest = Manifest(self.path, final_before=2023)
+        self.assertEqual(len(manifest), 2)
+        self.assertTrue(manifest.is_known(TaskKey('enroll_plan', 1, 11, 2022, 1, 7, 3)))
+        self.assertTrue(manifest.is_known(TaskKey('min_score', 1, 11, 2022, 2)))
+        # 当年的数据还会变，不记入清单
+        self.assertFalse(manifest.is_known(TaskKey('min_score', 1, 11, 2023, 2)))
+        self.assertFalse(manifest.is_known(TaskKey('enroll_plan', 1, 11, 2022, 1, 8)))
+        manifest.close()
+
+    def test_partial_line(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('enroll_plan\t1\t11\t2022\t1\t7\nenroll_plan\t1\t11')
+        manifest = Manifest(self.path)
+        self.assertEqual(len(manifest), 1)
+        manifest.close()
+
+
+class IncrementalCrawlTestCase(unittest.TestCase):
+    """第二次运行只爬替身服务器上新出现的年份"""
+
+    def setUp(self):
+        self.server = FakeEolServer(schools_per_province=2).start()
+        self.cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        intercepted_requests.configure_rate_control(0.001, min_interval=0.001, adaptive=False)
+        response_cache.configure(None)
+        self.patches = [
+            mock.patch.object(intercepted_requests, 'API_URL', self.server.api_url),
+            mock.patch.object(static_requests, 'STATIC_URL', self.server.static_url)
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        os.chdir(self.cwd)
+        self.server.stop()
+
+    def crawl(self, run_id: str) -> dict[str, int]:
+        univ_list = main.get_univ_list('北京')
+        main.crawl(univ_list, main.load_dictionary(), main.enabled_datasets(), run_id, generate_xlsx=False, incremental=True)
+        counts = {}
+        for dataset in main.enabled_datasets():
+            with open(f'{dataset}_{run_id}.csv', encoding='utf-8-sig') as f:
+                counts[dataset] = len(list(csv.DictReader(f)))
+        return counts
+
+    def test_only_new_years(self):
+        server = self.server
+        full = self.crawl('first')
+        self.assertEqual(full['min_score'], 2 * 2 * 2 * 2)
+
+        server.requests['api'] = 0
+        self.assertEqual(self.crawl('second'), {'min_score': 0, 'enroll_plan': 0, 'major_score': 0})
+        # 只剩请求大学列表
+        self.assertEqual(server.requests['api'], 1)
+
+        server.years = (2021, 2022, 2023)
+        new = self.crawl('third')
+        self.assertEqual(new['min_score'], 2 * 2 * 2)
+        expected = sum(
+            server.item_count(univ['school_id'], 2023, t, b)
+            for univ in server.schools(11) for _ in server.target_provinces
+            for t in server.types for b in server.batches
+        )
+        self.assertEqual(new['enroll_plan'], expected)
+        self.assertEqual(new['major_score'], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
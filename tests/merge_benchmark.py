@@ -0,0 +1,91 @@
+"""merge.py的--jobs性能测试：合并多个合成的省份XLSX，报告不同进程数下的用时、加速比和峰值内存
+
+在仓库根目录下运行，不会被pytest收集：
+
+    python -m tests.merge_benchmark --files 8 --rows 20000 --jobs 1 --jobs 2 --jobs 4
+
+每次合并都在新的子进程里进行，峰值内存是这次合并的各个进程（包括工作进程）中最大的一个。
+
+目前只在单核机器上跑过（4个文件各4万行，--jobs 1/2/4分别用时51.7s/52.3s/51.3s），只能说明多进程的交接
+没有额外开销，多核机器上--jobs能快多少还没有测过。
+"""
+
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import click
+from functions.datasets import DATASETS
+from functions.rows import make_record
+from functions.sinks import XlsxWorkbookSink
+from type import EnrollPlan, MiniumScoreForMajors
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_province(path: str, province: str, rows: int):
+    """一个省份的输出：各专业招生计划和分专业录取分数线各rows行"""
+    book = XlsxWorkbookSink(path)
+    enroll = book.add_sheet(DATASETS['enroll_plan'].sheet_name, DATASETS['enroll_plan'].header)
+    enroll.write_rows(
+        make_record(
+            EnrollPlan,
+            code=f'{10000 + i // 50}', name=f'测试大学{i // 50}', located_province=province, target_province='河南',
+            year=2020 + i % 3, major='理科', enroll_level='本科批', major_name=f'专业{i % 50}', planned_number=i % 7,
+            duration='四年', tuition='5000', major_group=None, subject_requirements=None
+        ) for i in range(rows)
+    )
+    major = book.add_sheet(DATASETS['major_score'].sheet_name, DATASETS['major_score'].header)
+    major.write_rows(
+        make_record(
+            MiniumScoreForMajors,
+            code=f'{10000 + i // 50}', name=f'测试大学{i // 50}', located_province=province, target_province='河南',
+            year=2020 + i % 3, major='理科', major_name=f'专业{i % 50}', enroll_level='本科批', avg_score=f'{600 - i % 100}',
+            minium_score=590 - i % 100, minium_rank=1000 + i, major_group=None, subject_requirements=None
+        ) for i in range(rows)
+    )
+    book.close()
+
+
+def run_merge(workdir: str, files: list[str], jobs: int) -> tuple[float, int]:
+    """在子进程里合并一次，返回用时（秒）和峰值内存（MB）"""
+    args = [sys.executable, os.path.join(REPO, 'merge.py'), '--jobs', str(jobs)]
+    for file in files:
+        args += ['-x', file]
+    start = time.perf_counter()
+    subprocess.run(args, cwd=workdir, check=True, stdout=subprocess.DEVNULL, env={**os.environ, 'PYTHONPATH': REPO})
+    wall = time.perf_counter() - start
+    return wall, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024
+
+
+def measure(workdir: str, files: list[str], jobs: int) -> tuple[float, int]:
+    """ru_maxrss对已结束的子进程取的是历来的最大值，所以每次合并都隔着一个新的子进程测量"""
+    with multiprocessing.Pool(1) as pool:
+        return pool.apply(run_merge, (workdir, files, jobs))
+
+
+@click.command('merge_benchmark', help='比较merge.py在不同--jobs下合并多个XLSX的用时')
+@click.option('--files', type=int, default=8, show_default=True, help='输入的XLSX文件数，每个文件是一个省份')
+@click.option('--rows', type=int, default=20000, show_default=True, help='每个文件每张表的行数')
+@click.option('--jobs', '-j', 'jobs_list', type=int, multiple=True, default=(1, 2, 4), show_default=True, help='要比较的进程数，可重复使用')
+def main(files: int, rows: int, jobs_list: tuple[int, ...]):
+    with tempfile.TemporaryDirectory(prefix='merge_benchmark_') as workdir:
+        paths = []
+        for i in range(files):
+            path = os.path.join(workdir, f'{i}.xlsx')
+            write_province(path, f'省份{i}', rows)
+            paths.append(path)
+        click.echo(f'{len(paths)}个文件，每个{rows * 2}行，CPU核数{os.cpu_count()}')
+
+        baseline = None
+        for jobs in jobs_list:
+            wall, rss = measure(workdir, paths, jobs)
+            baseline = baseline or wall
+            click.echo(f'--jobs {jobs}：{wall:.1f}秒，加速比{baseline / wall:.2f}，峰值内存{rss}MB')
+
+
+if __name__ == '__main__':
+    main()
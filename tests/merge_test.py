@@ -0,0 +1,117 @@
+from click.testing import CliRunner
+from functions.rows import make_record
+from functions.sinks import CsvSink, iter_csv_rows
+from functions.xlsx_export import SheetSource, export_xlsx
+from type import EnrollPlan
+from unittest import mock
+import glob
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import unittest
+import merge
+
+
+def enroll_row(code: str, year: int, major_name: str):
+    return make_record(
+        EnrollPlan,
+        code=code, name=f'测试大学{code}', located_province='北京', target_province='河南', year=year,
+        major='理科', enroll_level='本科批', major_name=major_name, planned_number=3,
+        duration='四年', tuition='5000', major_group=None, subject_requirements=None
+    )
+
+
+class MergeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        self.first = [enroll_row('10002', 2022, f'专业{i}') for i in range(5)]
+        self.second = [enroll_row('10001', 2021 + i % 2, f'专业{i}') for i in range(7)]
+        self.write_csv('first.csv', self.first)
+        self.write_csv('second.csv', self.second)
+        export_xlsx([SheetSource('各专业招生计划', ['学校代码'], 'second.csv', EnrollPlan)], 'second.xlsx')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def write_csv(self, path: str, rows: list):
+        sink = CsvSink(path, EnrollPlan)
+        sink.write_rows(rows)
+        sink.close()
+
+    def run_merge(self, *args: str) -> list:
+        result = CliRunner().invoke(merge.merge, list(args))
+        self.assertEqual(result.exit_code, 0, result.output)
+        [path] = glob.glob('enroll_output_*.csv')
+        rows = list(iter_csv_rows(path, EnrollPlan))
+        os.remove(path)
+        return rows
+
+    def test_concat(self):
+        self.assertEqual(self.run_merge('-c', 'first.csv', '-x', 'second.xlsx'), self.first + self.second)
+        self.assertFalse(glob.glob('province_output_*.csv'))
+
+    def test_external_sort(self):
+        rows = self.run_merge('-c', 'first.csv', '-c', 'second.csv', '--sort', '--sort-buffer', '2')
+        expected = sorted(self.first + self.second, key=lambda row: (row.code, row.year, row.major_name))
+        self.assertEqual(rows, expected)
+
+    def test_jobs(self):
+        export_xlsx([SheetSource('各专业招生计划', ['学校代码'], 'first.csv', EnrollPlan)], 'first.xlsx')
+        args = ['-x', 'first.xlsx', '-c', 'second.csv', '-x', 'second.xlsx', '-c', 'first.csv']
+        expected = self.run_merge(*args)
+        self.assertEqual(expected, self.second + self.first + self.first + self.second)
+        with mock.patch.object(merge, 'PARSE_BATCH_ROWS', 2):
+            self.assertEqual(self.run_merge(*args, '--jobs', '3'), expected)
+
+    def test_sqlite(self):
+        rerun = [row._replace(planned_number=5) for row in self.first[:3]]
+        self.write_csv('rerun.csv', rerun)
+        result = CliRunner().invoke(merge.merge, ['-c', 'first.csv', '-x', 'second.xlsx', '-c', 'rerun.csv', '-t', 'sqlite'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        [path] = glob.glob('output_*.sqlite3')
+        conn = sqlite3.connect(path)
+        rows = [enroll_row(*values[:3])._replace(planned_number=values[3]) for values in conn.execute(
+            'SELECT code, year, major_name, planned_number FROM enroll_plan ORDER BY rowid'
+        )]
+        conn.close()
+        self.assertEqual(rows, rerun + self.first[3:] + self.second)
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), '没有安装pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+        result = CliRunner().invoke(merge.merge, ['-c', 'first.csv', '-x', 'second.xlsx', '-t', 'parquet'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        [path] = glob.glob('enroll_output_*.parquet')
+        rows = pq.read_table(path).to_pylist()
+
+        def key(row):
+            return row['code'], row['year'], row['major_name']
+
+        self.assertEqual(sorted(rows, key=key), sorted((row._asdict() for row in self.first + self.second), key=key))
+
+    def test_dedup_newest(self):
+        # 后一次运行重新爬取了第一次的部分数据，计划人数变了，专业组也补上了
+        rerun = [row._replace(planned_number=5) for row in self.first[:3]]
+        rerun[0] = rerun[0]._replace(duration=None)
+        self.write_csv('rerun.csv', rerun)
+        os.utime('first.csv', (1, 1))
+        rows = self.run_merge('-c', 'rerun.csv', '-c', 'first.csv', '--dedup')
+        self.assertEqual(rows, rerun + self.first[3:])
+        rows = self.run_merge('-c', 'rerun.csv', '-c', 'first.csv', '--dedup', '--dedup-policy', 'newest-non-null')
+        self.assertEqual(rows, [rerun[0]._replace(duration='四年')] + rerun[1:] + self.first[3:])
+        rows = self.run_merge('-c', 'rerun.csv', '-c', 'first.csv', '--dedup', '--dedup-policy', 'first')
+        self.assertEqual(rows, rerun + self.first[3:])
+
+    def test_dedup_across_formats(self):
+        result = CliRunner().invoke(merge.merge, ['-c', 'second.csv', '-x', 'second.xlsx', '-c', 'first.csv', '--dedup'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('各专业招生计划：读入19行，去掉7行重复', result.output)
+        [path] = glob.glob('enroll_output_*.csv')
+        self.assertEqual(list(iter_csv_rows(path, EnrollPlan)), self.second + self.first)
+
+
+if __name__ == '__main__':
+    unittest.main()
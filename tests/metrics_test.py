@@ -0,0 +1,103 @@
+from functions import intercepted_requests, metrics
+from functions.cache import response_cache
+from functions.metrics import MetricsExporter, Registry
+from functions.page_size import PageSizeManager
+from functions.paginator import iter_pages
+from tests.fake_server import FakeEolServer
+from unittest import mock
+import json
+import os
+import tempfile
+import unittest
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        counter = self.registry.counter('requests_total', '请求数', ('uri', 'code'))
+        counter.inc(uri='a', code='0000')
+        counter.inc(2, uri='a', code='0000')
+        counter.inc(uri='a', code='1069')
+        gauge = self.registry.gauge('queue_depth', '排队数')
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        text = self.registry.render()
+        self.assertIn('# TYPE requests_total counter\n', text)
+        self.assertIn('requests_total{uri="a",code="0000"} 3\n', text)
+        self.assertIn('requests_total{uri="a",code="1069"} 1\n', text)
+        self.assertIn('queue_depth 1\n', text)
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('latency_seconds', '耗时', ('uri',), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, uri='a')
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{uri="a",le="0.1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{uri="a",le="1"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{uri="a",le="+Inf"} 4\n', text)
+        self.assertIn('latency_seconds_count{uri="a"} 4\n', text)
+        self.assertIn('latency_seconds_sum{uri="a"} 3.65\n', text)
+
+    def test_label_escaping(self):
+        self.registry.counter('c', 'c', ('v',)).inc(v='a"b\n')
+        self.assertIn('c{v="a\\"b\\n"} 1\n', self.registry.render())
+
+    def test_exporter(self):
+        directory = tempfile.mkdtemp()
+        self.registry.histogram('latency_seconds', '耗时').observe(1)
+        exporter = MetricsExporter(os.path.join(directory, 'metrics.prom'), 0, self.registry)
+        exporter.finish(os.path.join(directory, 'metrics.json'))
+        with open(os.path.join(directory, 'metrics.prom'), encoding='utf-8') as f:
+            self.assertIn('latency_seconds_count 1\n', f.read())
+        with open(os.path.join(directory, 'metrics.json'), encoding='utf-8') as f:
+            summary = json.load(f)
+        self.assertEqual(summary['metrics']['latency_seconds']['samples'][0]['mean'], 1)
+        self.assertFalse(os.path.exists(os.path.join(directory, 'metrics.prom.tmp')))
+
+
+class EolMetricsTestCase(unittest.TestCase):
+    """api.eol.cn的请求数和耗时按数据集分开统计"""
+
+    def setUp(self):
+        self.server = FakeEolServer(max_items=30).start()
+        intercepted_requests.configure_rate_control(0.001, min_interval=0.001, adaptive=False)
+        response_cache.configure(None)
+        # 别的测试学到的每页条数会让一页拆成几个请求
+        self.patches = [
+            mock.patch.object(intercepted_requests, 'API_URL', self.server.api_url),
+            mock.patch.object(intercepted_requests, 'page_sizes', PageSizeManager())
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.server.stop()
+
+    def count(self, metric, dataset: str) -> float:
+        return sum(value for labels, value in metric.samples() if labels['dataset'] == dataset)
+
+    def test_dataset_label(self):
+        payload = {
+            'local_batch_id': 7,
+            'local_province_id': 11,
+            'local_type_id': '1',
+            'school_id': 1101,
+            'uri': 'apidata/api/gkv3/plan/school',
+            'year': 2022
+        }
+        before = self.count(metrics.eol_requests, 'enroll_plan')
+        pages = list(iter_pages({**payload, 'size': 10}, dataset='enroll_plan'))
+        self.assertEqual(self.count(metrics.eol_requests, 'enroll_plan') - before, len(pages))
+        latency = [s for s in metrics.eol_request_seconds.summary() if s['labels']['dataset'] == 'enroll_plan']
+        self.assertTrue(latency)
+        self.assertEqual(latency[0]['labels']['uri'], payload['uri'])
+        self.assertIn('dataset="enroll_plan"', metrics.registry.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+from functions.page_size import PageSizeManager
+import unittest
+
+URI = 'apidata/api/gk/score/special'
+
+
+class PageSizeManagerTestCase(unittest.TestCase):
+    def test_learn_from_oversize(self):
+        manager = PageSizeManager()
+        self.assertEqual(manager.size_for(URI, 1, 30), 30)
+        manager.on_oversize(URI, 1, 30)
+        self.assertEqual(manager.size_for(URI, 1, 30), 10)
+        manager.on_success(URI, 1, 10)
+        self.assertEqual(manager.size_for(URI, 1, 30), 10)
+        # 别的学校不受影响
+        self.assertEqual(manager.size_for(URI, 2, 30), 30)
+
+    def test_probe_upward(self):
+        manager = PageSizeManager(probe_after=2)
+        manager.on_oversize(URI, 1, 30)
+        for _ in range(3):
+            manager.on_success(URI, 1, 10)
+        self.assertEqual(manager.size_for(URI, 1, 30), 20)
+        manager.on_oversize(URI, 1, 20)
+        self.assertEqual(manager.size_for(URI, 1, 30), 10)
+        manager.on_success(URI, 1, 15)
+        self.assertEqual(manager.size_for(URI, 1, 30), 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+from functions import paginator
+from unittest import mock
+import concurrent.futures
+import unittest
+
+ITEMS = list(range(70))
+
+
+def fake_request(payload, dataset=''):
+    start = (payload['page'] - 1) * payload['size']
+    return {'item': ITEMS[start:start + payload['size']], 'numFound': len(ITEMS)}
+
+
+def fake_submit(payload, dataset=''):
+    future = concurrent.futures.Future()
+    future.set_result(fake_request(payload))
+    return future
+
+
+@mock.patch.object(paginator, 'submit_eol_request', side_effect=fake_submit)
+@mock.patch.object(paginator, 'intercepted_eol_request', side_effect=fake_request)
+class PaginatorTestCase(unittest.TestCase):
+    payload = {'uri': 'apidata/api/gk/score/special'}
+
+    def test_first_page_is_fetched_once(self, request, submit):
+        self.assertEqual(list(paginator.paginate(self.payload)), ITEMS)
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual([c.args[0]['page'] for c in submit.call_args_list], [2, 3])
+
+    def test_single_page(self, request, submit):
+        self.assertEqual(list(paginator.paginate({**self.payload, 'size': 100})), ITEMS)
+        self.assertEqual(submit.call_count, 0)
+
+    def test_page_range_and_skip(self, request, submit):
+        pages = paginator.iter_pages({**self.payload, 'size': 10}, 2, 5, skip=lambda page: page == 3)
+        self.assertEqual([page for page, _ in pages], [2, 4, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
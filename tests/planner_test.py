@@ -0,0 +1,110 @@
+from functions import intercepted_requests, static_requests
+from functions.cache import response_cache
+from functions.page_size import PageSizeManager
+from functions.planner import CrawlPlan, ProgressTracker, format_duration
+from tests.fake_server import FakeEolServer
+from unittest import mock
+import os
+import tempfile
+import unittest
+import main
+
+
+class ProgressTrackerTestCase(unittest.TestCase):
+    def test_extrapolate(self):
+        plan = CrawlPlan()
+        plan.add_dataset('enroll_plan', '招生计划', api=True).combos = 10
+        plan.datasets['enroll_plan'].pages = 10
+        plan.add_dataset('min_score', '分数线', api=False).pages = 5
+        tracker = ProgressTracker(plan, lambda: 0.5, interval=0)
+        self.assertEqual(tracker.api_total(), 10)
+        # 开始的两个组合各有三页，剩下的八个组合按同样的比例推算
+        for _ in range(2):
+            tracker.combo_started('enroll_plan')
+        for _ in range(6):
+            tracker.page_done('enroll_plan')
+        tracker.page_done('min_score')
+        self.assertEqual(tracker.api_total(), 30)
+        self.assertEqual(tracker.eta(), 48)
+        self.assertIn('预计还需0:00:48', tracker.describe())
+
+    def test_same_name_schools(self):
+        plan = CrawlPlan()
+        plan.add_dataset('enroll_plan', '招生计划', api=True)
+        plan.add_school_requests({'school_id': 1, 'name': '同名大学'}, 3)
+        plan.add_school_requests({'school_id': 2, 'name': '同名大学'}, 2)
+        self.assertIn('同名大学（3次），同名大学（2次）', plan.report(1, 8)[-1])
+
+    def test_plan_later(self):
+        tracker = ProgressTracker(None, lambda: 0.5, interval=0)
+        tracker.combo_started('enroll_plan')
+        tracker.page_done('enroll_plan')
+        self.assertEqual(tracker.describe(), '正在统计请求数')
+        plan = CrawlPlan()
+        plan.add_dataset('enroll_plan', '招生计划', api=True).pages = 3
+        tracker.set_plan(plan)
+        self.assertIn('api.eol.cn请求1/约3次', tracker.describe())
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(90061.5), '25:01:01')
+
+
+class PlanCrawlTestCase(unittest.TestCase):
+    """精确计划里的请求数和实际爬取时发出的一样"""
+
+    def setUp(self):
+        self.server = FakeEolServer(schools_per_province=2).start()
+        self.cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        intercepted_requests.configure_rate_control(0.001, min_interval=0.001, adaptive=False)
+        response_cache.configure(None)
+        self.patches = [
+            mock.patch.object(intercepted_requests, 'API_URL', self.server.api_url),
+            mock.patch.object(static_requests, 'STATIC_URL', self.server.static_url),
+            mock.patch.object(main, 'MANIFEST_FILE', None),
+            # 别的测试里学到的拆页会让请求数对不上
+            mock.patch.object(intercepted_requests, 'page_sizes', PageSizeManager())
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.server.stop()
+        os.chdir(self.cwd)
+
+    def test_exact(self):
+        univ_list = main.get_univ_list('北京')
+        datasets = main.enabled_datasets()
+        rough = main.plan_crawl(univ_list, datasets)
+        self.assertFalse(rough.exact)
+
+        before = self.server.requests['api']
+        plan = main.plan_crawl(univ_list, datasets, exact=True)
+        self.assertTrue(plan.exact)
+        self.assertEqual(self.server.requests['api'] - before, rough.api_requests)
+        self.assertEqual(plan.datasets['min_score'].pages, rough.datasets['min_score'].pages)
+        self.assertGreater(plan.api_requests, rough.api_requests)
+
+        before = self.server.requests['api']
+        main.crawl(univ_list, main.load_dictionary(), datasets, 'planned', generate_xlsx=False)
+        self.assertEqual(self.server.requests['api'] - before, plan.api_requests)
+
+
+    def test_metadata_fetched_once(self):
+        univ_list = main.get_univ_list('北京')
+        datasets = main.enabled_datasets()
+        dictionary = main.load_dictionary()
+        counts = []
+        for interval in (0, 60):
+            with mock.patch.object(main, 'PROGRESS_INTERVAL', interval):
+                before = self.server.requests['static']
+                main.crawl(univ_list, dictionary, datasets, f'progress_{interval}', generate_xlsx=False)
+                counts.append(self.server.requests['static'] - before)
+        # 统计请求数时拿到的元数据留给爬取用；第一所高校可能在统计拿到之前就被爬取，最多多下载一次
+        self.assertLessEqual(counts[1] - counts[0], len(datasets))
+
+
+if __name__ == '__main__':
+    unittest.main()
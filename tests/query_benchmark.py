@@ -0,0 +1,92 @@
+"""functions/admission_index.py的微基准：打开索引、单次查询和批量查询的用时，对比逐行扫描和numpy布尔掩码扫描
+
+数据是合成的分专业录取分数线，在仓库根目录下运行，不会被pytest收集：
+
+    python -m tests.query_benchmark --rows 1000000 --queries 10000
+"""
+
+import os
+import random
+import tempfile
+import time
+from typing import Callable
+import click
+import numpy as np
+from functions.admission_index import AdmissionIndex, build_index
+from functions.rows import make_record
+from functions.sinks import CsvSink, iter_csv_rows
+from type import MiniumScoreForMajors
+
+PROVINCES = [f'省份{i}' for i in range(31)]
+YEARS = [2020, 2021, 2022, 2023]
+MAJORS = ['物理类', '历史类']
+
+
+def write_csv(path: str, rows: int):
+    rng = random.Random(0)
+    sink = CsvSink(path, MiniumScoreForMajors)
+    sink.write_rows(
+        make_record(
+            MiniumScoreForMajors,
+            code=f'{10000 + i % 3000}', name=f'测试大学{i % 3000}', located_province='北京',
+            target_province=rng.choice(PROVINCES), year=rng.choice(YEARS), major=rng.choice(MAJORS),
+            major_name=f'专业{i % 700}', enroll_level='本科批', avg_score='600',
+            minium_score=rng.randrange(400, 700), minium_rank=rng.randrange(1, 300000),
+            major_group=None, subject_requirements=None
+        ) for i in range(rows)
+    )
+    sink.close()
+
+
+def timed(f: Callable[[], object], repeat: int = 1) -> float:
+    """每次调用的平均用时，单位为秒"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat
+
+
+@click.command('query_benchmark', help='比较索引查询和扫描的用时')
+@click.option('--rows', type=int, default=1000000, show_default=True, help='合成数据的行数')
+@click.option('--queries', type=int, default=10000, show_default=True, help='批量查询的条数')
+def main(rows: int, queries: int):
+    rng = random.Random(1)
+    batch = [(rng.choice(PROVINCES), rng.choice(YEARS), rng.choice(MAJORS), rng.randrange(1, 300000)) for _ in range(queries)]
+    province, year, major, rank = batch[0]
+
+    with tempfile.TemporaryDirectory(prefix='query_benchmark_') as workdir:
+        path = os.path.join(workdir, 'major_score.csv')
+        write_csv(path, rows)
+        directory = os.path.join(workdir, 'index')
+        click.echo(f'生成索引（{rows}行）：{timed(lambda: build_index({"major_score": [path]}, directory)):.2f}秒')
+        click.echo(f'打开索引：{timed(lambda: AdmissionIndex(directory), 100) * 1000:.2f}毫秒')
+        index = AdmissionIndex(directory)
+
+        # 以前的做法：读进全部行，每次查询扫描一遍
+        loaded = list(iter_csv_rows(path, MiniumScoreForMajors))
+        scan = timed(lambda: [
+            row for row in loaded
+            if row.target_province == province and row.year == year and row.major == major and row.minium_rank >= rank
+        ], 3)
+        # 相当于pandas的布尔索引
+        columns = {k: np.array([getattr(row, k) for row in loaded]) for k in ('target_province', 'year', 'major', 'minium_rank')}
+        del loaded
+        mask = timed(lambda: np.flatnonzero(
+            (columns['target_province'] == province) & (columns['year'] == year)
+            & (columns['major'] == major) & (columns['minium_rank'] >= rank)
+        ), 10)
+        single = timed(lambda: index.by_rank('major_score', province, year, major, rank), 1000)
+        click.echo(f'单次查询：逐行扫描{scan * 1000:.1f}毫秒，布尔掩码{mask * 1000:.1f}毫秒，索引{single * 1e6:.1f}微秒')
+
+        provinces, years, majors, ranks = zip(*batch)
+
+        def run_batch():
+            groups = index.group_ids('major_score', provinces, years, majors)
+            return index.rank_ranges('major_score', groups, ranks)
+
+        total = timed(run_batch, 10)
+        click.echo(f'批量查询{queries}条：共{total * 1000:.1f}毫秒，平均每条{total / queries * 1e6:.2f}微秒')
+
+
+if __name__ == '__main__':
+    main()
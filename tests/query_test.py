@@ -0,0 +1,80 @@
+from click.testing import CliRunner
+from functions.admission_index import AdmissionIndex, build_index
+from functions.rows import make_record
+from functions.sinks import CsvSink
+from type import MiniumScoreForMajors
+import numpy as np
+import os
+import random
+import tempfile
+import unittest
+import query
+
+
+class AdmissionIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = random.Random(1)
+        self.rows = [
+            make_record(
+                MiniumScoreForMajors,
+                code=f'{10000 + i % 7}', name=f'测试大学{i % 7}', located_province='北京',
+                target_province=rng.choice(['河南', '河北']), year=rng.choice([2021, 2022]), major=rng.choice(['理科', '文科']),
+                major_name=f'专业{i}', enroll_level='本科批', avg_score='600',
+                minium_score=rng.randrange(450, 650), minium_rank=rng.choice([rng.randrange(1, 50000), '-']),
+                major_group=None, subject_requirements=None
+            ) for i in range(500)
+        ]
+        path = os.path.join(self.tmpdir, 'major_score.csv')
+        sink = CsvSink(path, MiniumScoreForMajors)
+        sink.write_rows(self.rows)
+        sink.close()
+        self.index_dir = os.path.join(self.tmpdir, 'index')
+        build_index({'major_score': [path]}, self.index_dir)
+        self.index = AdmissionIndex(self.index_dir)
+
+    def expected(self, province: str, year: int, major: str) -> list:
+        return [
+            row for row in self.rows
+            if (row.target_province, row.year, row.major) == (province, year, major)
+        ]
+
+    def test_by_rank_and_score(self):
+        for province, year, major, rank, score in [('河南', 2022, '理科', 20000, 560), ('河北', 2021, '文科', 1, 650), ('河南', 2022, '理科', 99999, 449)]:
+            group = self.expected(province, year, major)
+            records = self.index.records('major_score', self.index.by_rank('major_score', province, year, major, rank))
+            self.assertEqual(
+                [r['major_name'] for r in records],
+                [row.major_name for row in sorted(
+                    (row for row in group if row.minium_rank != '-' and row.minium_rank >= rank), key=lambda row: row.minium_rank
+                )]
+            )
+            records = self.index.records('major_score', self.index.by_score('major_score', province, year, major, score))
+            self.assertEqual(sorted(r['major_name'] for r in records), sorted(row.major_name for row in group if row.minium_score <= score))
+            self.assertEqual([r['minium_score'] for r in records], sorted((r['minium_score'] for r in records), reverse=True))
+        self.assertEqual(len(self.index.by_rank('major_score', '西藏', 2022, '理科', 1)), 0)
+
+    def test_batch(self):
+        rng = random.Random(2)
+        queries = [(rng.choice(['河南', '河北', '西藏']), rng.choice([2020, 2021, 2022]), rng.choice(['理科', '文科']), rng.randrange(1, 50000)) for _ in range(200)]
+        provinces, years, majors, ranks = zip(*queries)
+        lo, hi = self.index.rank_ranges('major_score', self.index.group_ids('major_score', provinces, years, majors), ranks)
+        expected = [
+            sum(1 for row in self.expected(p, y, m) if row.minium_rank != '-' and row.minium_rank >= r)
+            for p, y, m, r in queries
+        ]
+        self.assertEqual((hi - lo).tolist(), expected)
+
+        path = os.path.join(self.tmpdir, 'queries.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(f'{p},{y},{m},{r}\n' for p, y, m, r in queries)
+        result = CliRunner().invoke(query.cli, ['batch', path, '-i', self.index_dir])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual([int(line.rsplit(',', 1)[1]) for line in result.output.splitlines()], expected)
+
+    def test_memory_mapped(self):
+        self.assertIsInstance(self.index.sorted_rows('major_score', 'minium_rank'), np.memmap)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+from functions.rate_limiter import TokenBucket
+from functions.rate_control import AimdController
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_acquire_at_rate(self):
+        async def run():
+            bucket = TokenBucket(20)
+            start = time.monotonic()
+            for _ in range(5):
+                await bucket.acquire()
+            return time.monotonic() - start
+
+        # 第一个令牌是现成的，后面四个各需要等0.05秒
+        elapsed = asyncio.run(run())
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertLess(elapsed, 0.5)
+
+    def test_pause(self):
+        async def run():
+            bucket = TokenBucket(100)
+            await bucket.acquire()
+            bucket.pause(0.2)
+            start = time.monotonic()
+            await bucket.acquire()
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.2)
+
+
+class AimdControllerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.state_file = os.path.join(tempfile.mkdtemp(), 'rate_state.json')
+
+    def test_increase_and_decrease(self):
+        controller = AimdController(10, increase=0.01, state_file=self.state_file)
+        for _ in range(10):
+            controller.on_success()
+        self.assertAlmostEqual(controller.rate, 0.2)
+        backoff = controller.on_throttle()
+        self.assertAlmostEqual(controller.rate, 0.1)
+        self.assertTrue(15 <= backoff <= 30)
+        self.assertEqual(len(controller.history), 1)
+
+    def test_concurrent_throttles(self):
+        controller = AimdController(10, increase=0.01, state_file=self.state_file)
+        for _ in range(10):
+            controller.on_success()
+        # 降速前一起发出去的请求陆续返回1069，只算一次拥塞
+        sent_at = time.monotonic()
+        backoff = controller.on_throttle(sent_at)
+        for _ in range(5):
+            self.assertLessEqual(controller.on_throttle(sent_at), backoff)
+        self.assertAlmostEqual(controller.rate, 0.1)
+        self.assertEqual(len(controller.history), 1)
+        # 降速之后发出的请求又被限速，才是新的一次
+        controller.on_throttle(time.monotonic())
+        self.assertAlmostEqual(controller.rate, 0.05)
+        self.assertEqual(len(controller.history), 2)
+
+    def test_persist_learned_rate(self):
+        controller = AimdController(10, min_interval=4, increase=1, state_file=self.state_file)
+        controller.on_success()
+        self.assertAlmostEqual(controller.rate, 0.25)
+        # 加速后的速率还没有得到过0000响应，不能保存
+        controller.save()
+        self.assertAlmostEqual(
+            AimdController(10, min_interval=4, state_file=self.state_file).rate, 0.1
+        )
+        controller.on_success()
+        controller.save()
+        self.assertAlmostEqual(
+            AimdController(10, min_interval=4, state_file=self.state_file).rate, 0.25
+        )
+
+    def test_persist_rate_after_throttle(self):
+        controller = AimdController(10, increase=0.1, state_file=self.state_file)
+        for _ in range(3):
+            controller.on_success()
+        controller.on_throttle()
+        self.assertAlmostEqual(controller.rate, 0.2)
+        self.assertAlmostEqual(
+            AimdController(10, state_file=self.state_file).rate, 0.2
+        )
+
+    def test_fixed_rate(self):
+        controller = AimdController(10, adaptive=False, state_file=self.state_file)
+        controller.on_success()
+        controller.on_throttle()
+        self.assertAlmostEqual(controller.rate, 0.1)
+        self.assertFalse(os.path.exists(self.state_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""行在内存里的占用：dict对比functions/rows.py中驻留了字符串的NamedTuple
+
+数据来自本地替身服务器的合成数据，不发出网络请求，在仓库根目录下运行，不会被pytest收集：
+
+    python -m tests.row_memory --schools 100
+"""
+
+import csv
+import io
+import json
+import tracemalloc
+from typing import Callable
+import click
+from functions.rows import make_record, slim_univ, to_record
+from tests.fake_server import DICTIONARY, PROVINCES, FakeEolServer
+from type import MiniumScoreForMajors
+
+
+def measure(build: Callable[[], object]) -> tuple[float, object]:
+    """build()返回的对象还活着时新占用的内存，单位为MB"""
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / 1024 / 1024, result
+
+
+def iter_pages(server: FakeEolServer):
+    """逐页返回(高校, 省份ID, 年份, 科类, 解析后的items)，和爬虫拿到的一样每页都是新解析的JSON"""
+    for prov_id in PROVINCES:
+        for univ in server.schools(prov_id):
+            for target in server.target_provinces:
+                for year in server.years:
+                    for type_id in server.types:
+                        for batch_id in server.batches:
+                            items = server.items('', univ['school_id'], target, year, type_id, batch_id)
+                            yield univ, target, year, type_id, json.loads(json.dumps(items, ensure_ascii=False))
+
+
+def as_dict(univ: dict, target: int, year: int, type_id: int, item: dict) -> dict:
+    return {
+        'code': univ['code_enroll'][:5],
+        'name': univ['name'],
+        'located_province': univ['province_name'],
+        'target_province': PROVINCES[target],
+        'year': year,
+        'major': DICTIONARY[str(type_id)],
+        'major_name': item['spname'],
+        'enroll_level': item['local_batch_name'],
+        'avg_score': item['average'],
+        'minium_score': item['min'],
+        'minium_rank': item['min_section'],
+        'major_group': item['sg_name'] or None,
+        'subject_requirements': item['sg_info'] or None
+    }
+
+
+def crawl_rows(server: FakeEolServer, compact: bool) -> list:
+    rows = []
+    for univ, target, year, type_id, items in iter_pages(server):
+        for item in items:
+            row = as_dict(univ, target, year, type_id, item)
+            rows.append(make_record(MiniumScoreForMajors, **row) if compact else row)
+    return rows
+
+
+def csv_rows(text: str, compact: bool) -> list:
+    """merge.py读CSV的两种方式"""
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader)
+    if compact:
+        return [to_record(MiniumScoreForMajors, row) for row in reader]
+    return [dict(zip(header, row)) for row in reader]
+
+
+@click.command('row_memory', help='比较dict和紧凑行记录在内存里的占用')
+@click.option('--schools', type=int, default=100, show_default=True, help='每个省份的高校数')
+@click.option('--max-items', type=int, default=120, show_default=True, help='每个批次最多的专业数')
+def main(schools: int, max_items: int):
+    server = FakeEolServer(schools_per_province=schools, target_provinces=(11, 12, 41), years=(2020, 2021, 2022), max_items=max_items)
+
+    univs = [server.school(prov_id, i) for prov_id in PROVINCES for i in range(1, schools + 1)]
+    full, _ = measure(lambda: json.loads(json.dumps(univs, ensure_ascii=False)))
+    slim, _ = measure(lambda: [slim_univ(univ) for univ in json.loads(json.dumps(univs, ensure_ascii=False))])
+    click.echo(f'高校列表（{len(univs)}所）：完整{full:.2f}MB，投影后{slim:.2f}MB')
+
+    before, rows = measure(lambda: crawl_rows(server, compact=False))
+    after, _ = measure(lambda: crawl_rows(server, compact=True))
+    click.echo(f'爬取的专业分数线（{len(rows)}行）：dict {before:.1f}MB，紧凑行{after:.1f}MB')
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MiniumScoreForMajors.__annotations__.keys())
+    writer.writerows(row.values() for row in rows)  # type: ignore
+    text = buffer.getvalue()
+    del rows, buffer
+    before, _ = measure(lambda: csv_rows(text, compact=False))
+    after, _ = measure(lambda: csv_rows(text, compact=True))
+    click.echo(f'merge.py读入同样的CSV：dict {before:.1f}MB，紧凑行{after:.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+from functions.rows import make_record, record_type, slim_univ, to_record
+from functions.sinks import CsvSink, iter_csv_rows
+from type import EnrollPlan
+import os
+import sys
+import tempfile
+import unittest
+
+
+class RowsTestCase(unittest.TestCase):
+    fields = {
+        'code': '10459', 'name': '郑州大学', 'located_province': '河南',
+        'target_province': '北京', 'year': 2022, 'major': '综合',
+        'enroll_level': '本科批', 'major_name': '临床医学', 'planned_number': 3,
+        'duration': '五年', 'tuition': '6000', 'major_group': None,
+        'subject_requirements': None
+    }
+
+    def test_record(self):
+        row = make_record(EnrollPlan, **self.fields)
+        self.assertIsInstance(row, record_type(EnrollPlan))
+        self.assertEqual(row._asdict(), self.fields)
+        self.assertEqual(row.major_name, '临床医学')
+        # 分别解析出来的同样的字符串只留一份
+        other = to_record(EnrollPlan, (''.join(['郑州', '大学']) if k == 'name' else v for k, v in self.fields.items()))
+        self.assertIs(other.name, row.name)
+
+    def test_intern_categorical_only(self):
+        major_name = ''.join(['临床', '医学'])
+        row = make_record(EnrollPlan, **{**self.fields, 'major_name': major_name})
+        self.assertIs(row.target_province, sys.intern('北京'))
+        # 专业名不是分类列，原样保留，不进驻留表
+        self.assertIs(row.major_name, major_name)
+        self.assertIsNot(row.major_name, sys.intern('临床医学'))
+
+    def test_csv_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), 'enroll_plan.csv')
+        sink = CsvSink(path, EnrollPlan)
+        sink.write_rows([make_record(EnrollPlan, **self.fields)])
+        sink.close()
+        self.assertEqual([row._asdict() for row in iter_csv_rows(path, EnrollPlan)], [self.fields])
+
+    def test_slim_univ(self):
+        univ = {'school_id': 1101, 'name': '北京测试大学1', 'code_enroll': '0110100', 'province_name': '北京', 'f985': '0', 'special': []}
+        self.assertEqual(slim_univ(univ), {  # type: ignore
+            'school_id': 1101, 'name': '北京测试大学1', 'code_enroll': '0110100', 'province_name': '北京'
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from functions import intercepted_requests, static_requests
+from functions.cache import response_cache
+from functions.datasets import DATASETS
+from functions.shards import merge_shard_outputs, save_univ_list
+from functions.sinks import iter_csv_rows
+from tests.fake_server import FakeEolServer
+from unittest import mock
+import itertools
+import os
+import tempfile
+import unittest
+import main
+
+
+class MergeShardOutputsTestCase(unittest.TestCase):
+    """两个分片交替分到高校，合并后按高校列表的顺序排列，重名的高校也不会排错"""
+
+    def setUp(self):
+        self.server = FakeEolServer(schools_per_province=4).start()
+        self.cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp())
+        response_cache.configure(None)
+        self.patches = [
+            mock.patch.object(intercepted_requests, 'API_URL', self.server.api_url),
+            mock.patch.object(static_requests, 'STATIC_URL', self.server.static_url),
+            mock.patch.object(main, 'MANIFEST_FILE', None),
+            mock.patch.object(main, 'SHARD_QUERY_INTERVAL', 0.001),
+            mock.patch.object(main, 'MIN_QUERY_INTERVAL', 0.001),
+            mock.patch.object(main, 'ADAPTIVE_RATE', False)
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        os.chdir(self.cwd)
+        self.server.stop()
+
+    def test_order_by_school_id(self):
+        univ_list = [{**univ, 'name': '同名大学'} for univ in main.get_univ_list('北京')]
+        save_univ_list('univ_list_merged.json', univ_list)
+        for shard in range(2):
+            main.crawl_shard('merged', shard, 2)
+
+        expected = [univ['code_enroll'][:5] for univ in univ_list]
+        for dataset in main.enabled_datasets():
+            row_type = DATASETS[dataset].row_type
+            path = merge_shard_outputs(dataset, row_type, 'merged', 2, univ_list)
+            codes = [code for code, _ in itertools.groupby(row.code for row in iter_csv_rows(path, row_type))]
+            self.assertEqual(codes, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+from functions.datasets import DATASETS
+from functions.rows import make_record
+from functions.sinks import RowSink, SqliteDatabaseSink
+from type import MiniumScoreForMajors
+import os
+import sqlite3
+import tempfile
+import unittest
+
+
+def major_row(major_name: str, minium_score: int, major_group=None):
+    return make_record(
+        MiniumScoreForMajors,
+        code='10001', name='测试大学', located_province='北京', target_province='河南', year=2022,
+        major='理科', major_name=major_name, enroll_level='本科批', avg_score='600',
+        minium_score=minium_score, minium_rank=1000, major_group=major_group, subject_requirements=None
+    )
+
+
+class SqliteSinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'data.sqlite3')
+
+    def write(self, rows: list):
+        database = SqliteDatabaseSink(self.path, commit_rows=2)
+        info = DATASETS['major_score']
+        database.add_table(info.name, info.row_type, info.key).write_rows(rows)
+        database.close()
+
+    def test_upsert(self):
+        self.write([major_row('专业1', 580), major_row('专业2', 590), major_row('专业3', 600, '第1组')])
+        # 重新爬取：专业组为空的行也要原地更新，而不是因为NULL互不相等多出一行
+        self.write([major_row('专业1', 585), major_row('专业3', 605, '第1组'), major_row('专业4', 610)])
+        conn = sqlite3.connect(self.path)
+        self.assertEqual(
+            conn.execute('SELECT major_name, minium_score FROM major_score ORDER BY major_name').fetchall(),
+            [('专业1', 585), ('专业2', 590), ('专业3', 605), ('专业4', 610)]
+        )
+        plan = conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM major_score WHERE target_province = ? AND year = ? AND minium_score BETWEEN ? AND ?',
+            ('河南', 2022, 580, 600)
+        ).fetchall()
+        self.assertIn('major_score_target_province_year_minium_score', str(plan))
+        conn.close()
+
+
+class RowSinkTestCase(unittest.TestCase):
+    def test_missing_write_rows(self):
+        class IncompleteSink(RowSink):
+            def close(self):
+                pass
+
+        # 忘了实现write_rows的去处在创建时就报错，而不是爬到第一行才报错
+        with self.assertRaises(TypeError):
+            IncompleteSink()  # type: ignore
+
+
+if __name__ == '__main__':
+    unittest.main()
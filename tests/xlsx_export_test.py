@@ -0,0 +1,37 @@
+from functions.xlsx_export import SheetSource, export_xlsx
+from type import EnrollPlan
+import csv
+import openpyxl
+import os
+import tempfile
+import unittest
+
+
+class ExportXlsxTestCase(unittest.TestCase):
+    def test_export_from_csv(self):
+        tmpdir = tempfile.mkdtemp()
+        csv_path = os.path.join(tmpdir, 'enroll_plan.csv')
+        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=EnrollPlan.__annotations__.keys())
+            writer.writeheader()
+            writer.writerow({
+                'code': '10459', 'name': '郑州大学', 'located_province': '河南',
+                'target_province': '北京', 'year': 2022, 'major': '综合',
+                'enroll_level': '本科批', 'major_name': '临床医学', 'planned_number': 3,
+                'duration': '五年', 'tuition': '6000', 'major_group': None,
+                'subject_requirements': None
+            })
+
+        xlsx_path = os.path.join(tmpdir, 'data.xlsx')
+        export_xlsx([SheetSource('各专业招生计划', ['学校代码'], csv_path, EnrollPlan)], xlsx_path)
+
+        rows = list(openpyxl.load_workbook(xlsx_path)['各专业招生计划'].values)
+        self.assertEqual(rows[0][0], '学校代码')
+        self.assertEqual(rows[1][:5], ('10459', '郑州大学', '河南', '北京', 2022))
+        self.assertEqual(rows[1][8], 3)
+        self.assertEqual(rows[1][10], '6000')
+        self.assertFalse(os.path.exists(f'{xlsx_path}.tmp'))
+
+
+if __name__ == '__main__':
+    unittest.main()
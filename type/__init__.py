@@ -61,6 +61,14 @@ class Univ(TypedDict):
     view_week_number: str
     view_year: int
 
+
+class UnivBrief(TypedDict):
+    """爬取时用到的大学信息，是Univ的子集，见functions/rows.py中的slim_univ"""
+    school_id: int
+    name: str
+    code_enroll: str
+    province_name: str
+
 # region 生成表格用的类型
 
 